@@ -10,6 +10,7 @@ import pandas as pd
 import json
 import datetime
 import time
+import calendar
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
@@ -24,26 +25,77 @@ from sunrisesunsetcalculator import sunrise_sunset
 from sunrisesunsetcalculator import time_until_next_sunrise_sunset
 from sunrisesunsetcalculator import time_of_next_sunrise_sunset
 from sunrisesunsetcalculator import rounded_hours_until_next_sunrise_sunset
+from sunrisesunsetcalculator import sunrise_sunset_day
+from sunrisesunsetcalculator import solar_zenith_angle
 
+# Column reader for the log files
+from mag_ingest import TS_FORMAT
+from mag_cache import load_columns, file_stamp
+from mag_decimate import minmax_decimate, pixel_columns
+from mag_day import day_from_columns, aggregate_readings, bin_readings
 
-def setup(ax1, ax3, title, roll_count, List_length, x_limit, t, x, y, z, rt, lt, tr_show, tl_show, raw, H, E, Z, vmag):
-	"""Set up common parameters for the Axes in the example."""
+# Time of day and timezone arguments used with sunrise_sunset() for the sun lines on the plots
+SUN_T = 0.5
+SUN_TIMEZONE = -2
+
+
+def utc_epoch(dt):
+	"""Seconds since 1970 for a naive datetime holding UTC time."""
+	return calendar.timegm(dt.timetuple())
+
+
+def report(progress, stage, began, **info):
+	"""Pass the time a stage took and any counts to the progress callback. Returns the time now."""
+	now = time.perf_counter()
+	if progress is not None:
+		progress(stage, seconds=now - began, **info)
+	return now
+
+
+def plot_points(ax, t, v, label, color):
+	"""Plot one series as dots, keeping only the min and max of each pixel column when there are more points than columns."""
+	t, v = minmax_decimate(t, v, pixel_columns(ax))
+	ax.plot(t, v, '.', label=label, color=color)
+
+
+def shade_day(ax, latitude, longitude, start_epoch, seconds_per_x, x_limit):
+	"""Shade the plot background by the solar zenith angle at the station, white in full sun to gray at night.
+
+	The angle is worked out once for each pixel column with one vectorized call
+	and drawn as a single image strip behind the data.
+	"""
+	columns = max(pixel_columns(ax), 2)
+	x = (np.arange(columns) + 0.5) * (x_limit / columns)
+	zenith = solar_zenith_angle(latitude, longitude, start_epoch + x * seconds_per_x)
+	xlim = ax.get_xlim()
+	ylim = ax.get_ylim()
+	ax.imshow(zenith[np.newaxis, :], cmap='Greys', vmin=60, vmax=140, alpha=0.5, aspect='auto',
+		interpolation='nearest', extent=(0, x_limit, 0, 1), transform=ax.get_xaxis_transform(), zorder=0)
+	ax.set_xlim(xlim)	# imshow resets the limits to its extent
+	ax.set_ylim(ylim)
+
+
+def setup(ax1, ax3, title, roll_count, List_length, x_limit, t, x, y, z, rt, lt, tr_show, tl_show, raw, H, E, Z, vmag, progress=None):
+	"""Set up common parameters for the Axes in the example.
+
+	t, x, y, z, rt and lt are fields of a day array (mag_day.py). With raw set
+	x, y and z are made positive in place.
+	"""
+	stage_began = time.perf_counter()
 	# only show the bottom spine
 	#ax1.yaxis.set_major_locator(ticker.NullLocator())
 	ax1.spines[['left', 'right', 'top']].set_visible(True)
 
-	t_len = len(t)
-	t_adj = np.empty([t_len], dtype = float)
-	for n in range(t_len-1):
-		t_adj[n] = (t[n]/86400) * (86400/roll_count) # 86400 is seconds in one day
+	t_adj = (t/86400) * (86400/roll_count) # 86400 is seconds in one day
 
 	if int(raw) == 1:	# When plotting raw values plotabsolute value of field strength
-		x = np.abs(x)
-		y = np.abs(y)
-		z = np.abs(z)
+		np.abs(x, out=x)
+		np.abs(y, out=y)
+		np.abs(z, out=z)
 	if int(vmag) == 1:
-		vector_mag = np.sqrt(np.power(x,2) + np.power(y,2) + np.power(z,2))
-		ax1.plot(t_adj,vector_mag,'.', label="Vector Magnitude", color="orange")
+		vector_mag = np.hypot(x, y)
+		np.hypot(vector_mag, z, out=vector_mag)
+		plot_points(ax1, t_adj, vector_mag, label="Vector Magnitude", color="orange")
 
 	if (roll_count > 1) and (int(vmag) == 0):
 		# Will normalize values to 24 hours but set plot to fit a full 24 hours of roll_length data.
@@ -51,18 +103,19 @@ def setup(ax1, ax3, title, roll_count, List_length, x_limit, t, x, y, z, rt, lt,
 		# FIX t_adj[n] = (t[n]/float(8600/List_length)) * 24.0
 		# Plot the XYZ values
 		if int(Z) == 1:
-			ax1.plot(t_adj,x,'.', label="Z (x) axis", color="red")
+			plot_points(ax1, t_adj, x, label="Z (x) axis", color="red")
 		if int(E) == 1:
-			ax1.plot(t_adj,y,'.', label="E (y) axis", color="blue")
+			plot_points(ax1, t_adj, y, label="E (y) axis", color="blue")
 		if int(H) == 1:
-			ax1.plot(t_adj,z,'.', label="H (z) axis", color="black")
+			plot_points(ax1, t_adj, z, label="H (z) axis", color="black")
 	else: # Plot all values available, every second
 		if int(Z) == 1:
-			ax1.plot(t,x,'.', label="Z (x) axis", color="red")
+			plot_points(ax1, t, x, label="Z (x) axis", color="red")
 		if int(H) == 1:
-			ax1.plot(t,y,'.', label="E (y) axis", color="blue")
+			plot_points(ax1, t, y, label="E (y) axis", color="blue")
 		if int(Z) == 1:
-			ax1.plot(t,z,'.', label="H (z) axis", color="black")
+			plot_points(ax1, t, z, label="H (z) axis", color="black")
+	stage_began = report(progress, "data", stage_began, points=len(t))
 	# define tick positions
 	ax1.xaxis.set_major_locator(ticker.MultipleLocator((84600/roll_count)/24))
 	ax1.xaxis.set_minor_locator(ticker.MultipleLocator(86400/roll_count))
@@ -85,9 +138,9 @@ def setup(ax1, ax3, title, roll_count, List_length, x_limit, t, x, y, z, rt, lt,
 
 	if int(tl_show) == 1 or int(tr_show) == 1:
 		if int(tr_show) == 1:
-			ax3.plot(t_adj,rt,'.', label="Sensor Temp", color="green")
+			plot_points(ax3, t_adj, rt, label="Sensor Temp", color="green")
 		if int(tl_show) == 1:
-			ax3.plot(t_adj,lt,'.', label="RPi Temp", color="brown")
+			plot_points(ax3, t_adj, lt, label="RPi Temp", color="brown")
 		ax3.set_xlim(xmin=0, xmax=x_limit)
 		ax3.set_ylabel('Temperature (C)')
 		ax3.legend(frameon=False, loc='lower center', ncol=3, fontsize=20)
@@ -107,16 +160,16 @@ def setup(ax1, ax3, title, roll_count, List_length, x_limit, t, x, y, z, rt, lt,
 	max_value = 0
 	min_value = 200
 	if int(vmag) == 1:
-		max_value = np.max(abs(vector_mag))
-		min_value = np.min(abs(vector_mag))
+		max_value = np.nanmax(vector_mag)
+		min_value = np.nanmin(vector_mag)
 		ax1.set_ylim(min_value, max_value )
-	if int(raw) == 1:
-		max_x = np.max(abs(x))
-		max_y = np.max(abs(y))
-		max_z = np.max(abs(z))
-		min_x = np.min(abs(x))
-		min_y = np.min(abs(y))
-		min_z = np.min(abs(z))
+	if int(raw) == 1:	# x, y and z are already positive
+		max_x = np.nanmax(x)
+		max_y = np.nanmax(y)
+		max_z = np.nanmax(z)
+		min_x = np.nanmin(x)
+		min_y = np.nanmin(y)
+		min_z = np.nanmin(z)
 		if int(H) == 1:
 			max_value = max_z 
 			min_value = min_z 
@@ -136,16 +189,54 @@ def setup(ax1, ax3, title, roll_count, List_length, x_limit, t, x, y, z, rt, lt,
 				min_value = min_x
 		ax1.set_ylim(min_value, max_value )
 	else:
-		max_value = np.max([np.max(x),np.max(y),np.max(z),-(np.min(x)),-(np.min(y)),-(np.min(z))])
+		max_value = np.nanmax([np.nanmax(x),np.nanmax(y),np.nanmax(z),-(np.nanmin(x)),-(np.nanmin(y)),-(np.nanmin(z))])
 		ax1.set_ylim(-(max_value), (max_value))
 	if int(vmag) == 1:
-		max_value = np.max(abs(vector_mag))
-		min_value = np.min(abs(vector_mag))
+		max_value = np.nanmax(vector_mag)
+		min_value = np.nanmin(vector_mag)
 		ax1.set_ylim(min_value, max_value )
 	ax1.text(0.250, 1.1, title, transform=ax1.transAxes,
 	 fontsize=14, fontname='Monospace', color='tab:blue')
+	report(progress, "axes", stage_began)
+
+def day_vectors(logfiles, filename, plot_type, roll_count, binning="count", cache_dir=None, progress=None):
+	"""Read a log file and aggregate it for plotting.
+
+	Returns (day, start_ts, start_epoch, rows): the aggregated points as a day
+	array (mag_day.py) whose t field counts seconds from start_epoch, the time
+	stamp of the first reading, the epoch t counts from (UTC midnight when
+	binning is "time", else the first reading) and the number of readings.
+	"""
+	stage_began = time.perf_counter()
+	columns = load_columns(logfiles, filename, cache_dir)
+	start_epoch = int(columns["epoch"][0])
+	# One record per reading: seconds from start, x, y, z, rt, lt
+	readings = day_from_columns(columns, start_epoch)
+	rows = len(readings)
+	stage_began = report(progress, "read", stage_began, rows=rows)
+
+	if binning == "time":
+		# Place readings in fixed roll_count second bins from UTC midnight. Missing readings leave NaN gaps.
+		start_epoch = start_epoch - start_epoch % 86400
+		day = bin_readings(columns["epoch"], readings, start_epoch, roll_count, plot_type)
+	else:
+		# Reduce each block of roll_count readings to one point using the selected plot type
+		day = aggregate_readings(readings, roll_count, plot_type)
+	report(progress, "aggregate", stage_began, points=len(day))
+	return day, columns["start_ts"], start_epoch, rows
+
 
-def graph_magnetic_day(lat,long, logfiles, filename, plot_type, roll_count_str, tr_show, tl_show, raw, H, E, Z, vmag):
+def differential(day):
+	"""Make x, y and z of a day array differential about their mean and convert them from uT to nT, in place."""
+	for name in ("x", "y", "z"):
+		# Subtract the mean value so the results are differential about zero
+		values = day[name]
+		values -= np.nanmean(values, dtype = np.float64)
+		values *= 1000 #convert from uT to nT
+	return day
+
+
+def graph_magnetic_day(lat,long, logfiles, filename, plot_type, roll_count_str, tr_show, tl_show, raw, H, E, Z, vmag, binning="count", cache_dir=None, shade=0, outfile='mag.png', show=True, progress=None, render_cache=None):
 	latitude = float(lat)
 	longitude = float(long)
 	filename = filename.replace("'","")  #Remove quotes from filename added by combo.get()
@@ -156,139 +247,60 @@ def graph_magnetic_day(lat,long, logfiles, filename, plot_type, roll_count_str,
 		plot_type = "single"  # If plotting every value the stats do not matter so call it single
 
 	#Allocate storage memory for our data of interest
-	vector_day = np.empty([int((86400/roll_count)+.5),6], dtype = float)
-	vector_subtract = np.arange(6.0).reshape((1,6))
 	new_tick_locations = np.empty([1], dtype = float)
-	temp = np.empty([60,6], dtype = float)
 
-	# Read in test file. Need to expand this to support slecting the file of interest...
+	# Read in the log file as column arrays. Time stamps are decoded to UTC epoch seconds.
+	# Columns come from the binary cache when the log file has not changed since it was last read.
 	#df = pd.read_json("/home/bstricklin/n5brg-20240606-runmag.log",lines=True)
 	logfiles_len = len(logfiles)
 	path = logfiles
-	df = pd.read_json((path + filename),lines=True)
-
-	#df.info()
-
-	#Convert TM from datetime to unixtime
-	#Pull out the data we want
-	i=0
-	j = 0;
-	first = 1
-	for index, row in df.iterrows():
-		temp[j,0] = float(row ['x'])
-		temp[j,1] = float(row ['y'])
-		temp[j,2] = float(row ['z'])
-		temp[j,4] = float(row ['rt'])
-		temp[j,5] = float(row ['lt'])
-		j += 1
-		if i==0 and first == 1:
-			dt_utc = datetime.datetime.strptime((row ['ts']),'%d %b %Y %H:%M:%S')
-			start_time = dt_utc
-			start_time_str = row ['ts']
-			start_epoch = int(dt_utc.timestamp())
-			first = 0
-		if roll_count == 1:	# Select the current reading for value
-			vector_day[i,0]=temp[0,0]
-			vector_day[i,1]=temp[0,1]
-			vector_day[i,2]=temp[0,2]
-			vector_day[i,4]=temp[0,4]
-			vector_day[i,5]=temp[0,5]
-			dt_utc = datetime.datetime.strptime((row ['ts']),'%d %b %Y %H:%M:%S')
-			vector_day[i,3] = float(dt_utc.timestamp()) - start_epoch
-			j = 0  # Starts inter loop again
-			i += 1
-
-		if (j >= ((roll_count)) or (index == (len(df)-1))) and (roll_count > 1):
-			dt_utc = datetime.datetime.strptime((row ['ts']),'%d %b %Y %H:%M:%S')
-			vector_day[i,3] = float(dt_utc.timestamp()) - start_epoch
-
-			if plot_type == "last_value" and roll_count > 1:	# Select the current reading for value
-				vector_day[i,0]=temp[(roll_count-1),0]
-				vector_day[i,1]=temp[(roll_count-1),1]
-				vector_day[i,2]=temp[(roll_count-1),2]
-				vector_day[i,4]=temp[(roll_count-1),4]
-				vector_day[i,5]=temp[(roll_count-1),5]
-
-			if plot_type == "average" and roll_count > 1:	# Select the average reading 
-				vector_day[i,0]= np.average(temp[:,0])
-				vector_day[i,1]= np.average(temp[:,1])
-				vector_day[i,2]= np.average(temp[:,2])
-				vector_day[i,4]= np.average(temp[:,4])
-				vector_day[i,5]= np.average(temp[:,5])
-
-			if plot_type == "meane" and roll_count > 1:	# Select the mean reading 
-				vector_day[i,0]= np.mean(temp[:,0])
-				vector_day[i,1]= np.mean(temp[:,1])
-				vector_day[i,2]= np.mean(temp[:,2])
-				vector_day[i,4]= np.mean(temp[:,4])
-				vector_day[i,5]= np.mean(temp[:,5])
-
-			if plot_type == "std" and roll_count > 1:	# Select the standard deveation reading 
-				vector_day[i,0]= np.std(temp[:,0])
-				vector_day[i,1]= np.std(temp[:,1])
-				vector_day[i,2]= np.std(temp[:,2])
-				vector_day[i,4]= np.std(temp[:,4])
-				vector_day[i,5]= np.std(temp[:,5])
-
-			if plot_type == "max" and roll_count > 1:	# Select the maximum reading 
-				vector_day[i,0]= np.max(temp[:,0])
-				vector_day[i,1]= np.max(temp[:,1])
-				vector_day[i,2]= np.max(temp[:,2])
-				vector_day[i,4]= np.max(temp[:,4])
-				vector_day[i,5]= np.max(temp[:,5])
-
-			if plot_type == "min" and roll_count > 1:	# Select the minimum reading 
-				vector_day[i,0]= np.min(temp[:,0])
-				vector_day[i,1]= np.min(temp[:,1])
-				vector_day[i,2]= np.min(temp[:,2])
-				vector_day[i,4]= np.min(temp[:,4])
-				vector_day[i,5]= np.min(temp[:,5])
-
-			if plot_type == "rms and roll_count > 1":	# Select the root mean squared reading 
-				vector_day[i,0]= np.sqrt(np.mean(temp[:,0]**2))
-				vector_day[i,1]= np.sqrt(np.mean(temp[:,1]**2))
-				vector_day[i,2]= np.sqrt(np.mean(temp[:,2]**2))
-				vector_day[i,4]= np.sqrt(np.mean(temp[:,4]**2))
-				vector_day[i,5]= np.sqrt(np.mean(temp[:,5]**2))
-
-			if i == 150:
-				print(vector_day[i,0],"average Z or  x\n")
-				print(vector_day[i,1],"average E or  y\n")
-				print(vector_day[i,2],"average H or  z\n")
-
-			j = 0  # Starts inter loop again
-			i += 1
-	List_length = i -1 # Adjust List_length to match number of elements in data set.
+	stage_began = time.perf_counter()
+	day = None
+	if render_cache is not None:
+		# A plot already drawn with these settings from this version of the log is copied, not drawn again.
+		# It can only be used when the plot is not shown in a window.
+		stamp = file_stamp(os.path.join(path, filename))
+		if not show and render_cache.fetch(render_cache.key(stamp, filename, "png", latitude, longitude, plot_type,
+				roll_count, binning, tr_show, tl_show, raw, H, E, Z, vmag, shade), ".png", outfile):
+			report(progress, "cached", stage_began, outfile=outfile)
+			return outfile
+		day_key = render_cache.key(stamp, filename, "day", plot_type, roll_count, binning)
+		day = render_cache.load_day(day_key)
+		if day is not None:
+			stage_began = report(progress, "cached", stage_began, points=len(day[0]))
+	if day is None:
+		day = day_vectors(path, filename, plot_type, roll_count, binning, cache_dir, progress)
+		stage_began = time.perf_counter()
+		if render_cache is not None:
+			render_cache.save_day(day_key, day)
+	# The differential and setup() change the day in place, it is already saved to the cache
+	vector_day, start_time_str, start_epoch, rows = day
+	start_time = datetime.datetime.strptime(start_time_str, TS_FORMAT)
+	if binning == "time":
+		List_length = len(vector_day)
+	else:
+		i = len(vector_day)
+		List_length = i -1 # Adjust List_length to match number of elements in data set.
 	# If raw equals 1 we will not do differential otherwise we will
 	if int(raw) == 0:
-		# Determine mean value and time value needed to subtract from readings to move the results to zero reference
-		vector_subtract[0,0] = np.mean(vector_day[:,0])
-		vector_subtract[0,1] = np.mean(vector_day[:,1])
-		vector_subtract[0,2] = np.mean(vector_day[:,2])
-		vector_subtract[0,3] = 0
-		vector_subtract[0,4] = 0
-		vector_subtract[0,5] = 0
-		# Subtract the mean value from all the df values to make the results differential about zero
-		# This adjust all values to be about zero.
-		vector_day = np.subtract(vector_day,vector_subtract) 
-		vector_day[:,0] = vector_day[:,0] * 1000 #convert from uT to nT
-		vector_day[:,1] = vector_day[:,1] * 1000 #convert from uT to nT
-		vector_day[:,2] = vector_day[:,2] * 1000 #convert from uT to nT
-
-	#now = datetime.datetime.now(timezone.utc)
-	z_time = sunrise_sunset(latitude, longitude, datetime.datetime.now(), 0.5,-2).get("solarNoon").get("solarNoon_time")
-	r_time = sunrise_sunset(latitude, longitude, datetime.datetime.now(), 0.5,-2).get("sunrise").get("sunrise_time")
-	s_time = sunrise_sunset(latitude, longitude, datetime.datetime.now(), 0.5,-2).get("sunset").get("sunset_time")
+		vector_day = differential(vector_day)
+		stage_began = report(progress, "differential", stage_began, points=len(vector_day))
+
+	# Sun events for the date of the log (not today), one cached evaluation gives all three
+	sun = sunrise_sunset_day(latitude, longitude, start_time.date(), SUN_T, SUN_TIMEZONE)
+	z_time = sun.get("solarNoon").get("solarNoon_time")
+	r_time = sun.get("sunrise").get("sunrise_time")
+	s_time = sun.get("sunset").get("sunset_time")
 
 	# Adjust sun zenith time to time in seconds for this day.
 	zenith_time = start_time
 	zenith_time = zenith_time.replace(hour=z_time.hour)
 	zenith_time = zenith_time.replace(minute=z_time.minute)
 	zenith_time = zenith_time.replace(second=z_time.second)
-	zenith = float(zenith_time.timestamp()) - start_epoch
+	zenith = utc_epoch(zenith_time) - start_epoch
 	zenith = (zenith/86400) * List_length     # seconds at noon of the zun zenith for this day
 	# Calculate the time in seconds for midnight. Adjust to it falls before 0 seconds to end of day.
-	zenith_12 = float(zenith_time.timestamp()) - start_epoch - 43200 
+	zenith_12 = utc_epoch(zenith_time) - start_epoch - 43200 
 	zenith_12 = (zenith_12/86400) * List_length 
 	if zenith_12 < 0:
 		zenith_12 = zenith_12 + 86400 / (roll_count)
@@ -298,7 +310,7 @@ def graph_magnetic_day(lat,long, logfiles, filename, plot_type, roll_count_str,
 	rise_time = rise_time.replace(hour=r_time.hour)
 	rise_time = rise_time.replace(minute=r_time.minute)
 	rise_time = rise_time.replace(second=r_time.second)
-	rise = float(rise_time.timestamp()) - start_epoch
+	rise = utc_epoch(rise_time) - start_epoch
 	rise = (rise/86400) * List_length     # seconds at noon of the zun rise for this day
 
 	# Calculate sun set time in seconds for this day
@@ -306,8 +318,9 @@ def graph_magnetic_day(lat,long, logfiles, filename, plot_type, roll_count_str,
 	set_time = set_time.replace(hour=s_time.hour)
 	set_time = set_time.replace(minute=s_time.minute)
 	set_time = set_time.replace(second=s_time.second)
-	set = float(set_time.timestamp()) - start_epoch
+	set = utc_epoch(set_time) - start_epoch
 	set = (set/86400) * List_length     # seconds at noon of the sunset for this day
+	stage_began = report(progress, "sun", stage_began)
 
 	# PLOTTING
 	fig = plt.figure()
@@ -316,16 +329,22 @@ def graph_magnetic_day(lat,long, logfiles, filename, plot_type, roll_count_str,
 	ax3 = ax1.twinx()
 
 	fig.set_size_inches(16, 8)   # Define the size of the plot
+	stage_began = report(progress, "figure", stage_began)
 	i=0
 	began = 0
-	end = len(vector_day[:,0])    #Number of time divisins that we need to plot
+	end = len(vector_day)    #Number of time divisins that we need to plot
 	title = 'TAPR Magnatometer @ N5BRG Lat=' + str(latitude) + ' Log=' + str(longitude) + '\n ' +  'Plot Type: ' + str(plot_type) + '  ' + start_time_str  
 	x_limit = List_length
 	if(end > List_length):
 		end  = List_length
 	# This function call  sets up plot and builds the main plot image
-	setup(ax1, ax3, title, roll_count, List_length, x_limit, vector_day[began:end,3],vector_day[began:end,0],vector_day[began:end,1],vector_day[began:end,2],vector_day[began:end,4],vector_day[began:end,5], tr_show, tl_show, raw, H, E, Z, vmag)
+	setup(ax1, ax3, title, roll_count, List_length, x_limit, vector_day["t"][began:end],vector_day["x"][began:end],vector_day["y"][began:end],vector_day["z"][began:end],vector_day["rt"][began:end],vector_day["lt"][began:end], tr_show, tl_show, raw, H, E, Z, vmag, progress)
+	stage_began = time.perf_counter()
 	i=0
+	if int(shade) == 1:
+		# Day and night background, each x unit is roll_count seconds from start_epoch
+		shade_day(ax1, latitude, longitude, start_epoch, roll_count, x_limit)
+		stage_began = report(progress, "shade", stage_began)
 
 	# Now for the top x_axis ticks and lables hours and seconds of the day
 	for i in range(0,int(x_limit+roll_count),int(((x_limit+roll_count)/25)+0.5)):
@@ -334,7 +353,7 @@ def graph_magnetic_day(lat,long, logfiles, filename, plot_type, roll_count_str,
 		else:
 			new_tick_locations = np.append(new_tick_locations,[i])
 
-	X = vector_day[began:end,0]
+	X = vector_day["x"][began:end]
 	def tick_function(X):
 	    #V = (x/float(x_limit)) * x_limit
 	    V = (X/List_length) * 24
@@ -358,7 +377,16 @@ def graph_magnetic_day(lat,long, logfiles, filename, plot_type, roll_count_str,
 	plt.text((set/List_length), 0.85, 'Sunset', rotation=90, transform=plt.gca().transAxes)
 
 	plt.grid()
-	plt.savefig('mag.png')
+	stage_began = report(progress, "labels", stage_began)
+	plt.savefig(outfile)
+	stage_began = report(progress, "render", stage_began, outfile=outfile)
+	if render_cache is not None and not show:
+		render_cache.store(render_cache.key(stamp, filename, "png", latitude, longitude, plot_type,
+			roll_count, binning, tr_show, tl_show, raw, H, E, Z, vmag, shade), ".png", outfile)
 	#Image.open('mag.png').save('mag.pdf','PDF')
-	plt.show()
+	if show:
+		plt.show()
+	else:
+		plt.close(fig)
+	return outfile
 
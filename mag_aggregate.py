@@ -0,0 +1,140 @@
+# Block aggregation of magnetometer readings for the roll_count "Group by Seconds" setting
+# Readings are grouped roll_count rows at a time and each group is reduced to one value
+# using the plot type chosen in mag_view.py.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+
+
+import numpy as np
+
+# Plot types offered by mag_view.py, "single" is used when roll_count is 1
+PLOT_TYPES = ("last_value", "average", "mean", "rms", "std", "maximum", "minimum")
+
+
+def last_value(blocks, axis):
+	return np.take(blocks, -1, axis=axis)
+
+def rms(blocks, axis):
+	return np.sqrt(np.mean(np.square(blocks), axis=axis))
+
+# One numpy reduction per plot type, applied along the rows of a block
+STATISTICS = {
+	"single":     last_value,
+	"last_value": last_value,
+	"average":    np.mean,
+	"mean":       np.mean,
+	"rms":        rms,
+	"std":        np.std,
+	"maximum":    np.max,
+	"minimum":    np.min,
+}
+
+
+def aggregate_blocks(values, roll_count, plot_type, out=None):
+	"""Reduce every roll_count rows of values to one row.
+
+	values is a (rows, columns) array. The complete blocks are reshaped to a
+	(n_blocks, roll_count, columns) view and reduced with a single numpy call.
+	A short final block is reduced over only the rows it holds. The result is
+	written to out when it is given, which may be a view such as a field of
+	a day array (mag_day.py).
+	"""
+	if plot_type not in STATISTICS:
+		raise ValueError("Unknown plot type: %r" % (plot_type,))
+	statistic = STATISTICS[plot_type]
+	values = np.asarray(values)
+	rows = len(values)
+	full = rows // roll_count
+	ragged = rows - full * roll_count
+	result = out if out is not None else np.empty((full + (ragged > 0),) + values.shape[1:], dtype = float)
+	if full:
+		result[:full] = statistic(values[:full * roll_count].reshape((full, roll_count) + values.shape[1:]), axis=1)
+	if ragged:
+		result[full] = statistic(values[full * roll_count:], axis=0)
+	return result
+
+
+def bin_partials(epoch, values, t0, bin_seconds, n_bins):
+	"""Per bin running totals of readings placed on a fixed wall clock grid.
+
+	Bin n covers epoch seconds t0 + n*bin_seconds up to the next bin. The
+	readings are assigned with one searchsorted pass, readings outside the
+	grid are dropped. Returns a dictionary of (n_bins, columns) arrays: count,
+	sum, sumsq, minimum, maximum and last. Empty bins have a count of zero.
+	"""
+	epoch = np.asarray(epoch)
+	values = np.asarray(values, dtype = float)
+	if values.ndim == 1:
+		values = values[:, np.newaxis]
+	if len(epoch) > 1 and (np.diff(epoch) < 0).any():	# The logger restarted or the clock stepped back
+		order = np.argsort(epoch, kind="stable")
+		epoch = epoch[order]
+		values = values[order]
+	index = (epoch - t0) // bin_seconds
+	starts = np.searchsorted(index, np.arange(n_bins + 1))
+	values = values[starts[0]:starts[-1]]
+	starts = starts - starts[0]
+	count = np.diff(starts)
+	filled = count > 0
+	first = starts[:-1][filled]
+	partials = {"count": count}
+	for name in ("sum", "sumsq", "minimum", "maximum", "last"):
+		partials[name] = np.zeros((n_bins, values.shape[1]), dtype = float)
+	if len(first):
+		partials["sum"][filled] = np.add.reduceat(values, first, axis=0)
+		partials["sumsq"][filled] = np.add.reduceat(np.square(values), first, axis=0)
+		partials["minimum"][filled] = np.minimum.reduceat(values, first, axis=0)
+		partials["maximum"][filled] = np.maximum.reduceat(values, first, axis=0)
+		partials["last"][filled] = values[starts[1:][filled] - 1]
+	return partials
+
+
+def finish_bins(partials, plot_type, out=None):
+	"""Turn bin totals into one value per bin for the plot type, empty bins become NaN."""
+	count = partials["count"]
+	filled = count > 0
+	if out is None:
+		out = np.empty(partials["sum"].shape, dtype = float)
+	out[:] = np.nan
+	n = count[filled][:, np.newaxis]
+	if plot_type in ("single", "last_value"):
+		out[filled] = partials["last"][filled]
+	elif plot_type in ("average", "mean"):
+		out[filled] = partials["sum"][filled] / n
+	elif plot_type == "rms":
+		out[filled] = np.sqrt(partials["sumsq"][filled] / n)
+	elif plot_type == "std":
+		mean = partials["sum"][filled] / n
+		out[filled] = np.sqrt(np.maximum(partials["sumsq"][filled] / n - np.square(mean), 0))
+	elif plot_type == "maximum":
+		out[filled] = partials["maximum"][filled]
+	elif plot_type == "minimum":
+		out[filled] = partials["minimum"][filled]
+	else:
+		raise ValueError("Unknown plot type: %r" % (plot_type,))
+	return out
+
+
+def merge_partials(total, partials):
+	"""Add the bin totals of more readings into total, in place. Both must use the same grid.
+
+	total may hold views of a slice of larger totals, as mag_live.py does to
+	update only the bins that new readings fall in.
+
+	Used to stream many log files onto one grid, oldest file first so the
+	last value of a bin comes from the newest reading.
+	"""
+	if total is None:
+		return {name: np.array(array) for name, array in partials.items()}
+	had = total["count"] > 0
+	has = partials["count"] > 0
+	both = (had & has)[:, np.newaxis]
+	# Empty bins hold zeros, so where only one side has readings the sum is that side's value
+	total["minimum"][:] = np.where(both, np.minimum(total["minimum"], partials["minimum"]), total["minimum"] + partials["minimum"])
+	total["maximum"][:] = np.where(both, np.maximum(total["maximum"], partials["maximum"]), total["maximum"] + partials["maximum"])
+	total["last"][has] = partials["last"][has]
+	total["count"] += partials["count"]
+	total["sum"] += partials["sum"]
+	total["sumsq"] += partials["sumsq"]
+	return total
@@ -0,0 +1,179 @@
+# Compressed archives of old magnetometer log files
+# Daily logs can be kept as .log.gz, .log.xz or .log.zst files and are still listed and plotted
+# by the other programs. Each log gets a small index file beside it holding the number of
+# readings and the first and last time stamps, so a range of days can be found without
+# decompressing anything.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+#
+# Usage:  python3 mag_archive.py compress [--format gz|xz|zst] [--keep]   compress every log but the newest
+#         python3 mag_archive.py index                                    write missing or old index files
+#         python3 mag_archive.py list                                     show the index of every log
+
+
+import argparse
+import configparser
+import gzip
+import json
+import lzma
+import os
+import shutil
+import sys
+
+from mag_ingest import open_log, is_log_name, log_stem, detect_ts_format, stamp_epoch, zstandard
+from mag_cache import file_stamp, clear_cache
+
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+FORMATS = {"gz": ".log.gz", "xz": ".log.xz", "zst": ".log.zst"}
+
+
+def index_name(path):
+	return path + INDEX_SUFFIX
+
+
+def scan_log(path):
+	"""Count the readings of a log and find its first and last time stamps in one streaming pass."""
+	rows = 0
+	first = last = None
+	text_bytes = 0
+	with open_log(path) as f:
+		for line in f:
+			text_bytes += len(line)
+			if not line.strip():
+				continue
+			try:
+				record = json.loads(line)
+				ts = record["ts"]
+			except (ValueError, KeyError, TypeError):
+				continue		# A damaged line is skipped by the reader too
+			rows += 1
+			if first is None:
+				first = ts
+			last = ts
+	index = {"version": INDEX_VERSION, "rows": rows, "first_ts": first, "last_ts": last, "text_bytes": text_bytes}
+	if first is not None:
+		ts_format = detect_ts_format(first)
+		index.update(ts_format=ts_format, first_epoch=stamp_epoch(first, ts_format), last_epoch=stamp_epoch(last, ts_format))
+	return index
+
+
+def read_index(path):
+	"""The index of a log file, None when it is missing or the log has changed since it was written."""
+	try:
+		with open(index_name(path)) as f:
+			index = json.load(f)
+	except (OSError, ValueError):
+		return None
+	stamp = file_stamp(path)
+	if index.get("version") != INDEX_VERSION or index.get("size") != stamp["size"] or index.get("mtime_ns") != stamp["mtime_ns"]:
+		return None
+	return index
+
+
+def write_index(path, index=None):
+	if index is None:
+		index = scan_log(path)
+	index = dict(index, **file_stamp(path))
+	temp = index_name(path) + ".%d.tmp" % os.getpid()
+	with open(temp, "w") as f:
+		json.dump(index, f)
+	os.replace(temp, index_name(path))
+	return index
+
+
+def log_index(logfiles, filename, write=True):
+	"""Rows, first and last time stamps of a log file, from its index file when it is up to date.
+
+	A missing index is built by reading the log once and saved when write is
+	True and the log directory can be written.
+	"""
+	path = os.path.join(logfiles, filename)
+	index = read_index(path)
+	if index is not None:
+		return index
+	index = scan_log(path)
+	if write:
+		try:
+			index = write_index(path, index)
+		except OSError:
+			pass
+	return index
+
+
+def list_logs(logfiles):
+	"""Names of the plain and compressed log files in logfiles, sorted."""
+	return sorted(name for name in os.listdir(logfiles) if is_log_name(name))
+
+
+def compress_log(logfiles, filename, fmt="gz", keep=False, cache_dir=None):
+	"""Compress one plain .log file, write its index and remove the original unless keep is set.
+
+	The compressed file is checked against the index of the original before
+	the original is removed, along with its column cache (mag_cache.py).
+	"""
+	path = os.path.join(logfiles, filename)
+	target = os.path.join(logfiles, log_stem(filename) + FORMATS[fmt])
+	original = scan_log(path)
+	temp = target + ".%d.tmp" % os.getpid()
+	with open(path, "rb") as source:
+		if fmt == "gz":
+			with gzip.open(temp, "wb", compresslevel=6) as out:
+				shutil.copyfileobj(source, out)
+		elif fmt == "xz":
+			with lzma.open(temp, "wb") as out:
+				shutil.copyfileobj(source, out)
+		else:
+			if zstandard is None:
+				raise ValueError("Writing .log.zst files needs the zstandard package (pip install zstandard)")
+			with open(temp, "wb") as out:
+				zstandard.ZstdCompressor(level=10).copy_stream(source, out)
+	os.replace(temp, target)
+	index = write_index(target)
+	for key in ("rows", "first_ts", "last_ts"):
+		if index[key] != original[key]:
+			os.remove(target)
+			os.remove(index_name(target))
+			raise ValueError("Compressed copy of %s does not match, %s differs" % (filename, key))
+	if not keep:
+		os.remove(path)
+		try:
+			os.remove(index_name(path))
+		except FileNotFoundError:
+			pass
+		clear_cache(logfiles, filename, cache_dir)	# Cached under the old name, the archive is cached when first read
+	return target
+
+
+def main():
+	parser = configparser.ConfigParser(allow_no_value=True)
+	parser.read('./configure_mag_graph')
+
+	args = argparse.ArgumentParser(description="Compress and index magnetometer log files")
+	args.add_argument("action", choices=["compress", "index", "list"], help="what to do")
+	args.add_argument("--logfiles", default=parser['directories']['logfiles'], help="log file directory")
+	args.add_argument("--format", default="gz", choices=sorted(FORMATS), help="compression for compress (default gz)")
+	args.add_argument("--keep", action="store_true", help="keep the plain .log files after compressing")
+	opts = args.parse_args()
+	cache_dir = parser['directories'].get('cache')	# Empty or missing puts the cache under logfiles
+
+	names = list_logs(opts.logfiles)
+	if opts.action == "compress":
+		plain = [name for name in names if name.endswith(".log")]
+		for name in plain[:-1]:		# The newest log is still being written
+			print(name, "->", os.path.basename(compress_log(opts.logfiles, name, opts.format, opts.keep, cache_dir)))
+	elif opts.action == "index":
+		for name in names:
+			if read_index(os.path.join(opts.logfiles, name)) is None:
+				write_index(os.path.join(opts.logfiles, name))
+				print("indexed", name)
+	else:
+		for name in names:
+			index = log_index(opts.logfiles, name)
+			print("%-36s %7d rows  %s  to  %s" % (name, index["rows"], index["first_ts"], index["last_ts"]))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,146 @@
+# Command line renderer for many magnetometer plots at once, no display needed
+# Every combination of log file, plot type and roll count becomes one job. Jobs run in a pool
+# of worker processes, one per CPU core by default, and each writes its own PNG file.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+#
+# Usage:  python3 mag_batch.py [files or patterns ...] [--plot-type average --plot-type maximum]
+#                  [--roll-count 60] [--outdir plots] [--jobs 4]
+#         With no files every .log file in logfiles is rendered.
+#         Example, a month of daily plots:  python3 mag_batch.py '*202406*' --outdir web/plots
+
+
+import matplotlib
+matplotlib.use("Agg")	# Render to files only, must be chosen before pyplot is imported
+
+import argparse
+import concurrent.futures
+import configparser
+import fnmatch
+import os
+import sys
+import time
+
+from graph_mag_log import graph_magnetic_day
+from mag_render_cache import render_cache
+from mag_ingest import log_stem
+from mag_archive import list_logs
+from mag_trace import trace_run, trace_settings
+
+
+def output_name(filename, plot_type, roll_count, raw, vmag, binning, shade=0):
+	"""PNG file name for one job, unique for each combination of settings."""
+	stem = log_stem(os.path.basename(filename))
+	name = "%s-%s-%ss" % (stem, plot_type, roll_count)
+	if int(raw) == 1:
+		name += "-raw"
+	if int(vmag) == 1:
+		name += "-vmag"
+	if binning == "time":
+		name += "-clock"
+	if int(shade) == 1:
+		name += "-shade"
+	return name + ".png"
+
+
+def select_logs(logfiles, patterns):
+	"""Log file names (plain or compressed) in logfiles matching any of the names or shell patterns."""
+	names = list_logs(logfiles)
+	if not patterns:
+		return names
+	return [name for name in names if any(fnmatch.fnmatch(name, os.path.basename(pattern)) for pattern in patterns)]
+
+
+def render_job(job):
+	"""Worker process entry, render one plot and report how long it took.
+
+	The third value returned is an error message, or "cached" when an
+	unchanged day was copied from the render cache.
+	"""
+	try:
+		outfile, trace = trace_run(graph_magnetic_day, job["args"], job["kwargs"], job.get("trace"))
+	except Exception as error:	# One bad log file should not stop the rest of the batch
+		return job["kwargs"]["outfile"], None, "%s: %s" % (type(error).__name__, error)
+	stages = [stage["stage"] for stage in trace.stages]
+	return outfile, trace.seconds, "cached" if stages == ["cached"] else None
+
+
+def make_jobs(latitude, longitude, logfiles, names, plot_types, roll_counts, outdir,
+		tr_show=0, tl_show=0, raw=0, H=1, E=1, Z=1, vmag=0, binning="count", cache_dir=None, shade=0, renders=None, trace=None):
+	jobs = []
+	for name in names:
+		for plot_type in plot_types:
+			for roll_count in roll_counts:
+				if int(roll_count) == 1 and plot_type != plot_types[0]:
+					continue		# Every plot type gives the same single value plot
+				outfile = os.path.join(outdir, output_name(name, "single" if int(roll_count) == 1 else plot_type,
+					roll_count, raw, vmag, binning, shade))
+				jobs.append({"args": (latitude, longitude, logfiles, name, plot_type, str(roll_count),
+					tr_show, tl_show, raw, H, E, Z, vmag),
+					"kwargs": {"binning": binning, "cache_dir": cache_dir, "shade": shade, "render_cache": renders, "outfile": outfile, "show": False},
+					"trace": trace})
+	return jobs
+
+
+def run_jobs(jobs, workers=None):
+	"""Render jobs in a process pool sized to the number of cores. Returns the number that failed."""
+	workers = workers or os.cpu_count() or 1
+	failed = 0
+	cached = 0
+	began = time.perf_counter()
+	with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+		for outfile, elapsed, error in pool.map(render_job, jobs):
+			if error == "cached":
+				cached += 1
+				print("%-60s %6.2f s  unchanged" % (outfile, elapsed))
+			elif error is None:
+				print("%-60s %6.2f s" % (outfile, elapsed))
+			else:
+				failed += 1
+				print("%-60s FAILED %s" % (outfile, error), file=sys.stderr)
+	print("%d plots (%d unchanged) in %.1f s using %d processes" % (len(jobs), cached, time.perf_counter() - began, workers))
+	return failed
+
+
+def main():
+	parser = configparser.ConfigParser(allow_no_value=True)
+	parser.read('./configure_mag_graph')
+
+	args = argparse.ArgumentParser(description="Render magnetometer plots to PNG files without a display")
+	args.add_argument("files", nargs="*", help="log file names or shell patterns in logfiles (default all)")
+	args.add_argument("--logfiles", default=parser['directories']['logfiles'], help="log file directory")
+	args.add_argument("--plot-type", action="append", dest="plot_types", help="plot type, may be repeated (default average)")
+	args.add_argument("--roll-count", action="append", dest="roll_counts", type=int, help="seconds per point, may be repeated (default 60)")
+	args.add_argument("--outdir", default="plots", help="directory for the PNG files")
+	args.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes (default one per core)")
+	args.add_argument("--raw", action="store_true", help="plot absolute field strength instead of differential")
+	args.add_argument("--vmag", action="store_true", help="plot the vector magnitude")
+	args.add_argument("--axes", default="HEZ", help="axes to show, any of H E Z (default HEZ)")
+	args.add_argument("--temps", default="", help="temperatures to show, any of R (sensor) L (RPi)")
+	args.add_argument("--clock-bins", action="store_true", help="bin readings on clock time so gaps stay in place")
+	args.add_argument("--shade", action="store_true", help="shade the background by the sun's zenith angle")
+	args.add_argument("--no-render-cache", action="store_true", help="draw every plot even when a cached copy is up to date")
+	args.add_argument("--trace", metavar="FILE", help="append the stage times of every plot to FILE (also MAG_TRACE=FILE)")
+	opts = args.parse_args()
+
+	names = select_logs(opts.logfiles, opts.files)
+	if not names:
+		print("No log files found in", opts.logfiles, file=sys.stderr)
+		return 1
+	os.makedirs(opts.outdir, exist_ok=True)
+	trace = trace_settings(parser)
+	if opts.trace:
+		trace = dict(trace or {"memory": True, "profile": None}, file=opts.trace)
+	axes = opts.axes.upper()
+	temps = opts.temps.upper()
+	jobs = make_jobs(parser['location']['lattitude'], parser['location']['longitude'], opts.logfiles, names,
+		opts.plot_types or ["average"], opts.roll_counts or [60], opts.outdir,
+		int("R" in temps), int("L" in temps), int(opts.raw), int("H" in axes), int("E" in axes), int("Z" in axes),
+		int(opts.vmag), "time" if opts.clock_bins else "count", parser['directories'].get('cache'), int(opts.shade),
+		None if opts.no_render_cache else render_cache(parser, opts.logfiles), trace)
+	return 1 if run_jobs(jobs, opts.jobs) else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,412 @@
+# Benchmarks for the magnetometer graphing programs
+# Writes synthetic TAPR RM3100 log files and times the processing stages against the
+# original row by row code so speed ups can be checked on the target machine (Raspberry Pi).
+# The pipeline benchmark times every stage of graph_magnetic_day with its peak memory and can
+# save the results as JSON to compare against a later version.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+#
+# Usage:  python3 mag_benchmark.py ingest|timestamps|aggregate|decimate|sun [--rows 86400]
+#         python3 mag_benchmark.py pipeline [--days 3] [--gaps 5] [--spikes 20] [--roll-count 60]
+#                  [--json results.json] [--compare before.json]
+
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from mag_ingest import read_mag_log, decode_timestamps, TS_FORMAT
+from mag_cache import load_columns, clear_cache
+from mag_aggregate import PLOT_TYPES
+from mag_day import day_from_columns, aggregate_readings, bin_readings
+from mag_decimate import minmax_decimate, pixel_columns
+from mag_range import range_bins, day_epoch
+from graph_mag_log import graph_magnetic_day, differential, SUN_T, SUN_TIMEZONE
+import sunrisesunsetcalculator
+
+
+def write_synthetic_log(filename, rows=86400, start="03 Jun 2024 00:00:00", seed=0, gaps=0, spikes=0):
+	"""Write a 1 Hz log file that looks like the output of the TAPR logger.
+
+	gaps runs of 1 to 30 minutes of readings are left out and spikes single
+	readings get a jump of up to 5 uT, as seen from a disturbed or failing
+	sensor. Returns the number of readings written.
+	"""
+	rng = np.random.default_rng(seed)
+	start_time = datetime.datetime.strptime(start, TS_FORMAT)
+	seconds = np.arange(rows)
+	day = 2 * np.pi * seconds / 86400
+	# Quiet day field in uT with a small daily variation and sensor noise
+	x = -40.0 + 0.020 * np.sin(day) + rng.normal(0, 0.002, rows)
+	y = -4.9 + 0.015 * np.cos(day) + rng.normal(0, 0.002, rows)
+	z = -24.1 + 0.030 * np.sin(day + 1.0) + rng.normal(0, 0.002, rows)
+	rt = 22.5 + 3.0 * np.sin(day) + rng.normal(0, 0.05, rows)
+	lt = 24.4 + 4.0 * np.sin(day) + rng.normal(0, 0.05, rows)
+	for n in rng.integers(0, rows, spikes):
+		jump = rng.uniform(0.5, 5.0, 3) * rng.choice((-1, 1), 3)
+		x[n] += jump[0]
+		y[n] += jump[1]
+		z[n] += jump[2]
+	keep = np.ones(rows, dtype = bool)
+	for n in rng.integers(0, rows, gaps):
+		keep[n:n + rng.integers(60, 1800)] = False
+	stamps = (pd.Timestamp(start_time) + pd.to_timedelta(seconds[keep], unit="s")).strftime(TS_FORMAT)
+	with open(filename, "w") as f:
+		for n, ts in zip(np.flatnonzero(keep), stamps):
+			f.write('{ "ts":"%s", "rt":%.2f, "lt":%.2f, "x":%.4f, "y":%.4f, "z":%.4f, "rx":%d, "ry":%d, "rz":%d, "Tm": %.4f }\n'
+				% (ts, rt[n], lt[n], x[n], y[n], z[n], int(x[n] * 1.5), int(y[n] * 1.5), int(z[n] * 1.5), 46.9849))
+	return int(keep.sum())
+
+
+def write_synthetic_days(folder, days=1, rows=86400, gaps=0, spikes=0, start=datetime.date(2024, 6, 3)):
+	"""One synthetic daily log per day in folder, named like the logger names them. Returns the names."""
+	names = []
+	for n in range(days):
+		date = start + datetime.timedelta(days = n)
+		name = "synthetic-%s-runmag.log" % date.strftime("%Y%m%d")
+		write_synthetic_log(os.path.join(folder, name), rows, date.strftime("%d %b %Y 00:00:00"), n, gaps, spikes)
+		names.append(name)
+	return names
+
+
+def legacy_ingest(filename):
+	"""The original pd.read_json and iterrows loop from graph_magnetic_day (roll_count of 1)."""
+	df = pd.read_json(filename, lines=True)
+	vector_day = np.empty([len(df),6], dtype = float)
+	first = 1
+	for index, row in df.iterrows():
+		vector_day[index,0] = float(row ['x'])
+		vector_day[index,1] = float(row ['y'])
+		vector_day[index,2] = float(row ['z'])
+		vector_day[index,4] = float(row ['rt'])
+		vector_day[index,5] = float(row ['lt'])
+		if first == 1:
+			start_epoch = int(datetime.datetime.strptime((row ['ts']),TS_FORMAT).timestamp())
+			first = 0
+		dt_utc = datetime.datetime.strptime((row ['ts']),TS_FORMAT)
+		vector_day[index,3] = float(dt_utc.timestamp()) - start_epoch
+	return vector_day
+
+
+def best_time(function, *args, repeat=3):
+	"""Best wall time in seconds of several calls."""
+	best = None
+	for n in range(repeat):
+		began = time.perf_counter()
+		function(*args)
+		elapsed = time.perf_counter() - began
+		if best is None or elapsed < best:
+			best = elapsed
+	return best
+
+
+def bench_ingest(filename, rows, repeat):
+	legacy = best_time(legacy_ingest, filename, repeat=1)
+	columns = best_time(read_mag_log, filename, repeat=repeat)
+	print("ingest  %7d rows   legacy iterrows %8.3f s %10.0f rows/s" % (rows, legacy, rows / legacy))
+	print("ingest  %7d rows   column reader   %8.3f s %10.0f rows/s   %5.1fx" % (rows, columns, rows / columns, legacy / columns))
+
+
+def legacy_timestamps(ts):
+	"""Per row strptime and timestamp() as done in the original loop."""
+	return np.array([int(datetime.datetime.strptime(stamp, TS_FORMAT).timestamp()) for stamp in ts], dtype = np.int64)
+
+
+def bench_timestamps(filename, rows, repeat):
+	ts = pd.read_json(filename, lines=True, dtype=False, convert_dates=False)["ts"].to_numpy(dtype = str)
+	gappy = np.delete(ts, np.arange(100, rows, 1000))	# Drop a reading now and then to defeat the fast path
+	legacy = best_time(legacy_timestamps, ts, repeat=1)
+	print("stamps  %7d rows   legacy strptime %8.3f s %10.0f rows/s" % (rows, legacy, rows / legacy))
+	for label, stamps in (("1 s fast path  ", ts), ("byte decode    ", gappy)):
+		elapsed = best_time(decode_timestamps, stamps, repeat=repeat)
+		print("stamps  %7d rows   %s %8.3f s %10.0f rows/s   %5.1fx" % (len(stamps), label, elapsed, len(stamps) / elapsed, legacy / elapsed * len(stamps) / rows))
+
+
+def legacy_aggregate(readings, roll_count, plot_type):
+	"""The original 60 row temp buffer loop from graph_magnetic_day, average and std branches."""
+	vector_day = np.empty([int((len(readings)/roll_count)+1),6], dtype = float)
+	temp = np.zeros([60,6], dtype = float)
+	rows = len(readings)
+	i = 0
+	j = 0
+	for index in range(rows):
+		temp[j,:] = readings[index,:]
+		j += 1
+		if roll_count == 1:
+			vector_day[i,:] = temp[0,:]
+			j = 0
+			i += 1
+		if (j >= roll_count or index == rows-1) and roll_count > 1:
+			vector_day[i,3] = temp[j-1,3]
+			for column in (0, 1, 2, 4, 5):
+				if plot_type == "average":
+					vector_day[i,column] = np.average(temp[:,column])
+				if plot_type == "std":
+					vector_day[i,column] = np.std(temp[:,column])
+			j = 0
+			i += 1
+	return vector_day[:i]
+
+
+def bench_aggregate(filename, rows, repeat):
+	columns = read_mag_log(filename)
+	readings = np.column_stack((columns["x"], columns["y"], columns["z"],
+		columns["epoch"] - columns["epoch"][0], columns["rt"], columns["lt"]))
+	day = day_from_columns(columns, columns["epoch"][0])
+	print("roll_count   legacy loop     kernel (average)   kernel (all %d plot types)" % len(PLOT_TYPES))
+	for roll_count in (2, 3, 4, 5, 6, 7, 8, 9, 10, 20, 30, 40, 50, 60):	# At 1 the day is used as read
+		legacy = best_time(legacy_aggregate, readings, roll_count, "average", repeat=1)
+		kernel = best_time(aggregate_readings, day, roll_count, "average", repeat=repeat)
+		began = time.perf_counter()
+		for plot_type in PLOT_TYPES:
+			aggregate_readings(day, roll_count, plot_type)
+		every = time.perf_counter() - began
+		print("%10d %10.3f s %12.4f s %5.0fx %12.4f s" % (roll_count, legacy, kernel, legacy / kernel, every))
+
+
+def render_series(t, series, decimate):
+	fig = plt.figure()
+	fig.set_size_inches(16, 8)
+	ax = fig.add_subplot(111)
+	for v in series:
+		if decimate:
+			ax.plot(*minmax_decimate(t, v, pixel_columns(ax)), '.')
+		else:
+			ax.plot(t, v, '.')
+	fig.savefig(io.BytesIO(), format="png")
+	plt.close(fig)
+
+
+def bench_decimate(filename, rows, repeat):
+	columns = read_mag_log(filename)
+	t = np.arange(rows, dtype = float)
+	series = [columns[name] for name in ("x", "y", "z", "rt", "lt")]
+	full = best_time(render_series, t, series, False, repeat=1)
+	reduced = best_time(render_series, t, series, True, repeat=repeat)
+	print("render  5 x %6d points   every point %8.3f s" % (rows, full))
+	print("render  5 x %6d points   min/max     %8.3f s   %5.1fx" % (rows, reduced, full / reduced))
+
+
+SUN_STATIONS = (("Texas", 33.4679, -97.081), ("Alaska", 64.8, -147.7), ("Norway", 66.0, 14.0))
+
+
+def legacy_next_event(latitude, longitude, when, event, limit=400):
+	"""The original one day at a time search, stopped after limit steps where it never settles."""
+	day = when.date()
+	found = sunrisesunsetcalculator.sunrise_sunset(latitude, longitude, day)
+	steps = 0
+	while (found[event]["datetime"] - when).days != 0 and steps < limit:
+		if found[event]["datetime"] < when:
+			day += datetime.timedelta(days = 1)
+		else:
+			day -= datetime.timedelta(days = 1)
+		found = sunrisesunsetcalculator.sunrise_sunset(latitude, longitude, day)
+		steps += 1
+	return found
+
+
+def sun_moments(latitude, longitude, count, seed=0):
+	"""Random moments through 2024 that have both a sunrise and a sunset within a day or so."""
+	rng = np.random.default_rng(seed)
+	moments = []
+	while len(moments) < count:
+		when = datetime.datetime(2024, 1, 1) + datetime.timedelta(seconds = int(rng.integers(0, 366 * 86400)))
+		try:
+			sunrisesunsetcalculator.sunrise_sunset(latitude, longitude, when.date() - datetime.timedelta(days = 2))
+			sunrisesunsetcalculator.sunrise_sunset(latitude, longitude, when.date() + datetime.timedelta(days = 2))
+		except ValueError:
+			continue		# Midnight sun or polar night, the scalar code has no answer
+		moments.append(when)
+	return moments
+
+
+def bench_sun(rows, repeat):
+	count = max(rows // 100, 10)
+	for station, latitude, longitude in SUN_STATIONS:
+		moments = sun_moments(latitude, longitude, count)
+
+		def legacy():
+			for when in moments:
+				legacy_next_event(latitude, longitude, when, "sunrise")
+				legacy_next_event(latitude, longitude, when, "sunset")
+
+		def cold():
+			sunrisesunsetcalculator.sunrise_sunset_day.cache_clear()
+			for when in moments:
+				sunrisesunsetcalculator.time_of_next_sunrise_sunset(latitude, longitude, when)
+
+		def warm():
+			for when in moments:
+				sunrisesunsetcalculator.time_of_next_sunrise_sunset(latitude, longitude, when)
+
+		slow = best_time(legacy, repeat=1)
+		print("sun  %-7s %5d times   legacy loops    %8.3f s" % (station, count, slow))
+		for label, function, args in (("jump, cold cache", cold, ()), ("jump, warm cache", warm, ()),
+				("array          ", sunrisesunsetcalculator.next_sunrise_sunset_array, (latitude, longitude, moments))):
+			elapsed = best_time(function, *args, repeat=repeat)
+			print("sun  %-7s %5d times   %s %8.3f s   %5.1fx" % (station, count, label, elapsed, slow / elapsed))
+
+
+def measure(function, *args, repeat=3, memory=True):
+	"""Best wall time of several calls and, when memory is set, the peak traced allocation of one more call."""
+	result = {"seconds": best_time(function, *args, repeat=repeat)}
+	if memory:
+		tracemalloc.start()
+		try:
+			function(*args)
+			result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+		finally:
+			tracemalloc.stop()
+	return result
+
+
+def bench_pipeline(folder, names, repeat, roll_counts, memory=True):
+	"""Time each stage of graph_magnetic_day on the first log, and range binning over all of them.
+
+	Returns a dictionary of stage name to seconds and peak_bytes.
+	"""
+	results = {}
+
+	def record(stage, function, *args, count=None, repeat=repeat):
+		result = measure(function, *args, repeat=repeat, memory=memory)
+		results[stage] = result
+		rate = "%10.0f rows/s" % (count / result["seconds"]) if count else " " * 17
+		peak = "%8.1f MB peak" % (result["peak_bytes"] / 1e6) if "peak_bytes" in result else ""
+		print("%-26s %9.4f s %s %s" % (stage, result["seconds"], rate, peak))
+		return result
+
+	path = os.path.join(folder, names[0])
+	cache_dir = os.path.join(folder, "cache")
+	columns = read_mag_log(path)
+	rows = len(columns["epoch"])
+	ts = pd.read_json(path, lines=True, dtype=False, convert_dates=False)["ts"].to_numpy(dtype = str)
+	print("%s  %d readings, %d gaps over 1 s" % (names[0], rows, np.count_nonzero(np.diff(columns["epoch"]) > 1)))
+	record("parse", read_mag_log, path, count=rows)
+	record("timestamps", decode_timestamps, ts, count=rows)
+	record("cache write", lambda: (clear_cache(folder, names[0], cache_dir), load_columns(folder, names[0], cache_dir)), count=rows)
+	record("cache read", load_columns, folder, names[0], cache_dir, count=rows)
+	record("day array", day_from_columns, columns, columns["epoch"][0], count=rows)
+	readings = day_from_columns(columns, columns["epoch"][0])
+	for roll_count in roll_counts:
+		if roll_count > 1:	# At 1 aggregate_readings returns the day itself, there is nothing to time
+			for plot_type in PLOT_TYPES:
+				record("aggregate %s %d" % (plot_type, roll_count), aggregate_readings, readings, roll_count, plot_type, count=rows)
+		record("bin time average %d" % roll_count, bin_readings, columns["epoch"], readings,
+			int(columns["epoch"][0]) - int(columns["epoch"][0]) % 86400, roll_count, "average", count=rows)
+	# Timed on the full resolution day. The differential works in place, so each repeat
+	# gets a fresh copy of the day and the time includes that copy.
+	record("differential", lambda: differential(readings.copy()), count=rows)
+	day = datetime.datetime.strptime(columns["start_ts"], TS_FORMAT).date()
+	latitude, longitude = SUN_STATIONS[0][1:]
+
+	def sun_lines():
+		sunrisesunsetcalculator.sunrise_sunset_day.cache_clear()
+		sunrisesunsetcalculator.sunrise_sunset_day(latitude, longitude, day, SUN_T, SUN_TIMEZONE)
+
+	record("sun lines", sun_lines)
+	record("sun shading", sunrisesunsetcalculator.solar_zenith_angle, latitude, longitude,
+		int(columns["epoch"][0]) + np.arange(1600) * 54.0)	# One angle per pixel column of a day plot
+
+	stages = {}
+
+	def plot():
+		graph_magnetic_day(latitude, longitude, folder, names[0], "average", roll_counts[-1], 1, 1, 0, 1, 1, 1, 0,
+			cache_dir=cache_dir, shade=1, outfile=os.path.join(folder, "plot.png"), show=False,
+			progress=lambda stage, seconds, **info: stages.setdefault(stage, []).append(seconds))
+
+	record("graph_magnetic_day", plot, count=rows)
+	for stage, seconds in stages.items():		# Stages as reported by graph_magnetic_day itself
+		results["plot " + stage] = {"seconds": min(seconds)}
+		print("%-26s %9.4f s" % ("  plot " + stage, min(seconds)))
+	if len(names) > 1:
+		t0 = day_epoch(day)
+		for name in names:
+			load_columns(folder, name, cache_dir)	# Time the binning, not the first parse of each day
+		record("range bins %d days" % len(names), range_bins, folder, names, t0, 600, len(names) * 144, "average", cache_dir,
+			count=rows * len(names))
+	return results
+
+
+def save_results(filename, results, settings):
+	"""Write benchmark results with what they were measured on, for comparing versions."""
+	saved = {"version": 1, "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+		"machine": platform.machine(), "python": platform.python_version(), "numpy": np.__version__,
+		"pandas": pd.__version__, "matplotlib": matplotlib.__version__, "settings": settings, "stages": results}
+	with open(filename, "w") as f:
+		json.dump(saved, f, indent=1)
+
+
+def compare_results(filename, results, settings, slower=1.2):
+	"""Print each stage's time and peak memory against a saved results file."""
+	with open(filename) as f:
+		baseline = json.load(f)
+	if baseline["settings"] != settings:
+		print("Measured with other settings, before", baseline["settings"])
+	print("stage                        before      now   ratio   peak ratio    (%s, %s)" % (filename, baseline["created"]))
+	for stage, result in results.items():
+		old = baseline["stages"].get(stage)
+		if old is None:
+			continue
+		ratio = result["seconds"] / old["seconds"] if old["seconds"] else float("nan")
+		peak = ""
+		if "peak_bytes" in result and old.get("peak_bytes"):
+			peak = "%10.2f" % (result["peak_bytes"] / old["peak_bytes"])
+		print("%-26s %9.4f %9.4f %7.2f %s %s" % (stage, old["seconds"], result["seconds"], ratio, peak.ljust(10),
+			"SLOWER" if ratio > slower else ""))
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark the magnetometer graphing stages")
+	parser.add_argument("stage", choices=["ingest", "timestamps", "aggregate", "decimate", "sun", "pipeline"], help="stage to benchmark")
+	parser.add_argument("--rows", type=int, default=86400, help="rows in the synthetic log (default one day)")
+	parser.add_argument("--repeat", type=int, default=3, help="runs of the new code, best is reported")
+	parser.add_argument("--days", type=int, default=1, help="pipeline: daily logs to write, more than one adds range binning")
+	parser.add_argument("--gaps", type=int, default=0, help="pipeline: runs of missing readings in each log")
+	parser.add_argument("--spikes", type=int, default=0, help="pipeline: single reading spikes in each log")
+	parser.add_argument("--roll-count", type=int, action="append", help="pipeline: roll counts to aggregate with (default 1, 10, 60, 600)")
+	parser.add_argument("--no-memory", action="store_true", help="pipeline: skip the tracemalloc peak memory runs")
+	parser.add_argument("--json", help="pipeline: write the results to this file")
+	parser.add_argument("--compare", help="pipeline: results file of an earlier version to compare with")
+	args = parser.parse_args()
+
+	if args.stage == "sun":
+		bench_sun(args.rows, args.repeat)
+		return
+	with tempfile.TemporaryDirectory() as tmp:
+		if args.stage == "pipeline":
+			names = write_synthetic_days(tmp, args.days, args.rows, args.gaps, args.spikes)
+			roll_counts = args.roll_count or [1, 10, 60, 600]
+			results = bench_pipeline(tmp, names, args.repeat, roll_counts, not args.no_memory)
+			settings = {"rows": args.rows, "days": args.days, "gaps": args.gaps, "spikes": args.spikes,
+				"roll_counts": roll_counts, "repeat": args.repeat}
+			if args.compare:
+				compare_results(args.compare, results, settings)
+			if args.json:
+				save_results(args.json, results, settings)
+			return
+		filename = os.path.join(tmp, "synthetic-runmag.log")
+		write_synthetic_log(filename, args.rows)
+		if args.stage == "ingest":
+			bench_ingest(filename, args.rows, args.repeat)
+		if args.stage == "timestamps":
+			bench_timestamps(filename, args.rows, args.repeat)
+		if args.stage == "aggregate":
+			bench_aggregate(filename, args.rows, args.repeat)
+		if args.stage == "decimate":
+			bench_decimate(filename, args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+	main()
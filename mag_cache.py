@@ -0,0 +1,112 @@
+# Binary cache of decoded magnetometer log files
+# Each log file gets a folder of .npy column files under the cache directory (by default
+# .magcache inside the log file directory). The columns are loaded memory mapped, so a
+# second plot of the same day does not parse the json log again.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+
+
+import json
+import os
+import shutil
+import numpy as np
+
+from mag_ingest import read_mag_log, LOG_COLUMNS
+
+CACHE_DIR = ".magcache"		# Folder made inside the log file directory when no cache directory is configured
+CACHE_DTYPES = {"x": np.float32, "y": np.float32, "z": np.float32, "rt": np.float32, "lt": np.float32, "epoch": np.int64}
+CACHE_VERSION = 1
+
+
+def cache_folder(logfiles, filename, cache_dir=None):
+	"""Folder holding the cached columns of one log file."""
+	if not cache_dir:
+		cache_dir = os.path.join(logfiles, CACHE_DIR)
+	return os.path.join(cache_dir, filename)
+
+
+def file_stamp(path):
+	"""Size and modification time used to tell when a log file has changed."""
+	info = os.stat(path)
+	return {"size": info.st_size, "mtime_ns": info.st_mtime_ns}
+
+
+def read_stamp(folder):
+	try:
+		with open(os.path.join(folder, "stamp.json")) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return None
+
+
+def write_cache(folder, columns, stamp):
+	"""Save decoded columns as compact .npy files. The stamp file is written last."""
+	os.makedirs(folder, exist_ok=True)
+	stamp_file = os.path.join(folder, "stamp.json")
+	try:
+		os.remove(stamp_file)
+	except FileNotFoundError:
+		pass
+	# Each file is written under a temporary name and renamed, so several processes
+	# caching the same log (mag_batch.py) never leave a half written file behind.
+	temp = ".%d.tmp" % os.getpid()
+	for name, dtype in CACHE_DTYPES.items():
+		column_file = os.path.join(folder, name + ".npy")
+		with open(column_file + temp, "wb") as f:
+			np.save(f, np.asarray(columns[name], dtype = dtype))
+		os.replace(column_file + temp, column_file)
+	stamp = dict(stamp, version=CACHE_VERSION, start_ts=columns["start_ts"],
+		ts_format=columns["ts_format"], rows=len(columns["epoch"]))
+	with open(stamp_file + temp, "w") as f:
+		json.dump(stamp, f)
+	os.replace(stamp_file + temp, stamp_file)
+
+
+def read_cache(folder, stamp):
+	"""Memory map the cached columns, None if the cache is missing or out of date."""
+	saved = read_stamp(folder)
+	if saved is None or saved.get("version") != CACHE_VERSION:
+		return None
+	if saved["size"] != stamp["size"] or saved["mtime_ns"] != stamp["mtime_ns"]:
+		return None
+	columns = {}
+	try:
+		for name in CACHE_DTYPES:
+			columns[name] = np.load(os.path.join(folder, name + ".npy"), mmap_mode="r")
+	except (OSError, ValueError):
+		return None
+	columns["start_ts"] = saved["start_ts"]
+	columns["ts_format"] = saved["ts_format"]
+	return columns
+
+
+def load_columns(logfiles, filename, cache_dir=None):
+	"""Decoded columns of a log file, read from the cache when the log has not changed.
+
+	Returns the same dictionary as mag_ingest.read_mag_log() except the x, y,
+	z, rt and lt columns are float32 and all columns may be read only memory
+	maps. A log that has changed since it was cached is parsed and cached again.
+	"""
+	path = os.path.join(logfiles, filename)
+	stamp = file_stamp(path)
+	folder = cache_folder(logfiles, filename, cache_dir)
+	columns = read_cache(folder, stamp)
+	if columns is not None:
+		return columns
+	columns = read_mag_log(path)
+	try:
+		write_cache(folder, columns, stamp)
+	except OSError as error:	# A read only log directory still plots, just without the cache
+		print("Unable to cache", path, error)
+		return columns
+	return read_cache(folder, stamp) or columns
+
+
+def clear_cache(logfiles, filename=None, cache_dir=None):
+	"""Remove the cached columns of one log file or of every log file."""
+	if filename is None:
+		folder = cache_dir or os.path.join(logfiles, CACHE_DIR)
+	else:
+		folder = cache_folder(logfiles, filename, cache_dir)
+	shutil.rmtree(folder, ignore_errors=True)
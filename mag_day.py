@@ -0,0 +1,66 @@
+# Compact container for a day of magnetometer readings
+# A day is a numpy structured array with one 24 byte record per reading or aggregated point:
+# the int32 seconds from the day's start epoch and the float32 x, y, z, rt and lt values. That
+# is half the size of the float64 (rows, 6) vector_day it replaces. The fields are named, and
+# day_values() gives a (rows, 5) float32 view of all the readings, so aggregation, the
+# differential and plotting work on views of one array without copying columns out of it.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+
+
+import numpy as np
+
+from mag_aggregate import aggregate_blocks, bin_partials, finish_bins
+
+DAY_FIELDS = ("x", "y", "z", "rt", "lt")
+# t comes first so the five float32 fields follow each other and can be viewed as one 2-D array
+DAY_DTYPE = np.dtype([("t", np.int32)] + [(name, np.float32) for name in DAY_FIELDS])
+
+
+def new_day(rows):
+	"""Day array of rows records, values NaN and t zero."""
+	day = np.zeros(rows, dtype = DAY_DTYPE)
+	day_values(day)[:] = np.nan
+	return day
+
+
+def day_values(day):
+	"""(rows, 5) float32 view of the x, y, z, rt and lt fields, writing to it changes the day."""
+	return day.view(np.float32).reshape(len(day), len(DAY_FIELDS) + 1)[:, 1:]
+
+
+def day_from_columns(columns, start_epoch):
+	"""Day array of the readings of load_columns(), t counted from start_epoch."""
+	epoch = np.asarray(columns["epoch"])
+	day = np.empty(len(epoch), dtype = DAY_DTYPE)
+	np.subtract(epoch, start_epoch, out=day["t"], casting="unsafe")
+	for name in DAY_FIELDS:
+		day[name] = columns[name]
+	return day
+
+
+def aggregate_readings(day, roll_count, plot_type):
+	"""Reduce every roll_count readings of a day to one point, t taking the time of the last reading.
+
+	With a roll_count of 1 the day itself is returned, not a copy.
+	"""
+	if roll_count == 1:
+		return day
+	blocks = new_day(-(-len(day) // roll_count))
+	aggregate_blocks(day_values(day), roll_count, plot_type, out=day_values(blocks))
+	aggregate_blocks(day["t"], roll_count, "last_value", out=blocks["t"])
+	return blocks
+
+
+def bin_readings(epoch, day, day_start, roll_count, plot_type):
+	"""Aggregate a day onto a fixed grid of roll_count second bins covering the UTC day from day_start.
+
+	Missing readings leave NaN points. t holds the start of each bin in seconds
+	from day_start.
+	"""
+	n_bins = -(-86400 // roll_count)
+	bins = np.empty(n_bins, dtype = DAY_DTYPE)
+	finish_bins(bin_partials(epoch, day_values(day), day_start, roll_count, n_bins), plot_type, out=day_values(bins))
+	bins["t"] = np.arange(n_bins) * roll_count
+	return bins
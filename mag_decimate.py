@@ -0,0 +1,45 @@
+# Point reduction for plotting long runs of magnetometer readings
+# A 16 inch wide plot has little more than a thousand pixel columns, so plotting 86,400 one
+# second readings mostly draws dots on top of each other. Keeping only the lowest and highest
+# reading of each pixel column gives the same picture, spikes included, from far fewer points.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+
+
+import numpy as np
+
+
+def minmax_decimate(t, v, n_columns):
+	"""Reduce evenly spaced points to the minimum and maximum of each of n_columns slices.
+
+	Returns new t and v arrays holding at most 2*n_columns points in their
+	original order. NaN values (gaps) never win a slice, a slice holding only
+	NaN values is dropped. Data with no more points than columns is returned
+	unchanged.
+	"""
+	t = np.asarray(t)
+	v = np.asarray(v)
+	n = len(v)
+	if n_columns < 1 or n <= 2 * n_columns:
+		return t, v
+	per_column = -(-n // n_columns)
+	rows = -(-n // per_column)
+	padded = np.full(rows * per_column, np.nan)
+	padded[:n] = v
+	blocks = padded.reshape(rows, per_column)
+	missing = np.isnan(blocks)
+	low = np.argmin(np.where(missing, np.inf, blocks), axis=1)
+	high = np.argmax(np.where(missing, -np.inf, blocks), axis=1)
+	offset = np.arange(rows) * per_column
+	keep = ~missing.all(axis=1)
+	low = low[keep] + offset[keep]
+	high = high[keep] + offset[keep]
+	index = np.stack((np.minimum(low, high), np.maximum(low, high)), axis=1).ravel()
+	index = index[np.concatenate(([True], index[1:] != index[:-1]))]	# A flat slice gives one point
+	return t[index], v[index]
+
+
+def pixel_columns(ax):
+	"""Width of an axes in screen or file pixels."""
+	return int(ax.get_window_extent().width)
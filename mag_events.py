@@ -0,0 +1,206 @@
+# Running statistics and storm event alerts for the magnetometer log being written
+# The differential plots subtract the mean of the whole day, which is only known once the day
+# is over. Here every new reading updates the statistics in constant time: a Welford mean and
+# variance since the start, an exponentially weighted mean and variance that follow the recent
+# field, the rate of change dB/dt and the minimum and maximum of each axis. A detector watches
+# the updates and reports rapid changes and large excursions from the recent mean as they happen.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+#
+# Usage:  python3 mag_events.py [--file n5brg-20240606-runmag.log] [--axes H] [--dbdt 2] [--excursion 40]
+#         With no --file the newest .log file in logfiles is followed. Events are printed and
+#         appended as json lines to the events log file.
+
+
+import argparse
+import configparser
+import datetime
+import json
+import os
+import time
+import numpy as np
+
+from mag_tail import LogTail
+from mag_live import newest_log
+
+AXES = {"Z": 0, "E": 1, "H": 2}		# Letter used in mag_view.py -> x, y, z column
+AXIS_NAMES = ("Z (x) axis", "E (y) axis", "H (z) axis")
+TIME_CONSTANT = 600		# Seconds the exponentially weighted mean and variance look back
+MAX_GAP = 5				# Readings further apart than this give no dB/dt
+WARM_UP = 60			# Readings before the detector starts reporting
+
+
+class RunningStats:
+	"""Statistics of several channels updated one reading at a time in constant time."""
+
+	def __init__(self, channels=3, time_constant=TIME_CONSTANT):
+		self.time_constant = time_constant
+		self.count = 0
+		self.mean = np.zeros(channels)		# Welford, all readings so far
+		self.m2 = np.zeros(channels)
+		self.ew_mean = np.zeros(channels)	# Exponentially weighted
+		self.ew_var = np.zeros(channels)
+		self.minimum = np.full(channels, np.inf)
+		self.maximum = np.full(channels, -np.inf)
+		self.dbdt = np.full(channels, np.nan)
+		self.last = None
+		self.last_epoch = None
+
+	def update(self, epoch, values):
+		"""Add one reading taken at epoch seconds. NaN values leave the statistics unchanged."""
+		values = np.asarray(values, dtype = float)
+		if np.isnan(values).any():
+			return
+		self.count += 1
+		delta = values - self.mean
+		self.mean += delta / self.count
+		self.m2 += delta * (values - self.mean)
+		if self.count == 1:
+			self.ew_mean[:] = values
+			self.ew_var[:] = 0.0
+		else:
+			dt = max(epoch - self.last_epoch, 0)
+			alpha = 1.0 - np.exp(-dt / self.time_constant)	# Right weight for uneven spacing
+			delta = values - self.ew_mean
+			self.ew_mean += alpha * delta
+			self.ew_var = (1.0 - alpha) * (self.ew_var + alpha * delta * delta)
+			if 0 < dt <= MAX_GAP:
+				self.dbdt = (values - self.last) / dt
+			else:
+				self.dbdt = np.full(len(values), np.nan)
+		np.minimum(self.minimum, values, out=self.minimum)
+		np.maximum(self.maximum, values, out=self.maximum)
+		self.last = values
+		self.last_epoch = epoch
+
+	def variance(self):
+		"""Sample variance of all readings so far."""
+		if self.count < 2:
+			return np.full(len(self.mean), np.nan)
+		return self.m2 / (self.count - 1)
+
+	def summary(self):
+		return {"count": self.count, "mean": self.mean.tolist(), "std": np.sqrt(self.variance()).tolist(),
+			"ew_mean": self.ew_mean.tolist(), "ew_std": np.sqrt(self.ew_var).tolist(),
+			"minimum": self.minimum.tolist(), "maximum": self.maximum.tolist(), "dbdt": self.dbdt.tolist()}
+
+
+class EventDetector:
+	"""Report readings whose dB/dt or distance from the recent mean passes a threshold.
+
+	Values are in nT, dbdt in nT per second. An event is reported when a test
+	first passes its threshold on an axis and again only after it has dropped
+	back below half of it, so one disturbance gives one event and not one per
+	second. Each event is a dictionary passed to every callback.
+	"""
+
+	def __init__(self, axes="H", dbdt=2.0, excursion=40.0, callbacks=None, time_constant=TIME_CONSTANT):
+		self.columns = [AXES[letter] for letter in axes.upper() if letter in AXES]
+		self.thresholds = {"dbdt": float(dbdt), "excursion": float(excursion)}
+		self.callbacks = list(callbacks or [])
+		self.stats = RunningStats(3, time_constant)
+		self.active = set()		# (test, column) pairs over threshold
+
+	def feed(self, epoch, values):
+		"""Update with one reading of x, y, z in nT and check the thresholds. Returns the new events."""
+		stats = self.stats
+		stats.update(epoch, values)
+		if stats.count < WARM_UP or stats.last_epoch != epoch:
+			return []
+		found = []
+		for column in self.columns:
+			measured = {"dbdt": stats.dbdt[column], "excursion": stats.last[column] - stats.ew_mean[column]}
+			for test, value in measured.items():
+				if np.isnan(value):
+					continue
+				key = (test, column)
+				threshold = self.thresholds[test]
+				if abs(value) >= threshold and key not in self.active:
+					self.active.add(key)
+					found.append({"epoch": int(epoch),
+						"ts": datetime.datetime.fromtimestamp(int(epoch), datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+						"test": test, "axis": AXIS_NAMES[column], "value": round(float(value), 3),
+						"threshold": threshold, "mean": round(float(stats.ew_mean[column]), 3)})
+				elif abs(value) < threshold / 2:
+					self.active.discard(key)
+		for event in found:
+			for callback in self.callbacks:
+				callback(event)
+		return found
+
+	def feed_columns(self, columns, first=0):
+		"""Feed rows first onwards of a column dictionary (x, y, z in uT). Returns the new events."""
+		epoch = columns["epoch"]
+		# Only the new rows are stacked, the live buffer holds the whole day so far
+		values = np.column_stack((columns["x"][first:], columns["y"][first:], columns["z"][first:])) * 1000	# uT to nT
+		found = []
+		for n, row in enumerate(values):
+			found += self.feed(int(epoch[first + n]), row)
+		return found
+
+
+def event_logger(filename):
+	"""Callback that appends each event as a json line to filename."""
+	def write(event):
+		with open(filename, "a") as f:
+			f.write(json.dumps(event) + "\n")
+	return write
+
+
+def print_event(event):
+	print("%s  %-9s %-11s %9.3f (threshold %g)" % (event["ts"], event["test"], event["axis"], event["value"], event["threshold"]))
+
+
+def watch(logfiles, filename, detector, interval=10, polls=None):
+	"""Follow a log file (the newest when filename is None) and feed new readings to the detector."""
+	follow = filename is None
+	filename = filename or newest_log(logfiles)
+	tail = LogTail(os.path.join(logfiles, filename))
+	fed = 0
+	while True:
+		if follow:
+			newest = newest_log(logfiles)
+			if newest is not None and newest != filename:
+				filename = newest
+				tail = LogTail(os.path.join(logfiles, newest))
+				fed = 0
+		tail.poll()
+		if tail.buffer.length < fed:	# The file was replaced and read again from the start
+			fed = 0
+		if tail.buffer.length > fed:
+			detector.feed_columns(tail.columns(), fed)
+			fed = tail.buffer.length
+		if polls is not None:
+			polls -= 1
+			if polls <= 0:
+				break
+		time.sleep(interval)
+	return detector
+
+
+def main():
+	parser = configparser.ConfigParser(allow_no_value=True)
+	parser.read('./configure_mag_graph')
+	events = parser['events'] if parser.has_section('events') else {}
+
+	args = argparse.ArgumentParser(description="Watch the magnetometer log for rapid changes and large excursions")
+	args.add_argument("--file", help="log file in logfiles to follow (default newest)")
+	args.add_argument("--interval", type=float, default=float(parser.get('live', 'interval', fallback='10') or '10'),
+		help="seconds between reads of the log")
+	args.add_argument("--axes", default=events.get('axes') or "H", help="axes to watch, any of H E Z (default H)")
+	args.add_argument("--dbdt", type=float, default=float(events.get('dbdt') or 2.0), help="dB/dt threshold in nT/s")
+	args.add_argument("--excursion", type=float, default=float(events.get('excursion') or 40.0),
+		help="threshold in nT for the distance from the %d second mean" % TIME_CONSTANT)
+	args.add_argument("--events", default=events.get('logfile') or "mag_events.log", help="file the events are appended to")
+	opts = args.parse_args()
+
+	detector = EventDetector(opts.axes, opts.dbdt, opts.excursion, [print_event, event_logger(opts.events)])
+	try:
+		watch(parser['directories']['logfiles'], opts.file, detector, opts.interval)
+	except KeyboardInterrupt:
+		print(json.dumps(detector.stats.summary()))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,166 @@
+# Index of the log directory kept in a small SQLite database
+# For each log file the database holds its date, first and last time stamps, number of readings,
+# number of gaps, the minimum and maximum of each axis and the largest 3 hour range of H, used to
+# pick out disturbed days. Only files whose size or modification time changed are read again,
+# so listing and filtering years of logs does not open any of them.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+#
+# Usage:  python3 mag_index.py [--from 2024-06-01] [--to 2024-06-30] [--disturbed]
+
+
+import argparse
+import configparser
+import contextlib
+import datetime
+import os
+import sqlite3
+import numpy as np
+
+from mag_cache import cache_folder, file_stamp, read_cache, CACHE_DIR
+from mag_ingest import read_mag_log
+from mag_aggregate import bin_partials
+from mag_archive import list_logs
+
+INDEX_FILE = "index.sqlite"
+INDEX_VERSION = 1
+RANGE_SECONDS = 10800	# H range is taken over 3 hour blocks, as for the K index
+DISTURBED_NT = 100.0	# Default 3 hour H range (nT) above which a day counts as disturbed
+
+FIELDS = ("name", "size", "mtime_ns", "day", "first_ts", "last_ts", "first_epoch", "last_epoch", "rows", "gaps",
+	"x_min", "x_max", "y_min", "y_max", "z_min", "z_max", "h_range")
+
+
+def index_path(logfiles, cache_dir=None):
+	"""The database sits in the cache directory, by default logfiles/.magcache."""
+	return os.path.join(cache_dir or os.path.join(logfiles, CACHE_DIR), INDEX_FILE)
+
+
+def open_index(path):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	db = sqlite3.connect(path, timeout=30)
+	db.row_factory = sqlite3.Row
+	if db.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+		db.execute("DROP TABLE IF EXISTS logs")
+		db.execute("PRAGMA user_version = %d" % INDEX_VERSION)
+	db.execute("CREATE TABLE IF NOT EXISTS logs (name TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, day TEXT, "
+		"first_ts TEXT, last_ts TEXT, first_epoch INTEGER, last_epoch INTEGER, rows INTEGER, gaps INTEGER, "
+		"x_min REAL, x_max REAL, y_min REAL, y_max REAL, z_min REAL, z_max REAL, h_range REAL)")
+	db.execute("CREATE INDEX IF NOT EXISTS logs_day ON logs (day)")
+	return db
+
+
+def utc_text(epoch):
+	return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def log_metadata(logfiles, filename, cache_dir=None):
+	"""Summary of one log file for the index.
+
+	An up to date column cache is used when there is one, otherwise the log
+	is parsed without writing a cache, so indexing years of logs does not
+	fill the cache directory or expand every compressed archive to disk.
+	"""
+	path = os.path.join(logfiles, filename)
+	stamp = file_stamp(path)
+	row = dict.fromkeys(FIELDS)
+	row.update(name=filename, size=stamp["size"], mtime_ns=stamp["mtime_ns"], rows=0, gaps=0)
+	columns = read_cache(cache_folder(logfiles, filename, cache_dir), stamp)
+	if columns is None:
+		columns = read_mag_log(path)
+	epoch = np.asarray(columns["epoch"])
+	if len(epoch) == 0:
+		return row
+	first = int(epoch[0])
+	last = int(epoch[-1])
+	row.update(first_ts=utc_text(first), last_ts=utc_text(last), first_epoch=first, last_epoch=last, rows=len(epoch),
+		gaps=int(np.count_nonzero(np.diff(epoch) > 1)), day=utc_text(first)[:10])
+	for name in ("x", "y", "z"):
+		values = np.asarray(columns[name])
+		row[name + "_min"] = float(np.nanmin(values))
+		row[name + "_max"] = float(np.nanmax(values))
+	t0 = first - first % RANGE_SECONDS
+	blocks = bin_partials(epoch, columns["z"], t0, RANGE_SECONDS, (last - t0) // RANGE_SECONDS + 1)
+	filled = blocks["count"] > 0
+	row["h_range"] = float(np.max(blocks["maximum"][filled] - blocks["minimum"][filled])) * 1000	# uT to nT
+	return row
+
+
+def refresh_index(logfiles, cache_dir=None, progress=None):
+	"""Bring the index up to date with the log directory.
+
+	Files that are new or whose size or mtime changed are read, entries of
+	removed files are dropped. progress, when given, is called with (done,
+	total, name) after each file is read. Returns (files read, entries removed).
+	"""
+	names = list_logs(logfiles)
+	with contextlib.closing(open_index(index_path(logfiles, cache_dir))) as db:
+		known = {row["name"]: (row["size"], row["mtime_ns"]) for row in db.execute("SELECT name, size, mtime_ns FROM logs")}
+		changed = []
+		for name in names:
+			try:
+				info = os.stat(os.path.join(logfiles, name))
+			except OSError:
+				continue
+			if known.get(name) != (info.st_size, info.st_mtime_ns):
+				changed.append(name)
+		removed = set(known) - set(names)
+		with db:
+			db.executemany("DELETE FROM logs WHERE name = ?", [(name,) for name in removed])
+		for done, name in enumerate(changed, 1):
+			try:
+				row = log_metadata(logfiles, name, cache_dir)
+			except (OSError, ValueError, KeyError) as error:
+				print("Unable to index", name, error)
+				continue
+			with db:		# Commit each file so an interrupted refresh keeps what it did
+				db.execute("INSERT OR REPLACE INTO logs VALUES (%s)" % ", ".join("?" * len(FIELDS)), [row[field] for field in FIELDS])
+			if progress is not None:
+				progress(done, len(changed), name)
+	return len(changed), len(removed)
+
+
+def find_logs(logfiles, cache_dir=None, start=None, end=None, disturbed=None):
+	"""Index rows (dictionaries) of the logs from start to end (dates), oldest first.
+
+	disturbed, when given, is a 3 hour H range in nT: only days reaching it
+	are returned.
+	"""
+	query = "SELECT * FROM logs WHERE 1"
+	args = []
+	if start is not None:
+		query += " AND day >= ?"
+		args.append(start.isoformat())
+	if end is not None:
+		query += " AND day <= ?"
+		args.append(end.isoformat())
+	if disturbed is not None:
+		query += " AND h_range >= ?"
+		args.append(float(disturbed))
+	query += " ORDER BY day, name"
+	with contextlib.closing(open_index(index_path(logfiles, cache_dir))) as db:
+		return [dict(row) for row in db.execute(query, args)]
+
+
+def main():
+	parser = configparser.ConfigParser(allow_no_value=True)
+	parser.read('./configure_mag_graph')
+	threshold = parser.get('index', 'disturbed', fallback=None) or DISTURBED_NT
+
+	args = argparse.ArgumentParser(description="Update and search the index of the magnetometer log directory")
+	args.add_argument("--logfiles", default=parser['directories']['logfiles'], help="log file directory")
+	args.add_argument("--from", dest="start", type=datetime.date.fromisoformat, help="first UTC date, YYYY-MM-DD")
+	args.add_argument("--to", dest="end", type=datetime.date.fromisoformat, help="last UTC date, YYYY-MM-DD")
+	args.add_argument("--disturbed", action="store_true", help="only days whose 3 hour H range reaches %s nT" % threshold)
+	opts = args.parse_args()
+
+	cache_dir = parser['directories'].get('cache')
+	read, removed = refresh_index(opts.logfiles, cache_dir)
+	print("%d files read, %d removed" % (read, removed))
+	for row in find_logs(opts.logfiles, cache_dir, opts.start, opts.end, threshold if opts.disturbed else None):
+		print("%-36s %s %6d rows %4d gaps  H range %7.1f nT" % (row["name"], row["day"], row["rows"], row["gaps"], row["h_range"] or 0))
+
+
+if __name__ == "__main__":
+	main()
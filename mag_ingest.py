@@ -0,0 +1,302 @@
+# Column oriented reader for the TAPR RM3100 magnetometer log files
+# The log files hold one json record per line, for example:
+# { "ts":"03 Jun 2024 00:00:05", "rt":22.56, "lt":24.44, "x":-40.0122, "y":-4.9095, "z":-24.1351, ... }
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+
+
+import calendar
+import datetime
+import gzip
+import io
+import lzma
+import numpy as np
+import pandas as pd
+
+try:
+	import zstandard	# Optional, only needed for .log.zst archives
+except ImportError:
+	zstandard = None
+
+TS_FORMAT = '%d %b %Y %H:%M:%S'		# Time stamp format written by the TAPR logger
+LOG_COLUMNS = ("x", "y", "z", "rt", "lt")	# Readings used by the plotting programs
+UNIX_EPOCH = pd.Timestamp(0, tz="UTC")
+
+
+def empty_columns():
+	"""Return a column dictionary holding no readings."""
+	columns = {name: np.empty([0], dtype = float) for name in LOG_COLUMNS}
+	columns["epoch"] = np.empty([0], dtype = np.int64)
+	columns["start_ts"] = ""
+	columns["ts_format"] = None
+	return columns
+
+
+# Time stamp formats that are recognised, the TAPR logger format is tried first.
+TS_FORMATS = (TS_FORMAT, '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%d/%m/%Y %H:%M:%S')
+FIELD_WIDTHS = {'d': 2, 'm': 2, 'b': 3, 'Y': 4, 'H': 2, 'M': 2, 'S': 2}
+MONTHS = np.array([b"Jan", b"Feb", b"Mar", b"Apr", b"May", b"Jun",
+	b"Jul", b"Aug", b"Sep", b"Oct", b"Nov", b"Dec"])
+MONTH_KEYS = (MONTHS.view("S1").view(np.uint8).reshape(12, 3).astype(np.int32) * [65536, 256, 1]).sum(axis=1)
+
+ts_format_cache = {}	# Time stamp format found for each log file, filename -> format
+
+# Log file names that are read, plain or compressed, and the compression of each
+LOG_SUFFIXES = {".log": None, ".log.gz": "gzip", ".log.xz": "xz", ".log.zst": "zstd"}
+CHUNK_BYTES = 4 << 20	# Bytes of log text parsed at a time when reading a file
+
+
+def detect_ts_format(stamp):
+	"""Return the entry of TS_FORMATS that parses one time stamp."""
+	for ts_format in TS_FORMATS:
+		try:
+			datetime.datetime.strptime(stamp, ts_format)
+			return ts_format
+		except ValueError:
+			pass
+	raise ValueError("Unrecognised log time stamp: %r" % (stamp,))
+
+
+def stamp_epoch(stamp, ts_format):
+	"""UTC epoch seconds of a single time stamp."""
+	return calendar.timegm(datetime.datetime.strptime(stamp, ts_format).timetuple())
+
+
+def field_offsets(ts_format):
+	"""Character offset of each field in a fixed width time stamp, None if not fixed width."""
+	offsets = {}
+	position = 0
+	n = 0
+	while n < len(ts_format):
+		if ts_format[n] == '%':
+			field = ts_format[n+1]
+			if field not in FIELD_WIDTHS:
+				return None
+			offsets[field] = position
+			position += FIELD_WIDTHS[field]
+			n += 2
+		else:
+			position += 1
+			n += 1
+	offsets["width"] = position
+	return offsets
+
+
+def stamp_bytes(ts, width):
+	"""View the time stamps as an (n, width) uint8 array, None if any stamp has another length."""
+	raw = np.asarray(ts).astype("S%d" % (width + 1))
+	if raw.dtype.itemsize != width + 1:
+		return None
+	chars = raw.view(np.uint8).reshape(len(raw), width + 1)
+	if chars[:, width].any() or not chars[:, width-1].all():
+		return None
+	return chars[:, :width]
+
+
+def digits(chars, offset, count):
+	value = np.zeros(len(chars), dtype = np.int64)
+	for n in range(offset, offset + count):
+		value = value * 10 + chars[:, n] - 48
+	return value
+
+
+def seconds_of_day(chars, offsets):
+	return digits(chars, offsets['H'], 2) * 3600 + digits(chars, offsets['M'], 2) * 60 + digits(chars, offsets['S'], 2)
+
+
+def days_from_civil(year, month, day):
+	"""Days since 1970-01-01 for arrays of proleptic Gregorian dates."""
+	year = year - (month <= 2)
+	era = year // 400
+	yoe = year - era * 400
+	doy = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+	doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+	return era * 146097 + doe - 719468
+
+
+def decode_fixed_width(chars, offsets):
+	"""Decode fixed width time stamps from their bytes, None if the bytes do not fit the format."""
+	for field in ('d', 'm', 'Y', 'H', 'M', 'S'):
+		if field in offsets:
+			block = chars[:, offsets[field]:offsets[field] + FIELD_WIDTHS[field]]
+			if ((block < 48) | (block > 57)).any():
+				return None
+	if 'b' in offsets:
+		name = chars[:, offsets['b']:offsets['b'] + 3].astype(np.int32)
+		key = name[:, 0] * 65536 + name[:, 1] * 256 + name[:, 2]
+		order = np.argsort(MONTH_KEYS)
+		found = np.clip(np.searchsorted(MONTH_KEYS[order], key), 0, 11)
+		if (MONTH_KEYS[order][found] != key).any():
+			return None
+		month = order[found] + 1
+	else:
+		month = digits(chars, offsets['m'], 2)
+	days = days_from_civil(digits(chars, offsets['Y'], 4), month, digits(chars, offsets['d'], 2))
+	return days * 86400 + seconds_of_day(chars, offsets)
+
+
+def dates_match(chars, offsets, epoch):
+	"""True when the date digits of every stamp agree with the day of its epoch.
+
+	The date bytes of each row are compared with those of the first row of
+	the same day, and that first row is decoded in full, so the check costs
+	one byte comparison per row.
+	"""
+	columns = np.concatenate([np.arange(offsets[field], offsets[field] + FIELD_WIDTHS[field])
+		for field in ('d', 'm', 'b', 'Y') if field in offsets])
+	dates = chars[:, columns]
+	day = epoch // 86400
+	starts = np.concatenate(([0], np.flatnonzero(np.diff(day)) + 1, [len(day)]))
+	for start, end in zip(starts[:-1], starts[1:]):
+		decoded = decode_fixed_width(chars[start:start + 1], offsets)
+		if decoded is None or decoded[0] != epoch[start]:
+			return False
+		if not (dates[start:end] == dates[start]).all():
+			return False
+	return True
+
+
+def decode_timestamps(ts, ts_format=None):
+	"""Convert a column of log time stamps to int64 UTC epoch seconds.
+
+	The format is detected from the first stamp unless ts_format is given.
+	A log with strictly increasing one second samples is recognised from its
+	first and last stamps and its time of day and date digits, otherwise
+	every stamp is decoded from its bytes. No datetime object is made per row.
+	"""
+	ts = np.asarray(ts)
+	rows = len(ts)
+	if rows == 0:
+		return np.empty([0], dtype = np.int64)
+	if ts_format is None:
+		ts_format = detect_ts_format(ts[0])
+	offsets = field_offsets(ts_format)
+	chars = None
+	if offsets is not None:
+		chars = stamp_bytes(ts, offsets["width"])
+
+	# Fast path, one reading every second with no gaps or repeats
+	first = stamp_epoch(ts[0], ts_format)
+	if rows > 1 and stamp_epoch(ts[-1], ts_format) - first == rows - 1:
+		epoch = np.arange(first, first + rows, dtype = np.int64)
+		if chars is not None and np.array_equal(seconds_of_day(chars, offsets), epoch % 86400) \
+			and dates_match(chars, offsets, epoch):
+			return epoch
+
+	if chars is not None:
+		epoch = decode_fixed_width(chars, offsets)
+		if epoch is not None:
+			return epoch
+	stamps = pd.to_datetime(pd.Series(ts), format=ts_format, utc=True)
+	return ((stamps - UNIX_EPOCH) // pd.Timedelta(seconds=1)).to_numpy(dtype = np.int64)
+
+
+def parse_log_lines(source, ts_format=None):
+	"""Parse json lines log data into numpy column arrays in one pass.
+
+	source may be a path, an open file or the raw bytes of some log lines.
+	Returns a dictionary with float arrays x, y, z, rt, lt, the int64 array
+	epoch (UTC seconds), start_ts, the time stamp string of the first row,
+	and ts_format, the time stamp format found (or given) for the data.
+	"""
+	if isinstance(source, (bytes, bytearray)):
+		if not source.strip():
+			return empty_columns()
+		source = io.BytesIO(source)
+	df = pd.read_json(source, lines=True, dtype=False, convert_dates=False)
+	if len(df) == 0:
+		return empty_columns()
+
+	columns = {}
+	for name in LOG_COLUMNS:
+		columns[name] = pd.to_numeric(df[name]).to_numpy(dtype = float)
+	ts = df["ts"].to_numpy(dtype = str)
+	if ts_format is None:
+		ts_format = detect_ts_format(ts[0])
+	columns["epoch"] = decode_timestamps(ts, ts_format)
+	columns["start_ts"] = ts[0]
+	columns["ts_format"] = ts_format
+	return columns
+
+
+def log_suffix(name):
+	"""The entry of LOG_SUFFIXES a file name ends with, None if it is not a log file."""
+	for suffix in sorted(LOG_SUFFIXES, key=len, reverse=True):
+		if name.endswith(suffix):
+			return suffix
+	return None
+
+
+def is_log_name(name):
+	return log_suffix(name) is not None
+
+
+def log_stem(name):
+	"""File name without the .log or compressed log suffix."""
+	suffix = log_suffix(name)
+	return name[:-len(suffix)] if suffix else name
+
+
+def open_log(filename):
+	"""Open a plain or compressed log file for reading bytes, decompressing as it is read."""
+	compression = LOG_SUFFIXES.get(log_suffix(filename))
+	if compression == "gzip":
+		return gzip.open(filename, "rb")
+	if compression == "xz":
+		return lzma.open(filename, "rb")
+	if compression == "zstd":
+		if zstandard is None:
+			raise ValueError("Reading %s needs the zstandard package (pip install zstandard)" % filename)
+		f = open(filename, "rb")
+		return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f, closefd=True))
+	return open(filename, "rb")
+
+
+def read_chunks(f, chunk_bytes=CHUNK_BYTES):
+	"""Blocks of complete lines read from a binary file."""
+	remainder = b""
+	while True:
+		data = f.read(chunk_bytes)
+		if not data:
+			break
+		data = remainder + data
+		end = data.rfind(b"\n") + 1
+		remainder = data[end:]
+		if end:
+			yield data[:end]
+	if remainder.strip():
+		yield remainder + b"\n"
+
+
+def join_columns(parts):
+	"""One column dictionary from the column dictionaries of consecutive blocks of lines."""
+	parts = [part for part in parts if len(part["epoch"])]
+	if not parts:
+		return empty_columns()
+	if len(parts) == 1:
+		return parts[0]
+	columns = {name: np.concatenate([part[name] for part in parts]) for name in LOG_COLUMNS + ("epoch",)}
+	columns["start_ts"] = parts[0]["start_ts"]
+	columns["ts_format"] = parts[0]["ts_format"]
+	return columns
+
+
+def read_mag_log(filename):
+	"""Read a whole magnetometer log file, plain or compressed, into numpy column arrays.
+
+	The file is decompressed and parsed CHUNK_BYTES at a time, so the text of
+	a whole day is never held in memory at once.
+	"""
+	ts_format = ts_format_cache.get(filename)
+	parts = []
+	with open_log(filename) as f:
+		for chunk in read_chunks(f):
+			part = parse_log_lines(chunk, ts_format)
+			if part["ts_format"] is not None:
+				ts_format = part["ts_format"]
+			parts.append(part)
+	columns = join_columns(parts)
+	if columns["ts_format"] is not None:
+		ts_format_cache[filename] = columns["ts_format"]
+	return columns
@@ -0,0 +1,258 @@
+# Live display of the magnetometer log the TAPR logger is writing today
+# One figure is kept open. Every refresh only the newly logged lines are parsed and only the
+# data points are redrawn over a saved copy of the static parts of the plot (blitting).
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+#
+# Usage:  python3 mag_live.py [--file n5brg-20240606-runmag.log] [--interval 10] [--roll-count 60]
+#         With no --file the newest .log file in logfiles is followed, moving to the next day's
+#         file when the logger starts it.
+
+
+import argparse
+import configparser
+import datetime
+import os
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.ticker as ticker
+
+from sunrisesunsetcalculator import sunrise_sunset_day
+from graph_mag_log import differential, SUN_T, SUN_TIMEZONE
+from mag_ingest import TS_FORMAT
+from mag_tail import LogTail
+from mag_aggregate import bin_partials, merge_partials, finish_bins
+from mag_day import new_day, day_values, DAY_FIELDS
+
+
+def newest_log(logfiles):
+	"""Name of the most recently modified .log file in the log directory."""
+	names = [name for name in os.listdir(logfiles) if name.endswith(".log")]
+	if not names:
+		return None
+	return max(names, key=lambda name: os.path.getmtime(os.path.join(logfiles, name)))
+
+
+class LivePlot:
+	"""Figure for one day of readings that is updated in place as the log grows."""
+
+	def __init__(self, lat, long, logfiles, filename, plot_type, roll_count, tr_show, tl_show, raw, H, E, Z, vmag):
+		self.latitude = float(lat)
+		self.longitude = float(long)
+		self.logfiles = logfiles
+		self.follow = filename is None		# Follow the newest log file when none is named
+		self.filename = filename or newest_log(logfiles)
+		self.roll_count = int(roll_count)
+		self.plot_type = "single" if self.roll_count == 1 else plot_type
+		self.raw = int(raw)
+		self.vmag = int(vmag)
+		self.tail = LogTail(os.path.join(logfiles, self.filename))
+		self.background = None
+		self.partials = None	# Running bin totals of the readings binned so far
+		self.binned = 0		# Rows of the tail buffer already in partials
+		self.first_epoch = None
+		self.day = None		# Bins of the day so far, a mag_day.py day array
+
+		self.fig = plt.figure()
+		self.fig.set_size_inches(16, 8)
+		self.ax1 = self.fig.add_subplot(111)
+		self.ax3 = self.ax1.twinx()
+		self.lines = {}		# Day array field (or "vmag") -> Line2D
+		if self.vmag == 1:
+			self.add_line(self.ax1, "vmag", "Vector Magnitude", "orange")
+		else:
+			if int(Z) == 1:
+				self.add_line(self.ax1, "x", "Z (x) axis", "red")
+			if int(E) == 1:
+				self.add_line(self.ax1, "y", "E (y) axis", "blue")
+			if int(H) == 1:
+				self.add_line(self.ax1, "z", "H (z) axis", "black")
+		if int(tr_show) == 1:
+			self.add_line(self.ax3, "rt", "Sensor Temp", "green")
+		if int(tl_show) == 1:
+			self.add_line(self.ax3, "lt", "RPi Temp", "brown")
+		self.fig.canvas.mpl_connect("draw_event", self.on_draw)
+
+	def add_line(self, ax, field, label, color):
+		line, = ax.plot([], [], '.', label=label, color=color, animated=True)
+		self.lines[field] = line
+
+	def layout(self):
+		"""Draw the parts of the plot that only change when the day or the y range changes."""
+		ax1 = self.ax1
+		ax3 = self.ax3
+		for ax in (ax1, ax3):
+			for artist in ax.lines[:] + ax.texts[:]:
+				if not artist.get_animated():
+					artist.remove()
+		ax1.set_xlim(0, 24)
+		ax1.xaxis.set_major_locator(ticker.MultipleLocator(1))
+		ax1.set_xlabel("UTC Hour of Day")
+		if self.raw == 1:
+			ax1.set_ylabel('Magnetic Flux (uT)')
+		else:
+			ax1.set_ylabel('Differential Magnetic Flux (nT)')
+		ax1.yaxis.grid(True, which='major')
+		ax1.legend(frameon=False, loc='lower center', ncol=3, fontsize=20)
+		if "rt" in self.lines or "lt" in self.lines:
+			ax3.set_ylabel('Temperature (C)')
+			ax3.set_ylim(0, 50)
+			ax3.legend(loc=0)
+		else:
+			ax3.set_yticks([])
+		title = 'TAPR Magnatometer @ N5BRG Lat=' + str(self.latitude) + ' Log=' + str(self.longitude) + '\n ' + \
+			'Live Plot Type: ' + str(self.plot_type) + '  ' + self.tail.start_ts
+		ax1.set_title(title, fontsize=14, fontname='Monospace', color='tab:blue')
+
+		if self.tail.start_ts:
+			day = datetime.datetime.strptime(self.tail.start_ts, TS_FORMAT)
+			sun = sunrise_sunset_day(self.latitude, self.longitude, day.date(), SUN_T, SUN_TIMEZONE)
+			noon = sun["solarNoon"]["solarNoon_time"]
+			events = (("Sun Zenith Noon", noon, 0.80),
+				("Midnight", datetime.time((noon.hour + 12) % 24, noon.minute, noon.second), 0.85),
+				("Sunrise", sun["sunrise"]["sunrise_time"], 0.85),
+				("Sunset", sun["sunset"]["sunset_time"], 0.85))
+			for label, at, height in events:
+				hour = at.hour + at.minute / 60 + at.second / 3600
+				ax1.axvline(x=hour, color='gray', linestyle='-', linewidth=2)
+				ax1.text(hour / 24, height, label, rotation=90, transform=ax1.transAxes)
+
+	def on_draw(self, event):
+		"""Save the static background after every full draw (start, resize or y range change)."""
+		self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+		self.draw_lines()
+
+	def draw_lines(self):
+		for line in self.lines.values():
+			line.axes.draw_artist(line)
+
+	def start_bins(self, epoch):
+		"""Empty bin totals for the UTC day of the first reading."""
+		self.day_start = int(epoch) - int(epoch) % 86400
+		self.first_epoch = int(epoch)
+		self.binned = 0
+		n_bins = -(-86400 // self.roll_count)
+		self.partials = bin_partials(np.empty([0], dtype = np.int64), np.empty([0, len(DAY_FIELDS)]), self.day_start, self.roll_count, n_bins)
+		self.day = new_day(n_bins)
+		self.day["t"] = np.arange(n_bins) * self.roll_count
+
+	def binned_day(self):
+		"""Fold the newly logged readings into the fixed day grid and return the binned day.
+
+		Only the new rows are binned and only the bins they fall in are
+		finished again, so a refresh costs in proportion to what was logged
+		since the last one.
+		"""
+		columns = self.tail.columns()
+		epoch = columns["epoch"]
+		if self.partials is None or len(epoch) < self.binned or int(epoch[0]) != self.first_epoch:
+			self.start_bins(epoch[0])	# A new log file, or the log was replaced
+		new_epoch = epoch[self.binned:]
+		if len(new_epoch):
+			n_bins = len(self.day)
+			low = max((int(new_epoch.min()) - self.day_start) // self.roll_count, 0)
+			high = min((int(new_epoch.max()) - self.day_start) // self.roll_count, n_bins - 1) + 1
+			if low < high:
+				readings = np.column_stack([columns[name][self.binned:] for name in DAY_FIELDS])
+				touched = {name: array[low:high] for name, array in self.partials.items()}
+				merge_partials(touched, bin_partials(new_epoch, readings, self.day_start + low * self.roll_count,
+					self.roll_count, high - low))
+				finish_bins(touched, self.plot_type, out=day_values(self.day)[low:high])
+			self.binned = len(epoch)
+		day = self.day.copy()
+		if self.raw == 1:
+			for name in ("x", "y", "z"):
+				np.abs(day[name], out=day[name])
+		else:
+			differential(day)
+		return day
+
+	def y_range_changed(self, values):
+		low = np.nanmin(values)
+		high = np.nanmax(values)
+		bottom, top = self.ax1.get_ylim()
+		if low >= bottom and high <= top and (high - low) > 0.5 * (top - bottom):
+			return False
+		margin = 0.1 * (high - low) or 1.0
+		self.ax1.set_ylim(low - margin, high + margin)
+		return True
+
+	def update(self):
+		"""Timer callback, parse new log lines and redraw only the data points."""
+		switched_file = False
+		if self.follow:
+			newest = newest_log(self.logfiles)
+			if newest is not None and newest != self.filename:
+				self.filename = newest
+				self.tail = LogTail(os.path.join(self.logfiles, newest))
+				self.partials = None
+				switched_file = True
+		if self.tail.poll() == 0 and not switched_file:
+			return
+		if self.tail.buffer.length == 0:
+			return
+		day = self.binned_day()
+		hours = day["t"] / 3600
+		for field, line in self.lines.items():
+			if field == "vmag":
+				values = np.hypot(np.hypot(day["x"], day["y"]), day["z"])
+			else:
+				values = day[field]
+			line.set_data(hours, values)
+		if self.lines:
+			shown = [line.get_ydata() for line in self.lines.values() if line.axes is self.ax1]
+			rescale = bool(shown) and self.y_range_changed(np.concatenate(shown))
+		else:
+			rescale = False
+		if switched_file or self.background is None or rescale or not self.ax1.texts:
+			self.layout()
+			self.fig.canvas.draw_idle()		# Full redraw, on_draw saves the new background
+			return
+		self.fig.canvas.restore_region(self.background)
+		self.draw_lines()
+		self.fig.canvas.blit(self.fig.bbox)
+		self.fig.canvas.flush_events()
+
+	def run(self, interval):
+		"""Show the figure and refresh it every interval seconds until the window is closed."""
+		self.layout()
+		self.update()
+		timer = self.fig.canvas.new_timer(interval=int(interval * 1000))
+		timer.add_callback(self.update)
+		timer.start()
+		plt.show()
+
+
+def live_magnetic_day(lat, long, logfiles, filename, plot_type, roll_count_str, tr_show, tl_show, raw, H, E, Z, vmag, interval=10):
+	"""Open a live plot of a log file (the newest one when filename is None)."""
+	if filename is not None:
+		filename = filename.replace("'","").replace("]","")
+	LivePlot(lat, long, logfiles, filename, plot_type, roll_count_str, tr_show, tl_show, raw, H, E, Z, vmag).run(float(interval))
+
+
+def main():
+	parser = configparser.ConfigParser(allow_no_value=True)
+	parser.read('./configure_mag_graph')
+	default_interval = parser.get('live', 'interval', fallback='10') or '10'
+
+	args = argparse.ArgumentParser(description="Live plot of the magnetometer log being written")
+	args.add_argument("--file", help="log file in logfiles to follow (default newest)")
+	args.add_argument("--interval", type=float, default=float(default_interval), help="seconds between refreshes")
+	args.add_argument("--plot-type", default="average", help="plot type used for each bin")
+	args.add_argument("--roll-count", type=int, default=60, help="seconds grouped into each plotted point")
+	args.add_argument("--raw", action="store_true", help="plot absolute field strength instead of differential")
+	args.add_argument("--vmag", action="store_true", help="plot the vector magnitude")
+	args.add_argument("--axes", default="HEZ", help="axes to show, any of H E Z (default HEZ)")
+	args.add_argument("--temps", default="", help="temperatures to show, any of R (sensor) L (RPi)")
+	opts = args.parse_args()
+
+	axes = opts.axes.upper()
+	temps = opts.temps.upper()
+	live_magnetic_day(parser['location']['lattitude'], parser['location']['longitude'], parser['directories']['logfiles'],
+		opts.file, opts.plot_type, opts.roll_count, int("R" in temps), int("L" in temps), int(opts.raw),
+		int("H" in axes), int("E" in axes), int("Z" in axes), int(opts.vmag), opts.interval)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,232 @@
+# Multi-resolution summary of a day of magnetometer readings for fast zooming
+# The readings are placed on a one second grid from UTC midnight. Level k of the pyramid holds
+# the min, max and mean of every 2**k seconds. A zoomed view only draws the level that gives
+# about one point per pixel column for the visible time range, so panning and zooming from the
+# whole day down to a few minutes of one second readings never touches the full data.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+#
+# Usage:  python3 mag_pyramid.py [--file n5brg-20240606-runmag.log] [--raw] [--axes HEZ]
+
+
+import argparse
+import configparser
+import math
+import os
+import numpy as np
+import matplotlib.pyplot as plt
+
+from mag_cache import load_columns, cache_folder, file_stamp
+from mag_aggregate import bin_partials
+from mag_archive import list_logs
+
+PYRAMID_COLUMNS = ("x", "y", "z", "rt", "lt")
+PYRAMID_FILE = "pyramid.npz"
+PYRAMID_VERSION = 1
+
+
+def pair_up(values, empty):
+	"""Split a level into pairs of neighbouring bins, padding an odd length with empty."""
+	if len(values) % 2:
+		values = np.concatenate((values, np.full((1,) + values.shape[1:], empty, dtype = values.dtype)))
+	return values[0::2], values[1::2]
+
+
+def build_pyramid(columns):
+	"""Min, max and mean of each column at bin sizes of 1, 2, 4 ... seconds, down to one bin for the whole day.
+
+	Returns a dictionary with day_start (epoch of UTC midnight) and a list of
+	levels. Each level is a dictionary of (bins, 5) float32 arrays minimum,
+	maximum and mean plus the count of readings in each bin. Bins with no
+	readings hold NaN.
+	"""
+	epoch = np.asarray(columns["epoch"])
+	day_start = int(epoch[0]) - int(epoch[0]) % 86400
+	values = np.column_stack([np.asarray(columns[name], dtype = float) for name in PYRAMID_COLUMNS])
+	partials = bin_partials(epoch, values, day_start, 1, 86400)
+	count = partials["count"]
+	filled = count > 0
+	mean = np.full((86400, values.shape[1]), np.nan)
+	mean[filled] = partials["sum"][filled] / count[filled][:, np.newaxis]
+	low = np.where(filled[:, np.newaxis], partials["minimum"], np.nan)
+	high = np.where(filled[:, np.newaxis], partials["maximum"], np.nan)
+	levels = [{"minimum": low, "maximum": high, "mean": mean, "count": count}]
+	while len(levels[-1]["count"]) > 1:
+		level = levels[-1]
+		count_a, count_b = pair_up(level["count"], 0)
+		low_a, low_b = pair_up(level["minimum"], np.nan)
+		high_a, high_b = pair_up(level["maximum"], np.nan)
+		mean_a, mean_b = pair_up(level["mean"], np.nan)
+		count = count_a + count_b
+		total = np.nan_to_num(mean_a) * count_a[:, np.newaxis] + np.nan_to_num(mean_b) * count_b[:, np.newaxis]
+		with np.errstate(invalid="ignore", divide="ignore"):
+			mean = np.where(count[:, np.newaxis] > 0, total / count[:, np.newaxis], np.nan)
+		levels.append({"minimum": np.fmin(low_a, low_b), "maximum": np.fmax(high_a, high_b), "mean": mean, "count": count})
+	for level in levels:
+		for name in ("minimum", "maximum", "mean"):
+			level[name] = level[name].astype(np.float32)
+		level["count"] = level["count"].astype(np.int32)
+	return {"day_start": day_start, "levels": levels}
+
+
+def save_pyramid(filename, pyramid, stamp):
+	arrays = {"stamp": np.array([stamp["size"], stamp["mtime_ns"], pyramid["day_start"], PYRAMID_VERSION], dtype = np.int64)}
+	for k, level in enumerate(pyramid["levels"]):
+		for name, array in level.items():
+			if k == 0 and name in ("minimum", "maximum"):
+				continue		# The same as the mean for one second bins
+			arrays["L%d_%s" % (k, name)] = array
+	temp = filename + ".%d.tmp.npz" % os.getpid()
+	np.savez(temp, **arrays)
+	os.replace(temp, filename)
+
+
+def read_pyramid(filename, stamp):
+	"""Load a saved pyramid, None when it is missing or was built from an older log file."""
+	try:
+		with np.load(filename) as saved:
+			size, mtime_ns, day_start, version = saved["stamp"]
+			if size != stamp["size"] or mtime_ns != stamp["mtime_ns"] or version != PYRAMID_VERSION:
+				return None
+			levels = []
+			k = 0
+			while ("L%d_count" % k) in saved:
+				level = {"count": saved["L%d_count" % k], "mean": saved["L%d_mean" % k]}
+				if k == 0:
+					level["minimum"] = level["maximum"] = level["mean"]
+				else:
+					level["minimum"] = saved["L%d_minimum" % k]
+					level["maximum"] = saved["L%d_maximum" % k]
+				levels.append(level)
+				k += 1
+	except (OSError, ValueError, KeyError):
+		return None
+	return {"day_start": int(day_start), "levels": levels}
+
+
+def load_pyramid(logfiles, filename, cache_dir=None):
+	"""Pyramid of a log file, built and saved in the log's cache folder the first time."""
+	stamp = file_stamp(os.path.join(logfiles, filename))
+	folder = cache_folder(logfiles, filename, cache_dir)
+	saved = os.path.join(folder, PYRAMID_FILE)
+	pyramid = read_pyramid(saved, stamp)
+	if pyramid is not None:
+		return pyramid
+	pyramid = build_pyramid(load_columns(logfiles, filename, cache_dir))
+	try:
+		os.makedirs(folder, exist_ok=True)
+		save_pyramid(saved, pyramid, stamp)
+	except OSError as error:
+		print("Unable to save pyramid", saved, error)
+	return pyramid
+
+
+def choose_level(pyramid, seconds, pixels):
+	"""Coarsest level that still gives at least one bin per pixel column over seconds."""
+	if seconds <= pixels:
+		return 0
+	return min(int(math.log2(seconds / pixels)), len(pyramid["levels"]) - 1)
+
+
+def level_points(pyramid, column, start, end, pixels):
+	"""Time (hours of the UTC day) and value points covering start to end seconds of the day.
+
+	Each bin of the chosen level gives its minimum and maximum so spikes survive,
+	level 0 gives the one second readings themselves.
+	"""
+	k = choose_level(pyramid, max(end - start, 1), pixels)
+	level = pyramid["levels"][k]
+	size = 2 ** k
+	first = max(int(start // size) - 1, 0)
+	last = min(int(end // size) + 2, len(level["count"]))
+	hours = (np.arange(first, last) * size + size / 2) / 3600
+	if k == 0:
+		return hours, level["mean"][first:last, column], k
+	low = level["minimum"][first:last, column]
+	high = level["maximum"][first:last, column]
+	return np.repeat(hours, 2), np.stack((low, high), axis=1).ravel(), k
+
+
+class ZoomView:
+	"""Day plot that redraws from the pyramid whenever the visible time range changes."""
+
+	def __init__(self, ax, pyramid, series, pixels):
+		self.ax = ax
+		self.pyramid = pyramid
+		self.series = series		# (column, offset, scale, use_abs, Line2D)
+		self.pixels = pixels
+		ax.callbacks.connect("xlim_changed", self.on_xlim)
+
+	def on_xlim(self, ax):
+		if not self.series:
+			return
+		start, end = ax.get_xlim()
+		start = max(start, 0) * 3600
+		end = min(end, 24) * 3600
+		for column, offset, scale, use_abs, line in self.series:
+			hours, values, k = level_points(self.pyramid, column, start, end, self.pixels)
+			values = (values - offset) * scale
+			if use_abs:
+				values = np.abs(values)
+			line.set_data(hours, values)
+		self.ax.set_title("Bin size %d second(s)" % (2 ** k), loc="right", fontsize=10)
+		self.ax.figure.canvas.draw_idle()
+
+
+def zoom_magnetic_day(lat, long, logfiles, filename, raw, H, E, Z, cache_dir=None):
+	"""Interactive plot of one day that can be zoomed from 24 hours to single seconds."""
+	filename = filename.replace("'","").replace("]","")
+	pyramid = load_pyramid(logfiles, filename, cache_dir)
+	fig = plt.figure()
+	fig.set_size_inches(16, 8)
+	ax = fig.add_subplot(111)
+	top = pyramid["levels"][-1]["mean"][0]		# Whole day mean of each column
+	series = []
+	for column, show, label, color in ((0, Z, "Z (x) axis", "red"), (1, E, "E (y) axis", "blue"), (2, H, "H (z) axis", "black")):
+		if int(show) == 1:
+			line, = ax.plot([], [], '.', label=label, color=color)
+			if int(raw) == 1:
+				series.append((column, 0.0, 1.0, True, line))
+			else:
+				series.append((column, float(top[column]), 1000.0, False, line))
+	ax.set_xlabel("UTC Hour of Day")
+	if int(raw) == 1:
+		ax.set_ylabel('Magnetic Flux (uT)')
+	else:
+		ax.set_ylabel('Differential Magnetic Flux (nT)')
+	ax.legend(frameon=False, loc='lower center', ncol=3, fontsize=20)
+	ax.yaxis.grid(True, which='major')
+	ax.set_title('TAPR Magnatometer @ N5BRG Lat=' + str(lat) + ' Log=' + str(long) + '\n ' + filename,
+		fontsize=14, fontname='Monospace', color='tab:blue')
+	# Matplotlib only keeps a weak reference to the callback, so hold on to the view
+	view = ZoomView(ax, pyramid, series, int(ax.get_window_extent().width))
+	ax.set_xlim(0, 24)
+	ax.relim()
+	ax.autoscale_view(scalex=False)
+	plt.show()
+	return view
+
+
+def main():
+	parser = configparser.ConfigParser(allow_no_value=True)
+	parser.read('./configure_mag_graph')
+	logfiles = parser['directories']['logfiles']
+
+	args = argparse.ArgumentParser(description="Zoomable plot of one day of magnetometer readings")
+	args.add_argument("--file", help="log file in logfiles (default newest)")
+	args.add_argument("--raw", action="store_true", help="plot absolute field strength instead of differential")
+	args.add_argument("--axes", default="HEZ", help="axes to show, any of H E Z (default HEZ)")
+	opts = args.parse_args()
+
+	filename = opts.file
+	if not filename:
+		names = list_logs(logfiles)
+		filename = names[-1]
+	axes = opts.axes.upper()
+	zoom_magnetic_day(parser['location']['lattitude'], parser['location']['longitude'], logfiles, filename,
+		int(opts.raw), int("H" in axes), int("E" in axes), int("Z" in axes), parser['directories'].get('cache'))
+
+
+if __name__ == "__main__":
+	main()
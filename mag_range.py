@@ -0,0 +1,211 @@
+# Plot of magnetometer readings over a range of days or weeks
+# The daily log files in the range are read one at a time and added into a fixed grid of time
+# bins, so memory depends on the number of points plotted and not on the number of readings.
+# Bins are placed by UTC epoch time, so a storm crossing midnight stays continuous.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+#
+# Usage:  python3 mag_range.py 2024-06-01 2024-06-14 [--plot-type average] [--roll-count 600]
+#                  [--outfile range.png] [--show]
+
+
+import argparse
+import calendar
+import configparser
+import datetime
+import os
+import re
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+
+from mag_ingest import is_log_name
+from mag_archive import log_index
+from mag_cache import load_columns
+from mag_aggregate import bin_partials, merge_partials, finish_bins
+from mag_day import new_day, day_values, DAY_FIELDS
+from mag_decimate import minmax_decimate, pixel_columns
+from sunrisesunsetcalculator import sun_events
+from graph_mag_log import differential, SUN_T, SUN_TIMEZONE
+
+DATE_IN_NAME = re.compile(r"(20\d{2})(\d{2})(\d{2})")	# n5brg-20240606-runmag.log
+RANGE_POINTS = 2000		# Bins used when no roll count is given
+
+
+def log_date(logfiles, filename):
+	"""UTC date a log file starts on, from its name or else from its index."""
+	found = DATE_IN_NAME.search(filename)
+	if found:
+		try:
+			return datetime.date(int(found.group(1)), int(found.group(2)), int(found.group(3)))
+		except ValueError:
+			pass
+	try:
+		index = log_index(logfiles, filename)
+	except (OSError, ValueError):
+		return None
+	if index.get("first_epoch") is None:
+		return None
+	return datetime.datetime.fromtimestamp(index["first_epoch"], datetime.timezone.utc).date()
+
+
+def resolve_range_files(logfiles, start_date, end_date):
+	"""Log files in logfiles that can hold readings from start_date to end_date, oldest first.
+
+	The file of the day before start_date is included as it may run past midnight.
+	"""
+	found = []
+	for name in os.listdir(logfiles):
+		if not is_log_name(name):
+			continue
+		day = log_date(logfiles, name)
+		if day is not None and start_date - datetime.timedelta(days=1) <= day <= end_date:
+			found.append((day, name))
+	return [name for day, name in sorted(found)]
+
+
+def day_epoch(day):
+	return calendar.timegm(day.timetuple())
+
+
+def range_bins(logfiles, names, t0, bin_seconds, n_bins, plot_type, cache_dir=None):
+	"""Stream log files onto one grid of n_bins bins of bin_seconds from epoch t0.
+
+	Only one file's columns are held at a time. Returns a day array
+	(mag_day.py) of the bins, t the start of each bin in seconds from t0 and
+	NaN values for bins that have no readings, and the number of readings used.
+	"""
+	total = None
+	for name in names:
+		columns = load_columns(logfiles, name, cache_dir)
+		if len(columns["epoch"]) == 0:
+			continue
+		values = np.column_stack([columns[column] for column in DAY_FIELDS])
+		total = merge_partials(total, bin_partials(columns["epoch"], values, t0, bin_seconds, n_bins))
+		del columns, values
+	day = new_day(n_bins)
+	day["t"] = np.arange(n_bins) * bin_seconds
+	if total is None:
+		return day, 0
+	finish_bins(total, plot_type, out=day_values(day))
+	return day, int(total["count"].sum())
+
+
+def graph_magnetic_range(lat, long, logfiles, start_date, end_date, plot_type, roll_count, tr_show, tl_show, raw, H, E, Z, vmag,
+		cache_dir=None, outfile='mag_range.png', show=True):
+	"""Plot every reading from the start of start_date to the end of end_date (UTC dates)."""
+	latitude = float(lat)
+	longitude = float(long)
+	t0 = day_epoch(start_date)
+	seconds = day_epoch(end_date) + 86400 - t0
+	if roll_count:
+		bin_seconds = int(roll_count)
+	else:
+		bin_seconds = max(1, -(-seconds // RANGE_POINTS))
+	if bin_seconds == 1:
+		plot_type = "single"
+	n_bins = -(-seconds // bin_seconds)
+	names = resolve_range_files(logfiles, start_date, end_date)
+	day, readings = range_bins(logfiles, names, t0, bin_seconds, n_bins, plot_type, cache_dir)
+	if readings == 0:
+		raise ValueError("No readings found from %s to %s in %s" % (start_date, end_date, logfiles))
+
+	if int(raw) == 1:
+		for name in ("x", "y", "z"):
+			np.abs(day[name], out=day[name])
+	else:
+		differential(day)	# About the mean of the whole range, in nT
+
+	when = (np.datetime64(t0, 's') + day["t"].astype('timedelta64[s]')).astype(datetime.datetime)
+	when = mdates.date2num(when)
+	fig = plt.figure()
+	fig.set_size_inches(16, 8)
+	ax1 = fig.add_subplot(111)
+	ax3 = ax1.twinx()
+	series = []
+	if int(vmag) == 1:
+		series.append((ax1, np.hypot(np.hypot(day["x"], day["y"]), day["z"]), "Vector Magnitude", "orange"))
+	else:
+		if int(Z) == 1:
+			series.append((ax1, day["x"], "Z (x) axis", "red"))
+		if int(E) == 1:
+			series.append((ax1, day["y"], "E (y) axis", "blue"))
+		if int(H) == 1:
+			series.append((ax1, day["z"], "H (z) axis", "black"))
+	if int(tr_show) == 1:
+		series.append((ax3, day["rt"], "Sensor Temp", "green"))
+	if int(tl_show) == 1:
+		series.append((ax3, day["lt"], "RPi Temp", "brown"))
+	for ax, values, label, color in series:
+		t, v = minmax_decimate(when, values, pixel_columns(ax))
+		ax.plot(t, v, '.', label=label, color=color)
+
+	for day in range(seconds // 86400 + 1):		# UTC midnight lines
+		ax1.axvline(x=mdates.date2num(start_date + datetime.timedelta(days=day)), color='lightgray', linewidth=1)
+	# Sunrise, solar noon and sunset of every day in the range from one vector evaluation
+	days = np.arange(np.datetime64(start_date), np.datetime64(end_date) + 1)
+	sun = sun_events(latitude, longitude, days, SUN_T, SUN_TIMEZONE)
+	for event, color, style in (("sunrise", "goldenrod", "--"), ("solarNoon", "gray", "-"), ("sunset", "purple", "--")):
+		known = sun[event][sun[event] != np.iinfo(np.int64).min]		# No sunrise or sunset near the poles
+		ax1.vlines(mdates.date2num(known.astype('datetime64[s]').astype(datetime.datetime)), 0, 1,
+			transform=ax1.get_xaxis_transform(), colors=color, linestyles=style, linewidth=1)
+	ax1.set_xlim(when[0], mdates.date2num(end_date + datetime.timedelta(days=1)))
+	locator = mdates.AutoDateLocator()
+	ax1.xaxis.set_major_locator(locator)
+	ax1.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+	ax1.set_xlabel("UTC Date, {} second bins".format(bin_seconds))
+	if int(raw) == 1:
+		ax1.set_ylabel('Magnetic Flux (uT)')
+	else:
+		ax1.set_ylabel('Differential Magnetic Flux (nT)')
+	ax1.yaxis.grid(True, which='major')
+	ax1.legend(frameon=False, loc='lower center', ncol=3, fontsize=20)
+	if int(tr_show) == 1 or int(tl_show) == 1:
+		ax3.set_ylabel('Temperature (C)')
+		ax3.set_ylim(0, 50)
+		ax3.legend(loc=0)
+	else:
+		ax3.set_yticks([])
+	title = 'TAPR Magnatometer @ N5BRG Lat=' + str(latitude) + ' Log=' + str(longitude) + '\n ' + 'Plot Type: ' + \
+		str(plot_type) + '  ' + str(start_date) + ' to ' + str(end_date)
+	ax1.set_title(title, fontsize=14, fontname='Monospace', color='tab:blue')
+
+	plt.savefig(outfile)
+	if show:
+		plt.show()
+	else:
+		plt.close(fig)
+	return outfile
+
+
+def main():
+	parser = configparser.ConfigParser(allow_no_value=True)
+	parser.read('./configure_mag_graph')
+
+	args = argparse.ArgumentParser(description="Plot magnetometer readings over a range of UTC dates")
+	args.add_argument("start", type=datetime.date.fromisoformat, help="first UTC date, YYYY-MM-DD")
+	args.add_argument("end", type=datetime.date.fromisoformat, help="last UTC date, YYYY-MM-DD")
+	args.add_argument("--logfiles", default=parser['directories']['logfiles'], help="log file directory")
+	args.add_argument("--plot-type", default="average", help="plot type used for each bin")
+	args.add_argument("--roll-count", type=int, help="seconds per bin (default about %d points)" % RANGE_POINTS)
+	args.add_argument("--raw", action="store_true", help="plot absolute field strength instead of differential")
+	args.add_argument("--vmag", action="store_true", help="plot the vector magnitude")
+	args.add_argument("--axes", default="HEZ", help="axes to show, any of H E Z (default HEZ)")
+	args.add_argument("--temps", default="", help="temperatures to show, any of R (sensor) L (RPi)")
+	args.add_argument("--outfile", default="mag_range.png", help="PNG file to write")
+	args.add_argument("--show", action="store_true", help="also open the plot in a window")
+	opts = args.parse_args()
+
+	if not opts.show:
+		plt.switch_backend("Agg")
+	axes = opts.axes.upper()
+	temps = opts.temps.upper()
+	graph_magnetic_range(parser['location']['lattitude'], parser['location']['longitude'], opts.logfiles,
+		opts.start, opts.end, opts.plot_type, opts.roll_count, int("R" in temps), int("L" in temps), int(opts.raw),
+		int("H" in axes), int("E" in axes), int("Z" in axes), int(opts.vmag), parser['directories'].get('cache'),
+		opts.outfile, opts.show)
+
+
+if __name__ == "__main__":
+	main()
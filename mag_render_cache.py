@@ -0,0 +1,127 @@
+# Disk cache of finished plots and aggregated days
+# A plot is stored under a key made from every setting that changes it plus the size and
+# modification time of its log file, so asking again for a combination already drawn copies the
+# saved PNG instead of reading and drawing the day. The aggregated day arrays are kept
+# the same way, so changing only how a day is drawn skips the aggregation. The least recently
+# used files are removed when the cache grows past its size limit.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+
+
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+
+from mag_cache import CACHE_DIR
+
+RENDER_DIR = "renders"		# Folder made inside the cache directory when none is configured
+RENDER_MB = 200
+RENDER_VERSION = 2		# 2: days are mag_day.py arrays
+
+
+class RenderCache:
+	"""Folder of cached PNG files and .npz day arrays kept under max_bytes in total."""
+
+	def __init__(self, folder, max_bytes=RENDER_MB << 20):
+		self.folder = folder
+		self.max_bytes = max_bytes
+
+	def key(self, stamp, *settings):
+		"""Hex key of a log file's stamp (file_stamp) and the settings of a result."""
+		text = json.dumps([RENDER_VERSION, stamp["size"], stamp["mtime_ns"]] + [str(setting) for setting in settings])
+		return hashlib.sha1(text.encode()).hexdigest()
+
+	def path(self, key, suffix):
+		return os.path.join(self.folder, key + suffix)
+
+	def touch(self, path):
+		"""Mark a file as just used, eviction goes by modification time."""
+		try:
+			os.utime(path)
+		except OSError:
+			pass
+
+	def fetch(self, key, suffix, outfile):
+		"""Copy a cached file to outfile. Returns False when it is not cached."""
+		path = self.path(key, suffix)
+		try:
+			shutil.copyfile(path, outfile)
+		except OSError:
+			return False
+		self.touch(path)
+		return True
+
+	def store(self, key, suffix, source):
+		"""Keep a copy of the file source under key."""
+		try:
+			os.makedirs(self.folder, exist_ok=True)
+			temp = self.path(key, suffix) + ".%d.tmp" % os.getpid()
+			shutil.copyfile(source, temp)
+			os.replace(temp, self.path(key, suffix))
+		except OSError as error:
+			print("Unable to cache", source, error)
+			return
+		self.evict()
+
+	def load_day(self, key):
+		"""(day, start_ts, start_epoch, rows) saved by save_day, None when not cached."""
+		path = self.path(key, ".npz")
+		try:
+			with np.load(path) as saved:
+				day = (saved["day"], str(saved["start_ts"]), int(saved["start_epoch"]), int(saved["rows"]))
+		except (OSError, ValueError, KeyError):
+			return None
+		self.touch(path)
+		return day
+
+	def save_day(self, key, day):
+		points, start_ts, start_epoch, rows = day
+		try:
+			os.makedirs(self.folder, exist_ok=True)
+			temp = self.path(key, ".%d.tmp.npz" % os.getpid())
+			np.savez(temp, day=points, start_ts=np.str_(start_ts), start_epoch=start_epoch, rows=rows)
+			os.replace(temp, self.path(key, ".npz"))
+		except OSError as error:
+			print("Unable to cache day", error)
+			return
+		self.evict()
+
+	def evict(self):
+		"""Remove the least recently used files until the folder is under max_bytes."""
+		files = []
+		total = 0
+		try:
+			entries = list(os.scandir(self.folder))
+		except OSError:
+			return
+		for entry in entries:
+			if entry.name.endswith(".tmp") or ".tmp." in entry.name or not entry.is_file():
+				continue
+			info = entry.stat()
+			files.append((info.st_mtime_ns, info.st_size, entry.path))
+			total += info.st_size
+		files.sort()
+		for mtime_ns, size, path in files:
+			if total <= self.max_bytes:
+				break
+			try:
+				os.remove(path)
+			except OSError:
+				continue
+			total -= size
+
+	def clear(self):
+		shutil.rmtree(self.folder, ignore_errors=True)
+
+
+def render_cache(parser, logfiles):
+	"""RenderCache set up from the [directories] section of configure_mag_graph, None when turned off."""
+	directories = parser['directories'] if parser.has_section('directories') else {}
+	megabytes = float(directories.get('renders_mb') or RENDER_MB)
+	if megabytes <= 0:
+		return None
+	folder = directories.get('renders') or os.path.join(directories.get('cache') or os.path.join(logfiles, CACHE_DIR), RENDER_DIR)
+	return RenderCache(folder, int(megabytes * (1 << 20)))
@@ -0,0 +1,191 @@
+# Power spectra of the magnetometer readings for watching geomagnetic pulsations
+# The one second readings are streamed through a fixed size ring buffer. Every STEP seconds the
+# last SEGMENT seconds are windowed and transformed, giving one column of a spectrogram, and the
+# columns are averaged into a Welch power spectral density for the day. Memory is set by the
+# segment length and the number of columns, not by the number of readings.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+#
+# Usage:  python3 mag_spectrum.py [--file n5brg-20240606-runmag.log] [--segment 1024] [--outfile spectrum.png]
+
+
+import argparse
+import configparser
+import os
+import numpy as np
+import matplotlib.pyplot as plt
+
+from mag_cache import load_columns
+from mag_aggregate import bin_partials, finish_bins
+from mag_archive import list_logs
+
+SEGMENT = 1024		# Seconds in each transform, about 17 minutes, resolves Pc5 periods up to 10 minutes
+CHANNELS = ("Z (x) axis", "E (y) axis", "H (z) axis", "Vector Magnitude")
+COLORS = ("red", "blue", "black", "orange")
+MAX_MISSING = 0.1	# Segments with more missing seconds than this are left out
+# Continuous pulsation bands, (name, shortest period, longest period) in seconds
+PULSATION_BANDS = (("Pc3", 10, 45), ("Pc4", 45, 150), ("Pc5", 150, 600))
+
+
+class SpectrumStream:
+	"""Overlapping window FFT of evenly spaced samples fed in blocks of any length.
+
+	feed() takes (samples, channels) arrays one second apart. Each time step new
+	samples have arrived and the ring buffer holds a full segment, the segment
+	has its mean removed, a Hann window applied and its one sided power spectral
+	density added to the running Welch average and the spectrogram. Missing
+	samples (NaN) are replaced by the segment mean, segments with more than
+	MAX_MISSING of them give a NaN spectrogram column and are not averaged.
+	"""
+
+	def __init__(self, channels, segment=SEGMENT, step=None, sample_rate=1.0):
+		self.channels = channels
+		self.segment = segment
+		self.step = step or segment // 2
+		self.sample_rate = sample_rate
+		self.ring = np.full((segment, channels), np.nan)
+		self.position = 0		# Next ring row to write
+		self.seen = 0			# Samples fed so far
+		self.window = np.hanning(segment)
+		self.scale = 1.0 / (sample_rate * np.sum(self.window ** 2))
+		self.frequencies = np.fft.rfftfreq(segment, 1.0 / sample_rate)
+		self.total = np.zeros((len(self.frequencies), channels))
+		self.used = 0
+		self.times = []			# Sample index at the centre of each spectrogram column
+		self.columns = []		# (frequencies, channels) float32 power of each column
+
+	def feed(self, block):
+		block = np.asarray(block, dtype = float).reshape(-1, self.channels)
+		start = 0
+		while start < len(block):
+			# Copy up to the next segment boundary in one slice
+			due = self.step - (self.seen - self.segment) % self.step if self.seen >= self.segment else self.segment - self.seen
+			count = min(len(block) - start, due, self.segment - self.position)
+			self.ring[self.position:self.position + count] = block[start:start + count]
+			self.position = (self.position + count) % self.segment
+			self.seen += count
+			start += count
+			if self.seen >= self.segment and (self.seen - self.segment) % self.step == 0:
+				self.transform()
+
+	def transform(self):
+		segment = np.concatenate((self.ring[self.position:], self.ring[:self.position]))
+		missing = np.isnan(segment)
+		self.times.append(self.seen - self.segment / 2)
+		if missing.mean(axis=0).max() > MAX_MISSING:
+			self.columns.append(np.full(self.total.shape, np.nan, dtype = np.float32))
+			return
+		mean = np.nanmean(segment, axis=0)
+		segment = np.where(missing, 0.0, segment - mean)
+		spectrum = np.fft.rfft(segment * self.window[:, np.newaxis], axis=0)
+		power = np.square(np.abs(spectrum)) * self.scale
+		power[1:-1] *= 2		# Fold in the negative frequencies, not at DC or Nyquist
+		self.total += power
+		self.used += 1
+		self.columns.append(power.astype(np.float32))
+
+	def psd(self):
+		"""Welch average of the segments so far, NaN before the first usable segment."""
+		if self.used == 0:
+			return np.full(self.total.shape, np.nan)
+		return self.total / self.used
+
+	def spectrogram(self):
+		"""(times, (columns, frequencies, channels) power) of every segment so far."""
+		if not self.columns:
+			return np.empty(0), np.empty((0,) + self.total.shape, dtype = np.float32)
+		return np.array(self.times) / self.sample_rate, np.stack(self.columns)
+
+
+def day_samples(columns):
+	"""Readings of a day on a one second grid from UTC midnight as x, y, z and |B| in nT, NaN where missing."""
+	epoch = np.asarray(columns["epoch"])
+	day_start = int(epoch[0]) - int(epoch[0]) % 86400
+	values = np.column_stack([np.asarray(columns[name], dtype = float) for name in ("x", "y", "z")])
+	samples = finish_bins(bin_partials(epoch, values, day_start, 1, 86400), "average") * 1000	# uT to nT
+	magnitude = np.sqrt(np.sum(np.square(samples), axis=1))
+	return day_start, np.column_stack((samples, magnitude))
+
+
+def spectrum_day(logfiles, filename, segment=SEGMENT, step=None, cache_dir=None, block=3600):
+	"""Stream a day of readings through a SpectrumStream an hour at a time."""
+	day_start, samples = day_samples(load_columns(logfiles, filename, cache_dir))
+	stream = SpectrumStream(samples.shape[1], segment, step)
+	for start in range(0, len(samples), block):
+		stream.feed(samples[start:start + block])
+	return day_start, stream
+
+
+def plot_spectrum(stream, title, outfile='spectrum.png', show=True):
+	"""Day PSD of every channel above one spectrogram panel per channel."""
+	frequencies = stream.frequencies[1:]		# Leave out DC, it has no place on a log axis
+	psd = stream.psd()[1:]
+	times, power = stream.spectrogram()
+	fig, axes = plt.subplots(len(CHANNELS) + 1, 1, sharex=False, gridspec_kw={"height_ratios": [2] + [1] * len(CHANNELS)})
+	fig.set_size_inches(16, 14)
+	ax = axes[0]
+	for channel, (label, color) in enumerate(zip(CHANNELS, COLORS)):
+		ax.loglog(frequencies, psd[:, channel], label=label, color=color, linewidth=1)
+	for name, shortest, longest in PULSATION_BANDS:
+		ax.axvspan(1.0 / longest, 1.0 / shortest, color='lightgray', alpha=0.4)
+		ax.text(np.sqrt(1.0 / (longest * shortest)), 0.95, name, transform=ax.get_xaxis_transform(), ha='center', va='top')
+	ax.set_xlabel("Frequency (Hz)")
+	ax.set_ylabel("PSD (nT^2/Hz)")
+	ax.grid(True, which='both', alpha=0.3)
+	ax.legend(frameon=False, loc='lower left', ncol=4)
+	ax.set_title(title, fontsize=14, fontname='Monospace', color='tab:blue')
+	hours = times / 3600
+	with np.errstate(divide='ignore'):
+		levels = np.log10(power[:, 1:, :])
+	for channel, label in enumerate(CHANNELS):
+		ax = axes[channel + 1]
+		if len(hours):
+			mesh = ax.pcolormesh(hours, frequencies * 1000, levels[:, :, channel].T, shading='nearest', cmap='viridis')
+			fig.colorbar(mesh, ax=ax, label="log10 nT^2/Hz")
+		ax.set_yscale('log')
+		ax.set_ylabel("%s\nmHz" % label)
+		ax.set_xlim(0, 24)
+	axes[-1].set_xlabel("UTC Hour of Day")
+	fig.tight_layout()
+	plt.savefig(outfile)
+	if show:
+		plt.show()
+	else:
+		plt.close(fig)
+	return outfile
+
+
+def spectrum_magnetic_day(lat, long, logfiles, filename, segment=SEGMENT, cache_dir=None, outfile='spectrum.png', show=True):
+	"""Spectral plot of one log file."""
+	filename = filename.replace("'","").replace("]","")
+	day_start, stream = spectrum_day(logfiles, filename, int(segment), None, cache_dir)
+	title = 'TAPR Magnatometer @ N5BRG Lat=' + str(lat) + ' Log=' + str(long) + '\n ' + filename + \
+		'  %d s segments, %d averaged' % (stream.segment, stream.used)
+	return plot_spectrum(stream, title, outfile, show)
+
+
+def main():
+	parser = configparser.ConfigParser(allow_no_value=True)
+	parser.read('./configure_mag_graph')
+	logfiles = parser['directories']['logfiles']
+
+	args = argparse.ArgumentParser(description="Power spectrum and spectrogram of one day of magnetometer readings")
+	args.add_argument("--file", help="log file in logfiles (default newest)")
+	args.add_argument("--segment", type=int, default=SEGMENT, help="seconds in each FFT segment (default %d)" % SEGMENT)
+	args.add_argument("--outfile", default="spectrum.png", help="PNG file to write")
+	args.add_argument("--no-show", action="store_true", help="only write the PNG file")
+	opts = args.parse_args()
+
+	if opts.no_show:
+		plt.switch_backend("Agg")
+	filename = opts.file
+	if not filename:
+		names = list_logs(logfiles)
+		filename = names[-1]
+	spectrum_magnetic_day(parser['location']['lattitude'], parser['location']['longitude'], logfiles, filename,
+		opts.segment, parser['directories'].get('cache'), opts.outfile, not opts.no_show)
+
+
+if __name__ == "__main__":
+	main()
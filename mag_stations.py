@@ -0,0 +1,162 @@
+# Comparison of one UTC day at several magnetometer stations
+# Each station's location and log directory come from configure_mag_graph: this station from
+# [location] and [directories], others from [station NAME] sections. The stations' logs are
+# loaded at the same time in a thread pool and interpolated onto one epoch grid, so they can be
+# drawn one panel per station or as differences from the first station, which removes the
+# activity they share and leaves local noise.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+#
+# Usage:  python3 mag_stations.py 2024-06-06 [--mode stack|difference] [--step 10] [--axes HEZ]
+#                  [--outfile stations.png] [--show]
+
+
+import argparse
+import concurrent.futures
+import configparser
+import datetime
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+
+from mag_cache import load_columns
+from mag_range import resolve_range_files, day_epoch
+from mag_day import new_day, day_values, day_from_columns, DAY_FIELDS
+from graph_mag_log import differential
+from mag_decimate import minmax_decimate, pixel_columns
+
+STATION_PREFIX = "station "		# Config sections named [station NAME] describe other stations
+AXIS_COLUMNS = (("H", "z", "H (z) axis", "black"), ("E", "y", "E (y) axis", "blue"), ("Z", "x", "Z (x) axis", "red"))
+
+
+def read_stations(parser, name="local"):
+	"""Stations in the config, this station first. Each is a dictionary of name, latitude, longitude, logfiles and cache."""
+	stations = [{"name": name, "latitude": float(parser['location']['lattitude']),
+		"longitude": float(parser['location']['longitude']), "logfiles": parser['directories']['logfiles'],
+		"cache": parser['directories'].get('cache') or None}]
+	for section in parser.sections():
+		if section.startswith(STATION_PREFIX):
+			settings = parser[section]
+			stations.append({"name": section[len(STATION_PREFIX):].strip(), "latitude": float(settings['lattitude']),
+				"longitude": float(settings['longitude']), "logfiles": settings['logfiles'],
+				"cache": settings.get('cache') or None})
+	return stations
+
+
+def station_day(station, date):
+	"""Readings of one station on a UTC date as a day array (mag_day.py).
+
+	t counts seconds from the start of the date. Every log file that may hold
+	readings of the date is read.
+	"""
+	t0 = day_epoch(date)
+	days = []
+	for name in resolve_range_files(station["logfiles"], date, date):
+		columns = load_columns(station["logfiles"], name, station["cache"])
+		keep = (columns["epoch"] >= t0) & (columns["epoch"] < t0 + 86400)
+		days.append(day_from_columns({column: columns[column][keep] for column in ("epoch",) + DAY_FIELDS}, t0))
+	if not days:
+		return new_day(0)
+	day = np.concatenate(days)
+	return day[np.argsort(day["t"], kind="stable")]		# Logs of neighbouring days may overlap
+
+
+def load_stations(stations, date, workers=None):
+	"""station_day of every station, loaded at the same time in a thread pool."""
+	with concurrent.futures.ThreadPoolExecutor(max_workers=workers or len(stations)) as pool:
+		return list(pool.map(lambda station: station_day(station, date), stations))
+
+
+def align(day, grid, max_gap):
+	"""Linear interpolation of a day array onto the grid, seconds from the same start as its t.
+
+	Returns a day array with t set to the grid. A grid point is NaN when the
+	readings either side of it are more than max_gap seconds apart, or when
+	it is before the first or after the last reading, so gaps in a log are
+	never bridged by a straight line.
+	"""
+	aligned = new_day(len(grid))
+	aligned["t"] = grid
+	if len(day) == 0:
+		return aligned
+	t = day["t"]
+	for name in DAY_FIELDS:
+		aligned[name] = np.interp(grid, t, day[name], left=np.nan, right=np.nan)
+	after = np.searchsorted(t, grid, side="right")	# t[after - 1] <= grid < t[after]
+	before = np.clip(after - 1, 0, len(t) - 1)
+	exact = (after > 0) & (t[before] == grid)
+	bridged = (after > 0) & (after < len(t)) & (t[np.minimum(after, len(t) - 1)] - t[before] <= max_gap)
+	day_values(aligned)[~(exact | bridged)] = np.nan
+	return aligned
+
+
+def aligned_day(stations, date, step=10, workers=None):
+	"""Epoch of the start of the date and a day array of each station on one grid every step seconds."""
+	days = load_stations(stations, date, workers)
+	grid = np.arange(0, 86400, step)
+	max_gap = max(2 * step, 5)
+	return day_epoch(date), [align(day, grid, max_gap) for day in days]
+
+
+def graph_stations(stations, date, mode="stack", step=10, axes="HEZ", outfile='stations.png', show=True):
+	"""Stacked panels, one per station, or panels of each station minus the first for each axis."""
+	t0, aligned = aligned_day(stations, date, step)
+	for day in aligned:
+		differential(day)		# About each station's day mean, in nT
+	when = mdates.date2num((np.datetime64(t0, 's') + aligned[0]["t"].astype('timedelta64[s]')).astype(datetime.datetime))
+	shown = [axis for axis in AXIS_COLUMNS if axis[0] in axes.upper()]
+	if mode == "difference":
+		if len(stations) < 2:
+			raise ValueError("A difference plot needs a [station NAME] section for a second station")
+		panels = [(station["name"] + " - " + stations[0]["name"], {column: aligned[n][column] - aligned[0][column] for column in "xyz"})
+			for n, station in enumerate(stations) if n > 0]
+	else:
+		panels = [(station["name"] + "  Lat=%g Lon=%g" % (station["latitude"], station["longitude"]), aligned[n])
+			for n, station in enumerate(stations)]
+	fig, axs = plt.subplots(len(panels), 1, sharex=True, squeeze=False)
+	fig.set_size_inches(16, max(4, 3 * len(panels)))
+	for ax, (label, values) in zip(axs[:, 0], panels):
+		for letter, column, axis_label, color in shown:
+			t, v = minmax_decimate(when, values[column], pixel_columns(ax))
+			ax.plot(t, v, '.', markersize=2, label=axis_label, color=color)
+		ax.set_ylabel("nT")
+		ax.set_title(label, loc="left", fontsize=11)
+		ax.yaxis.grid(True, which='major')
+	axs[0, 0].legend(frameon=False, loc='upper right', ncol=3)
+	axs[-1, 0].set_xlim(when[0], when[0] + 1)
+	axs[-1, 0].xaxis.set_major_locator(mdates.HourLocator(byhour=range(0, 24, 2)))
+	axs[-1, 0].xaxis.set_major_formatter(mdates.DateFormatter("%H"))
+	axs[-1, 0].set_xlabel("UTC Hour of Day   %s   %d second grid" % (date, step))
+	title = "TAPR Magnatometer stations " + ", ".join(station["name"] for station in stations) + \
+		("\n differences from " + stations[0]["name"] if mode == "difference" else "\n differential about each day mean")
+	fig.suptitle(title, fontsize=14, fontname='Monospace', color='tab:blue')
+	fig.tight_layout()
+	plt.savefig(outfile)
+	if show:
+		plt.show()
+	else:
+		plt.close(fig)
+	return outfile
+
+
+def main():
+	parser = configparser.ConfigParser(allow_no_value=True)
+	parser.read('./configure_mag_graph')
+
+	args = argparse.ArgumentParser(description="Compare one UTC day at several magnetometer stations")
+	args.add_argument("date", type=datetime.date.fromisoformat, help="UTC date, YYYY-MM-DD")
+	args.add_argument("--mode", default="stack", choices=["stack", "difference"], help="one panel per station, or differences from this station")
+	args.add_argument("--step", type=int, default=10, help="seconds between points of the common time grid")
+	args.add_argument("--axes", default="HEZ", help="axes to show, any of H E Z (default HEZ)")
+	args.add_argument("--outfile", default="stations.png", help="PNG file to write")
+	args.add_argument("--show", action="store_true", help="also open the plot in a window")
+	opts = args.parse_args()
+
+	if not opts.show:
+		plt.switch_backend("Agg")
+	graph_stations(read_stations(parser), opts.date, opts.mode, opts.step, opts.axes, opts.outfile, opts.show)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,121 @@
+# Incremental reader for the log file the TAPR logger is still writing
+# The logger appends one json line every second. LogTail remembers how far into the file it
+# has read and only parses the lines added since the last poll.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+
+
+import json
+import os
+import numpy as np
+
+from mag_ingest import parse_log_lines, empty_columns, LOG_COLUMNS
+
+
+class ColumnBuffer:
+	"""Column arrays that grow by doubling so appending stays cheap."""
+
+	def __init__(self, capacity=4096):
+		self.length = 0
+		self.data = {name: np.empty([capacity], dtype = float) for name in LOG_COLUMNS}
+		self.data["epoch"] = np.empty([capacity], dtype = np.int64)
+
+	def capacity(self):
+		return len(self.data["epoch"])
+
+	def append(self, columns):
+		"""Add the rows of a column dictionary to the end of the buffer."""
+		rows = len(columns["epoch"])
+		needed = self.length + rows
+		if needed > self.capacity():
+			capacity = self.capacity()
+			while capacity < needed:
+				capacity *= 2
+			for name, column in self.data.items():
+				grown = np.empty([capacity], dtype = column.dtype)
+				grown[:self.length] = column[:self.length]
+				self.data[name] = grown
+		for name, column in self.data.items():
+			column[self.length:needed] = columns[name]
+		self.length = needed
+
+	def clear(self):
+		self.length = 0
+
+	def columns(self):
+		"""Views of the filled part of each column."""
+		return {name: column[:self.length] for name, column in self.data.items()}
+
+
+class LogTail:
+	"""Follow a growing log file, parsing only what was appended since the last poll."""
+
+	def __init__(self, filename, capacity=4096):
+		self.filename = filename
+		self.offset = 0			# Bytes of the file already read
+		self.remainder = b""	# Start of a line the logger has not finished writing
+		self.ts_format = None
+		self.start_ts = ""
+		self.buffer = ColumnBuffer(capacity)
+
+	def reset(self):
+		self.offset = 0
+		self.remainder = b""
+		self.start_ts = ""
+		self.buffer.clear()
+
+	def poll(self):
+		"""Read and parse any complete lines added to the file. Returns the number of new rows."""
+		try:
+			size = os.path.getsize(self.filename)
+		except OSError:
+			return 0
+		if size < self.offset:		# The file was replaced or truncated, start again
+			self.reset()
+		if size == self.offset:
+			return 0
+		with open(self.filename, "rb") as f:
+			f.seek(self.offset)
+			data = f.read(size - self.offset)
+		self.offset += len(data)
+		data = self.remainder + data
+		end = data.rfind(b"\n") + 1
+		self.remainder = data[end:]
+		if end == 0:
+			return 0
+		columns = parse_new_lines(data[:end], self.ts_format)
+		rows = len(columns["epoch"])
+		if rows:
+			self.ts_format = columns["ts_format"]
+			if not self.start_ts:
+				self.start_ts = columns["start_ts"]
+			self.buffer.append(columns)
+		return rows
+
+	def columns(self):
+		"""Everything read so far in the same form as mag_ingest.read_mag_log()."""
+		columns = self.buffer.columns()
+		columns["start_ts"] = self.start_ts
+		columns["ts_format"] = self.ts_format
+		return columns
+
+
+def parse_new_lines(data, ts_format):
+	"""Parse complete log lines, skipping any line that is not valid json."""
+	try:
+		return parse_log_lines(data, ts_format)
+	except ValueError:
+		pass
+	# A damaged line, usually from the logger being stopped part way through a write
+	good = []
+	for line in data.splitlines():
+		try:
+			record = json.loads(line)
+		except ValueError:
+			continue
+		if isinstance(record, dict) and "ts" in record and all(name in record for name in LOG_COLUMNS):
+			good.append(line)
+	if not good:
+		return empty_columns()
+	return parse_log_lines(b"\n".join(good) + b"\n", ts_format)
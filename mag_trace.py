@@ -0,0 +1,183 @@
+# Stage timing and profiling of the plotting pipeline
+# graph_magnetic_day reports each stage it finishes, reading, aggregating, the differential, sun
+# times, drawing and saving, to a progress callback. StageTrace is such a callback: it keeps the
+# wall time and counts of each stage and, when tracing is on, the memory allocated during it.
+# Tracing is turned on by the MAG_TRACE environment variable or the [trace] section of
+# configure_mag_graph. Each traced plot is appended as one JSON line to the trace file, and with
+# a profile folder set the plot also runs under cProfile with its statistics saved there.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+#
+# Usage:  MAG_TRACE=1 python3 mag_view.py               trace into mag_trace.jsonl
+#         MAG_TRACE=pi.jsonl MAG_PROFILE=prof python3 mag_batch.py
+#         python3 mag_trace.py [mag_trace.jsonl]          average time of each stage in a trace file
+
+
+import argparse
+import cProfile
+import datetime
+import json
+import os
+import time
+import tracemalloc
+
+TRACE_ENV = "MAG_TRACE"		# 1, or the trace file name, turns tracing on
+PROFILE_ENV = "MAG_PROFILE"	# Folder for cProfile statistics of each plot
+TRACE_FILE = "mag_trace.jsonl"
+
+
+def trace_settings(parser=None):
+	"""Tracing settings from the environment, else from the [trace] section. None when tracing is off.
+
+	Returns a dictionary of file (trace file), memory (track allocations)
+	and profile (folder for .prof files or None).
+	"""
+	section = parser['trace'] if parser is not None and parser.has_section('trace') else {}
+	value = os.environ.get(TRACE_ENV, "").strip()
+	if value in ("", "0"):
+		if value == "0" or (section.get('enabled') or "0").strip() in ("", "0"):
+			return None
+		value = "1"
+	return {"file": (section.get('file') or TRACE_FILE) if value == "1" else value,
+		"memory": (section.get('memory') or "1").strip() != "0",
+		"profile": os.environ.get(PROFILE_ENV) or section.get('profile') or None}
+
+
+class StageTrace:
+	"""Progress callback keeping each stage's time, counts and, with memory set, allocations.
+
+	Every call is passed on to progress, so it can wrap the callback a caller
+	already uses. allocated_bytes of a stage is the growth of traced memory
+	over the stage and peak_bytes the most it held above its start.
+	"""
+
+	def __init__(self, progress=None, memory=False):
+		self.progress = progress
+		self.memory = memory
+		self.stages = []
+		self.started = False	# True when this trace turned tracemalloc on
+		self.held = 0		# Traced bytes at the start of the current stage
+		self.began = None
+		self.seconds = None
+
+	def start(self):
+		if self.memory:
+			if not tracemalloc.is_tracing():
+				tracemalloc.start()
+				self.started = True
+			tracemalloc.reset_peak()
+			self.held = tracemalloc.get_traced_memory()[0]
+		self.began = time.perf_counter()
+
+	def __call__(self, stage, seconds, **info):
+		entry = dict(info, stage=stage, seconds=seconds)
+		if self.memory and tracemalloc.is_tracing():
+			current, peak = tracemalloc.get_traced_memory()
+			entry["allocated_bytes"] = current - self.held
+			entry["peak_bytes"] = peak - self.held
+			tracemalloc.reset_peak()
+			self.held = current
+		self.stages.append(entry)
+		if self.progress is not None:
+			self.progress(stage, **{key: value for key, value in entry.items() if key != "stage"})
+
+	def stop(self):
+		self.seconds = time.perf_counter() - self.began
+		if self.started:
+			tracemalloc.stop()
+			self.started = False
+		return self.seconds
+
+	def summary(self):
+		return summary_line(self.stages, self.seconds)
+
+	def record(self, **context):
+		"""Dictionary of the run for the trace file, context says what was plotted."""
+		return {"time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+			"pid": os.getpid(), "seconds": self.seconds, "context": context,
+			"stages": [{key: value for key, value in stage.items() if isinstance(value, (int, float, str))} for stage in self.stages]}
+
+
+def summary_line(stages, total=None):
+	"""One line of stage times such as "read 0.31 s 86400 rows, aggregate 0.02 s, ... total 1.9 s"."""
+	parts = []
+	for stage in stages:
+		text = "%s %.2f s" % ("from cache" if stage["stage"] == "cached" else stage["stage"], stage["seconds"])
+		if "rows" in stage:
+			text += " %d rows" % stage["rows"]
+		parts.append(text)
+	line = ", ".join(parts)
+	if total is not None:
+		line += ", total %.2f s" % total
+	peaks = [stage["peak_bytes"] for stage in stages if "peak_bytes" in stage]
+	if peaks:
+		line += ", peak %.1f MB" % (max(peaks) / 1e6)
+	return line
+
+
+def write_trace(filename, record):
+	"""Append one run to a JSON lines trace file, in a single write so processes do not mix lines."""
+	with open(filename, "a") as f:
+		f.write(json.dumps(record) + "\n")
+
+
+def trace_run(function, args, kwargs, settings=None, progress=None):
+	"""Call function(*args, progress=trace, **kwargs) and return (result, trace).
+
+	Stage times are always kept. With settings from trace_settings() the
+	allocations are tracked, the run is appended to the trace file and, when
+	a profile folder is set, profiled with its statistics saved as
+	<outfile name>.prof in that folder.
+	"""
+	trace = StageTrace(progress, bool(settings and settings["memory"]))
+	profiler = None
+	if settings and settings["profile"]:
+		profiler = cProfile.Profile()
+	trace.start()
+	try:
+		if profiler is not None:
+			profiler.enable()
+		result = function(*args, progress=trace, **kwargs)
+	finally:
+		if profiler is not None:
+			profiler.disable()
+		trace.stop()
+	if settings:
+		outfile = kwargs.get("outfile") or "mag.png"
+		if profiler is not None:
+			os.makedirs(settings["profile"], exist_ok=True)
+			profiler.dump_stats(os.path.join(settings["profile"], os.path.splitext(os.path.basename(outfile))[0] + ".prof"))
+		context = {"function": function.__name__, "args": [str(arg) for arg in args], "outfile": outfile}
+		context.update({key: str(value) for key, value in kwargs.items() if key in ("binning", "shade", "show")})
+		try:
+			write_trace(settings["file"], trace.record(**context))
+		except OSError as error:
+			print("Unable to write trace", settings["file"], error)
+	return result, trace
+
+
+def main():
+	args = argparse.ArgumentParser(description="Average stage times of the plots in a trace file")
+	args.add_argument("file", nargs="?", default=TRACE_FILE, help="trace file (default %s)" % TRACE_FILE)
+	opts = args.parse_args()
+
+	stages = {}
+	runs = 0
+	with open(opts.file) as f:
+		for line in f:
+			record = json.loads(line)
+			runs += 1
+			for stage in record["stages"]:
+				stages.setdefault(stage["stage"], []).append(stage)
+	print("%d plots in %s" % (runs, opts.file))
+	print("stage          count   mean s    max s   mean MB peak")
+	for name, entries in stages.items():
+		seconds = [entry["seconds"] for entry in entries]
+		peaks = [entry["peak_bytes"] for entry in entries if "peak_bytes" in entry]
+		peak = "%9.1f" % (sum(peaks) / len(peaks) / 1e6) if peaks else ""
+		print("%-12s %7d %8.3f %8.3f %s" % (name, len(entries), sum(seconds) / len(seconds), max(seconds), peak))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,433 @@
+# Upload of finished daily logs to the central host set in configure_mag_graph
+# Every log but a plain .log the logger is still writing is packed with its cached columns into
+# .tar.gz batches in temp_path. The batches are sent to central_host in chunks over a small pool
+# of kept alive HTTP connections, no faster than the [mag_settings] throttle. A manifest in
+# temp_path records what was packed and sent, so an interrupted upload picks up where it stopped.
+# The host is asked how much of a batch it already holds before sending, and
+# "python3 mag_upload.py --serve" runs a stand in for the host on this computer for testing.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+#
+# Usage:  python3 mag_upload.py [--once]                    pack and upload every sleeptime seconds
+#         python3 mag_upload.py --host http://localhost:8080 --once
+#         python3 mag_upload.py --serve 8080 --folder received
+
+
+import argparse
+import concurrent.futures
+import configparser
+import hashlib
+import http.client
+import http.server
+import json
+import os
+import queue
+import sys
+import tarfile
+import threading
+import time
+import urllib.parse
+
+from mag_cache import load_columns, cache_folder, file_stamp, CACHE_DIR
+from mag_archive import list_logs
+from mag_ingest import log_stem
+
+MANIFEST = "upload_manifest.json"
+MANIFEST_VERSION = 1
+BATCH_DAYS = 7			# Logs packed into each batch at most
+CHUNK_BYTES = 256 << 10		# Bytes sent in each request
+CONNECTIONS = 2
+WRITING_SECONDS = 300		# A plain .log changed this recently is taken to be still written
+RATE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_rate(text):
+	"""Bytes per second of a throttle such as 100K or 2M, None for no limit."""
+	text = (text or "").strip().upper().rstrip("B")
+	if not text:
+		return None
+	unit = text[-1] if text[-1] in RATE_UNITS else ""
+	rate = float(text[:len(text) - len(unit)]) * RATE_UNITS[unit]
+	return rate if rate > 0 else None
+
+
+class TokenBucket:
+	"""Throughput limit shared by the upload threads.
+
+	take(count) waits until count bytes may be sent. The bucket fills at rate
+	bytes per second up to burst, a request larger than what is in the bucket
+	is let through and leaves it in debt, so the average rate holds for any
+	chunk size.
+	"""
+
+	def __init__(self, rate, burst=None):
+		self.rate = rate
+		self.burst = burst or rate
+		self.tokens = self.burst
+		self.last = time.monotonic()
+		self.lock = threading.Lock()
+
+	def take(self, count):
+		if not self.rate:
+			return 0.0
+		with self.lock:
+			now = time.monotonic()
+			self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+			self.last = now
+			self.tokens -= count
+			wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+		if wait:
+			time.sleep(wait)
+		return wait
+
+
+class ConnectionPool:
+	"""Kept alive HTTP or HTTPS connections to one host, at most size open at a time."""
+
+	def __init__(self, host, size=CONNECTIONS, timeout=60):
+		if "://" not in host:
+			host = "https://" + host
+		url = urllib.parse.urlsplit(host)
+		self.connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+		self.netloc = url.netloc
+		self.prefix = url.path.rstrip("/")
+		self.timeout = timeout
+		self.idle = queue.LifoQueue()
+		self.slots = threading.BoundedSemaphore(size)
+		self.opened = 0		# Connections made, a kept alive pool makes few
+
+	def request(self, method, path, body=None, headers=None):
+		"""(status, headers, body) of one request. A dropped kept alive connection is tried once more on a new one."""
+		with self.slots:
+			for attempt in (1, 2):
+				try:
+					connection = self.idle.get_nowait()
+				except queue.Empty:
+					connection = self.connection_class(self.netloc, timeout=self.timeout)
+					self.opened += 1
+					attempt = 2
+				try:
+					connection.request(method, self.prefix + path, body=body, headers=headers or {})
+					response = connection.getresponse()
+					data = response.read()
+				except (OSError, http.client.HTTPException):
+					connection.close()
+					if attempt == 2:
+						raise
+					continue
+				if response.will_close:
+					connection.close()
+				else:
+					self.idle.put(connection)
+				return response.status, response.headers, data
+
+	def close(self):
+		while True:
+			try:
+				self.idle.get_nowait().close()
+			except queue.Empty:
+				return
+
+
+def load_manifest(temp_path):
+	try:
+		with open(os.path.join(temp_path, MANIFEST)) as f:
+			manifest = json.load(f)
+	except (OSError, ValueError):
+		manifest = {}
+	if manifest.get("version") != MANIFEST_VERSION:
+		manifest = {"version": MANIFEST_VERSION, "logs": {}, "batches": {}}
+	return manifest
+
+
+def save_manifest(temp_path, manifest):
+	path = os.path.join(temp_path, MANIFEST)
+	temp = path + ".%d.tmp" % os.getpid()
+	with open(temp, "w") as f:
+		json.dump(manifest, f, indent=1, sort_keys=True)
+	os.replace(temp, path)
+
+
+def pending_logs(logfiles, manifest, now=None):
+	"""Finished logs that are not packed or changed after packing.
+
+	Compressed archives are always finished. A plain .log changed within
+	WRITING_SECONDS is still being written and waits, so today's log goes
+	out once the logger has moved on to the next day's file or stopped.
+	"""
+	now = time.time() if now is None else now
+	pending = []
+	for name in list_logs(logfiles):
+		stamp = file_stamp(os.path.join(logfiles, name))
+		if name.endswith(".log") and now - stamp["mtime_ns"] / 1e9 < WRITING_SECONDS:
+			continue
+		packed = manifest["logs"].get(name)
+		if packed is None or (packed["size"], packed["mtime_ns"]) != (stamp["size"], stamp["mtime_ns"]):
+			pending.append(name)
+	return pending
+
+
+def pack_batch(logfiles, names, temp_path, cache_dir=None):
+	"""Write a .tar.gz batch of the logs and their cached columns. Returns (batch name, size, sha256).
+
+	The name holds the packing time, so a log packed again after it changed
+	goes out in a new batch rather than under the name of one already sent.
+	"""
+	batch = "%s--%s-%s.tar.gz" % (log_stem(names[0]), log_stem(names[-1]), time.strftime("%Y%m%dT%H%M%S", time.gmtime()))
+	path = os.path.join(temp_path, batch)
+	temp = path + ".%d.tmp" % os.getpid()
+	with tarfile.open(temp, "w:gz") as tar:
+		for name in names:
+			tar.add(os.path.join(logfiles, name), arcname="logs/" + name)
+			try:
+				load_columns(logfiles, name, cache_dir)		# Makes sure the cached columns exist
+			except (OSError, ValueError, KeyError) as error:
+				print("Unable to read", name, error)
+				continue
+			tar.add(cache_folder(logfiles, name, cache_dir), arcname="cache/" + name)
+	os.replace(temp, path)
+	digest = hashlib.sha256()
+	with open(path, "rb") as f:
+		for block in iter(lambda: f.read(1 << 20), b""):
+			digest.update(block)
+	return batch, os.path.getsize(path), digest.hexdigest()
+
+
+def pack_pending(logfiles, temp_path, manifest, cache_dir=None, batch_days=BATCH_DAYS):
+	"""Pack the pending logs batch_days at a time into temp_path. Returns the new batch names."""
+	os.makedirs(temp_path, exist_ok=True)
+	names = pending_logs(logfiles, manifest)
+	made = []
+	for start in range(0, len(names), batch_days):
+		group = names[start:start + batch_days]
+		stamps = [file_stamp(os.path.join(logfiles, name)) for name in group]
+		batch, size, sha256 = pack_batch(logfiles, group, temp_path, cache_dir)
+		manifest["batches"][batch] = {"logs": group, "size": size, "sha256": sha256, "sent": 0, "done": False}
+		for name, stamp in zip(group, stamps):
+			manifest["logs"][name] = dict(stamp, batch=batch)
+		save_manifest(temp_path, manifest)		# After each batch, so packing also resumes
+		made.append(batch)
+	return made
+
+
+class Uploader:
+	"""Sends the batches of a manifest to the central host."""
+
+	def __init__(self, host, remote_path, temp_path, manifest, rate=None, token=None, connections=CONNECTIONS):
+		self.pool = ConnectionPool(host, connections)
+		self.bucket = TokenBucket(rate)
+		self.remote_path = "/" + remote_path.strip("/")
+		self.temp_path = temp_path
+		self.manifest = manifest
+		self.headers = {"Authorization": "Bearer " + token} if token else {}
+		self.connections = connections
+		self.lock = threading.Lock()	# Manifest writes from the upload threads
+
+	def url(self, batch):
+		return self.remote_path.rstrip("/") + "/" + urllib.parse.quote(batch)
+
+	def received(self, batch):
+		"""Bytes of a batch the host already holds."""
+		status, headers, body = self.pool.request("HEAD", self.url(batch), headers=self.headers)
+		if status == 404:
+			return 0
+		if status != 200:
+			raise OSError("HEAD %s returned %d" % (batch, status))
+		return int(headers.get("X-Received") or 0)
+
+	def record(self, batch, **changes):
+		with self.lock:
+			self.manifest["batches"][batch].update(changes)
+			save_manifest(self.temp_path, self.manifest)
+
+	def send(self, batch):
+		"""Send one batch from where the host left off, then remove the local copy."""
+		entry = self.manifest["batches"][batch]
+		path = os.path.join(self.temp_path, batch)
+		offset = self.received(batch)
+		headers = dict(self.headers, **{"Content-Type": "application/gzip", "X-Total-Size": str(entry["size"]),
+			"X-Sha256": entry["sha256"]})
+		if offset < entry["size"]:		# Otherwise only the manifest missed that it arrived
+			with open(path, "rb") as f:
+				while True:
+					f.seek(offset)
+					chunk = f.read(CHUNK_BYTES)
+					self.bucket.take(len(chunk))
+					status, reply, body = self.pool.request("PUT", self.url(batch) + "?offset=%d" % offset, chunk, headers)
+					if status == 409:		# The host holds a different amount, go on from there
+						offset = int(reply.get("X-Received") or 0)
+						continue
+					if status not in (200, 201):
+						raise OSError("PUT %s returned %d %s" % (batch, status, body[:200].decode(errors="replace")))
+					offset += len(chunk)
+					if status == 201:
+						break
+					self.record(batch, sent=offset)
+		self.record(batch, sent=entry["size"], done=True)
+		try:
+			os.remove(path)
+		except FileNotFoundError:
+			pass
+		return entry["size"]
+
+	def send_pending(self):
+		"""Send every batch not yet done, as many at a time as there are connections. Returns (sent, failed)."""
+		batches = sorted(batch for batch, entry in self.manifest["batches"].items() if not entry["done"])
+		sent = []
+		failed = []
+		with concurrent.futures.ThreadPoolExecutor(max_workers=self.connections) as pool:
+			futures = {pool.submit(self.send, batch): batch for batch in batches}
+			for future in concurrent.futures.as_completed(futures):
+				batch = futures[future]
+				try:
+					future.result()
+				except (OSError, http.client.HTTPException) as error:
+					print("Upload of", batch, "failed:", error)
+					failed.append(batch)
+					continue
+				sent.append(batch)
+		return sent, failed
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+	"""Receives batches the way the Uploader sends them, for testing without the central host."""
+	protocol_version = "HTTP/1.1"		# Keeps connections alive like the real host
+	folder = "."
+	token = None
+
+	def target(self):
+		name = os.path.basename(urllib.parse.unquote(urllib.parse.urlsplit(self.path).path))
+		return os.path.join(self.folder, name)
+
+	def received(self, target):
+		for path in (target, target + ".part"):
+			if os.path.exists(path):
+				return os.path.getsize(path)
+		return None
+
+	def reply(self, status, received=None, text=""):
+		body = text.encode()
+		self.send_response(status)
+		if received is not None:
+			self.send_header("X-Received", str(received))
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		if self.command != "HEAD":
+			self.wfile.write(body)
+
+	def allowed(self):
+		if self.token and self.headers.get("Authorization") != "Bearer " + self.token:
+			self.rfile.read(int(self.headers.get("Content-Length") or 0))
+			self.reply(401, text="bad token")
+			return False
+		return True
+
+	def do_HEAD(self):
+		if not self.allowed():
+			return
+		received = self.received(self.target())
+		self.reply(404 if received is None else 200, received)
+
+	def do_PUT(self):
+		if not self.allowed():
+			return
+		target = self.target()
+		chunk = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+		offset = int(urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get("offset", ["0"])[0])
+		total = int(self.headers["X-Total-Size"])
+		received = self.received(target) or 0
+		if os.path.exists(target):
+			self.reply(201, received)
+			return
+		if offset != received:
+			self.reply(409, received)
+			return
+		with open(target + ".part", "ab") as f:
+			f.write(chunk)
+		received += len(chunk)
+		if received < total:
+			self.reply(200, received)
+			return
+		with open(target + ".part", "rb") as f:
+			digest = hashlib.sha256(f.read()).hexdigest()
+		if digest != self.headers.get("X-Sha256"):
+			os.remove(target + ".part")
+			self.reply(422, 0, "checksum does not match")
+			return
+		os.replace(target + ".part", target)
+		self.reply(201, received)
+
+	def log_message(self, format, *args):
+		print("%s %s" % (self.address_string(), format % args))
+
+
+def stand_in_server(folder, port=8080, token=None):
+	"""HTTP server on localhost keeping received batches in folder, run it with serve_forever()."""
+	os.makedirs(folder, exist_ok=True)
+	handler = type("Handler", (StandInHandler,), {"folder": folder, "token": token})
+	return http.server.ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+def upload_once(logfiles, temp_path, uploader, cache_dir=None):
+	"""Pack new finished logs and send everything not yet sent."""
+	made = pack_pending(logfiles, temp_path, uploader.manifest, cache_dir)
+	sent, failed = uploader.send_pending()
+	print("%d batches packed, %d sent, %d failed, %d connections opened" % (len(made), len(sent), len(failed), uploader.pool.opened))
+	return sent, failed
+
+
+def main():
+	parser = configparser.ConfigParser(allow_no_value=True)
+	parser.read('./configure_mag_graph')
+	settings = parser['mag_settings'] if parser.has_section('mag_settings') else {}
+	profile = parser['profile'] if parser.has_section('profile') else {}
+	logfiles = settings.get('orig_path') or parser['directories']['logfiles']
+	cache_dir = parser['directories'].get('cache')
+
+	args = argparse.ArgumentParser(description="Upload finished magnetometer logs to the central host")
+	args.add_argument("--host", default=profile.get('central_host'), help="host to send to, http:// or https:// (default https)")
+	args.add_argument("--throttle", default=settings.get('throttle'), help="most bytes per second, such as 100K")
+	args.add_argument("--temp-path", default=settings.get('temp_path') or os.path.join(cache_dir or os.path.join(logfiles, CACHE_DIR), "upload"),
+		help="folder for the batches and the manifest")
+	args.add_argument("--once", action="store_true", help="pack and upload once instead of every sleeptime seconds")
+	args.add_argument("--serve", type=int, metavar="PORT", help="run a stand in for the central host on this port instead")
+	args.add_argument("--folder", default="received", help="where the stand in keeps what it receives")
+	opts = args.parse_args()
+
+	token = profile.get('token_value')
+	if token and token.startswith("["):		# Still the placeholder of configure_mag_graph
+		token = None
+	if opts.serve:
+		server = stand_in_server(opts.folder, opts.serve, token)
+		print("Receiving on port %d into %s" % (opts.serve, opts.folder))
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+		return 0
+
+	names = [profile.get(key) or "" for key in ('thestationid', 'prefix')]
+	station = ([name for name in names if name and not name.startswith("[")] + ["station"])[0]
+	remote_path = "/".join(part.strip("/") for part in (settings.get('upload_path') or "", settings.get('targetdir') or "magData", station) if part.strip("/"))
+	os.makedirs(opts.temp_path, exist_ok=True)
+	uploader = Uploader(opts.host, remote_path, opts.temp_path, load_manifest(opts.temp_path), parse_rate(opts.throttle), token)
+	sleeptime = float(settings.get('sleeptime') or 1800)
+	try:
+		while True:
+			try:
+				upload_once(logfiles, opts.temp_path, uploader, cache_dir)
+			except (OSError, http.client.HTTPException) as error:
+				print("Upload round failed:", error)
+			if opts.once:
+				break
+			time.sleep(sleeptime)
+	except KeyboardInterrupt:
+		pass
+	finally:
+		uploader.pool.close()
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -6,7 +6,12 @@
 # License:     GPL 3.0
 
 
+import datetime
 import os
+import sqlite3
+import subprocess
+import sys
+import threading
 from tkinter import messagebox, ttk
 import tkinter as tk
 from tkinter import font as tkFont 
@@ -22,21 +27,30 @@ longitude  = parser['location']['longitude']
 #latitude = 33.4679
 #longitude = -97.081
 logfiles = parser['directories']['logfiles']
+cache_dir = parser['directories'].get('cache')	# Empty or missing puts the cache under logfiles
 chop = 60
 filelist = np.empty([1], dtype = str)
 #filename = ""
 #plot_type = ""
 from graph_mag_log import graph_magnetic_day
+from mag_archive import list_logs
+from mag_index import find_logs, refresh_index, DISTURBED_NT
+from mag_worker import PlotWorker
+from mag_trace import trace_settings
+from mag_render_cache import render_cache
+renders = render_cache(parser, logfiles)	# Plots already drawn, None when turned off
 v = np.empty([60], dtype = int)
+disturbed_nt = parser.get('index', 'disturbed', fallback=None) or DISTURBED_NT
 
-#Read in file log
-# Get the list of all files and directories
-dir_list = os.listdir(logfiles)
-for names in dir_list:
-    if names.endswith(".log"):
-        filelist = np.append(filelist,names)
-    filelist.sort()
-    sorted(filelist)
+def indexed_files(start=None, end=None, disturbed=None):
+	# Log names from the log directory index, oldest first, without opening any log
+	try:
+		return [row["name"] for row in find_logs(logfiles, cache_dir, start, end, disturbed)]
+	except (sqlite3.Error, OSError):
+		return []
+
+index_state = {"done": False, "read": 0}
+plotting = {"name": ""}		# Log file of the plot being made
 
 
 def display_selection():
@@ -49,7 +63,8 @@ def display_selection():
         title="Selection"
     )
 
-def plot_graph():
+def plot_settings():
+	# Arguments for graph_magnetic_day from the current state of the window
 	tr_show = ''
 	tl_show = ''
 	raw = ''
@@ -57,6 +72,8 @@ def plot_graph():
 	E = ''
 	Z = ''
 	vmag = ''
+	binning = ''
+	shade = ''
 	filename = combo_1.get()
 	plot_type = combo_2.get()
 	chop = combo_3.get()
@@ -88,94 +105,262 @@ def plot_graph():
 		vmag=1
 	elif (var7.get() == 0):
 		vmag=0
-	graph_magnetic_day(latitude,longitude, logfiles, filename, plot_type, chop, tr_show, tl_show, raw, H, E, Z, vmag)
-
-# Setup the window
-main_window = tk.Tk()
-#main_window.config(width=600, height=400)
-main_window.geometry("700x400")
-main_window.title("Magnetic Plot Parameters               Rev 1.1  8/4/24")
-main_window.pack_propagate(False)
-
-
-### Window boxes
-
-# label 
-ttk.Label(main_window, text = "Select log file:", 
-	font = ("Times New Roman", 18)).grid(column = 0, 
-	row = 10, padx = 10, pady = 25) 
-
-ttk.Label(main_window, text = "Select plot type:",
-        font = ("Times New Roman", 18)).grid(column = 0,
-        row = 20, padx = 10, pady = 25)
-
-ttk.Label(main_window, text = "Group by Seconds:",
-        font = ("Times New Roman", 18)).grid(column = 0,
-        row = 30, padx = 10, pady = 25)
-
-combo_1 = ttk.Combobox(
-    state="readonly",
-    font="Verdana 16 bold",
-    width = 30,
-    values=filelist
-)
-combo_1.place(x=220, y=30)
-
-combo_2 = ttk.Combobox(
-    state="readonly",
-    font="Verdana 16 bold",
-    width = 20,
-    values=["last_value", "average", "mean", "rms", "std", "maximum","minimum"]
-)
-combo_2.place(x=220, y=100)
-
-combo_3 = ttk.Combobox(
-	state="readonly",
-	font="Verdana 16 bold",
-	width = 3,
-	values = [1,2,3,4,5,6,7,8,9,10,20,30,40,50,60]
-)
-combo_3.place(x=220, y=170)
-
-### Buttons and check boxes
-
-button = ttk.Button(text="Plot Graph", command=plot_graph)
-button.place(x=100, y=300)
-
-# Button for closing 
-button = ttk.Button(text="Quit", command=main_window.destroy)
-button.place(x=400, y=350)
-
-#Check boxes
-var1 = tk.IntVar()
-var2 = tk.IntVar()
-var3 = tk.IntVar()
-var4 = tk.IntVar(value=1)
-var5 = tk.IntVar(value=1)
-var6 = tk.IntVar(value=1)
-var7 = tk.IntVar()
-c1 = tk.Checkbutton(main_window, text='Show Local Temp',variable=var1, onvalue=1, offvalue=0)
-c1.place(x=400,y=150)
-#c1.pack()
-c2 = tk.Checkbutton(main_window, text='Show Remote Temp',variable=var2, onvalue=1, offvalue=0)
-c2.place(x=400,y=175)
-#c2.pack()
-c3 = tk.Checkbutton(main_window, text='Raw/Differential',variable=var3, onvalue=1, offvalue=0)
-c3.place(x=400,y=225)
-#c3.pack()
-c4 = tk.Checkbutton(main_window, text='View H (-z)',variable=var4, onvalue=1, offvalue=0)
-c4.place(x=400,y=245)
-#c4.pack()
-c5 = tk.Checkbutton(main_window, text='View E (y)',variable=var5, onvalue=1, offvalue=0)
-c5.place(x=400,y=265)
-#c5.pack()
-c6 = tk.Checkbutton(main_window, text='View Z (x)',variable=var6, onvalue=1, offvalue=0)
-c6.place(x=400,y=285)
-#c6.pack()
-c7 = tk.Checkbutton(main_window, text='Vector Magnitude',variable=var7, onvalue=1, offvalue=0)
-c7.place(x=400,y=305)
-#c7.pack()
-
-
-main_window.mainloop()
-main_window.mainloop()
+	if (var8.get() == 1):
+		binning="time"
+	elif (var8.get() == 0):
+		binning="count"
+	if (var9.get() == 1):
+		shade=1
+	elif (var9.get() == 0):
+		shade=0
+	return (latitude,longitude, logfiles, filename, plot_type, chop, tr_show, tl_show, raw, H, E, Z, vmag), {"binning": binning, "cache_dir": cache_dir, "shade": shade, "render_cache": renders}
+
+def plot_graph():
+	# Parsing and rendering run in a worker process, repeated clicks with the same settings are ignored
+	args, kwargs = plot_settings()
+	if not args[3]:
+		messagebox.showinfo(message="Select a log file first", title="Plot")
+		return
+	if worker.submit(args, kwargs):
+		plotting["name"] = args[3].replace("'","").replace("]","")
+		status.set("Plotting " + plotting["name"] + " ...")
+
+def settings_changed(event=None):
+	# A plot still being made with other settings is no longer wanted
+	if worker.busy() and not worker.running(*plot_settings()):
+		worker.cancel()
+		status.set("Plot cancelled, settings changed")
+
+def plot_progress(stage, info):
+	text = "%s %.2f s" % ("from cache" if stage == "cached" else stage, info["seconds"])
+	if "rows" in info:
+		text += ", %d rows" % info["rows"]
+	if "points" in info:
+		text += ", %d points" % info["points"]
+	status.set("Plotting " + plotting["name"] + " ...  " + text)
+
+def plot_done(outfile, info):
+	# One line of the time each stage took, written to the trace file as well when tracing is on
+	status.set(info["summary"])
+	window = tk.Toplevel(main_window)
+	window.title(plotting["name"])
+	image = tk.PhotoImage(file=outfile)
+	label = tk.Label(window, image=image)
+	label.image = image		# Tk does not keep a reference to the image
+	label.pack()
+
+def plot_error(message):
+	status.set("Plot failed")
+	messagebox.showinfo(message=message, title="Plot failed")
+
+def live_plot():
+	# The live plot runs as its own process so it keeps refreshing while this window is used
+	filename = combo_1.get().replace("'","").replace("]","")
+	command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mag_live.py")]
+	if filename:
+		command += ["--file", filename]
+	if combo_2.get():
+		command += ["--plot-type", combo_2.get()]
+	if combo_3.get():
+		command += ["--roll-count", combo_3.get()]
+	if var3.get() == 1:
+		command += ["--raw"]
+	if var7.get() == 1:
+		command += ["--vmag"]
+	command += ["--axes", "H" * var4.get() + "E" * var5.get() + "Z" * var6.get() or "-"]
+	command += ["--temps", "R" * var2.get() + "L" * var1.get()]
+	subprocess.Popen(command)
+
+def zoom_view():
+	# Zoomable plot of the selected day, drawn from the multi-resolution pyramid in its own process
+	filename = combo_1.get().replace("'","").replace("]","")
+	command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mag_pyramid.py")]
+	if filename:
+		command += ["--file", filename]
+	if var3.get() == 1:
+		command += ["--raw"]
+	command += ["--axes", "H" * var4.get() + "E" * var5.get() + "Z" * var6.get() or "-"]
+	subprocess.Popen(command)
+
+def spectrum_view():
+	# Power spectrum and spectrogram of the selected day, worked out in its own process
+	filename = combo_1.get().replace("'","").replace("]","")
+	command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mag_spectrum.py")]
+	if filename:
+		command += ["--file", filename]
+	subprocess.Popen(command)
+
+def update_index():
+	# Runs in a background thread, reads only logs that are new or have changed
+	def progress(done, total, name):
+		index_state["read"] = done
+	try:
+		refresh_index(logfiles, cache_dir, progress)
+	except (sqlite3.Error, OSError) as error:
+		print("Unable to update the log index", error)
+	index_state["done"] = True
+
+def check_index():
+	# Tk widgets may only be touched from the main loop, so poll the index thread from here
+	if index_state["done"]:
+		apply_filter()
+		return
+	main_window.after(500, check_index)
+
+def apply_filter(event=None):
+	# Show the logs in the From/To date range, only disturbed days when that box is ticked
+	dates = []
+	for entry in (entry_from, entry_to):
+		try:
+			dates.append(datetime.date.fromisoformat(entry.get().strip()) if entry.get().strip() else None)
+		except ValueError:
+			messagebox.showinfo(message="Dates are entered as YYYY-MM-DD", title="Date")
+			return
+	disturbed = float(disturbed_nt) if var10.get() == 1 else None
+	names = indexed_files(dates[0], dates[1], disturbed)
+	if not names and dates == [None, None] and disturbed is None:
+		names = list_logs(logfiles)		# Index not built yet
+	combo_1['values'] = names
+
+def close_window():
+	# Stop a running plot and remove its temporary PNG files before the window goes
+	worker.close()
+	main_window.destroy()
+
+
+# The window is only made when this file is run, the plot worker process imports it without one
+if __name__ == "__main__":
+	#Read in file log
+	# The index opens instantly. Until it has been built the first time the directory is listed.
+	filelist = indexed_files() or list_logs(logfiles)
+
+	# Setup the window
+	main_window = tk.Tk()
+	#main_window.config(width=600, height=400)
+	main_window.geometry("700x450")
+	main_window.title("Magnetic Plot Parameters               Rev 1.1  8/4/24")
+	main_window.pack_propagate(False)
+
+
+	### Window boxes
+
+	# label 
+	ttk.Label(main_window, text = "Select log file:", 
+		font = ("Times New Roman", 18)).grid(column = 0, 
+		row = 10, padx = 10, pady = 25) 
+
+	ttk.Label(main_window, text = "Select plot type:",
+	        font = ("Times New Roman", 18)).grid(column = 0,
+	        row = 20, padx = 10, pady = 25)
+
+	ttk.Label(main_window, text = "Group by Seconds:",
+	        font = ("Times New Roman", 18)).grid(column = 0,
+	        row = 30, padx = 10, pady = 25)
+
+	combo_1 = ttk.Combobox(
+	    state="readonly",
+	    font="Verdana 16 bold",
+	    width = 30,
+	    values=filelist
+	)
+	combo_1.place(x=220, y=30)
+
+	combo_2 = ttk.Combobox(
+	    state="readonly",
+	    font="Verdana 16 bold",
+	    width = 20,
+	    values=["last_value", "average", "mean", "rms", "std", "maximum","minimum"]
+	)
+	combo_2.place(x=220, y=100)
+
+	combo_3 = ttk.Combobox(
+		state="readonly",
+		font="Verdana 16 bold",
+		width = 3,
+		values = [1,2,3,4,5,6,7,8,9,10,20,30,40,50,60]
+	)
+	combo_3.place(x=220, y=170)
+
+	### Buttons and check boxes
+
+	button = ttk.Button(text="Plot Graph", command=plot_graph)
+	button.place(x=100, y=300)
+
+	button = ttk.Button(text="Live Plot", command=live_plot)
+	button.place(x=100, y=350)
+
+	button = ttk.Button(text="Zoom View", command=zoom_view)
+	button.place(x=250, y=350)
+
+	button = ttk.Button(text="Spectrum", command=spectrum_view)
+	button.place(x=250, y=300)
+
+	# Button for closing 
+	button = ttk.Button(text="Quit", command=close_window)
+	button.place(x=400, y=350)
+
+	#Check boxes
+	var1 = tk.IntVar()
+	var2 = tk.IntVar()
+	var3 = tk.IntVar()
+	var4 = tk.IntVar(value=1)
+	var5 = tk.IntVar(value=1)
+	var6 = tk.IntVar(value=1)
+	var7 = tk.IntVar()
+	var8 = tk.IntVar()
+	var9 = tk.IntVar()
+	c1 = tk.Checkbutton(main_window, text='Show Local Temp',variable=var1, onvalue=1, offvalue=0)
+	c1.place(x=400,y=150)
+	#c1.pack()
+	c2 = tk.Checkbutton(main_window, text='Show Remote Temp',variable=var2, onvalue=1, offvalue=0)
+	c2.place(x=400,y=175)
+	#c2.pack()
+	c3 = tk.Checkbutton(main_window, text='Raw/Differential',variable=var3, onvalue=1, offvalue=0)
+	c3.place(x=400,y=225)
+	#c3.pack()
+	c4 = tk.Checkbutton(main_window, text='View H (-z)',variable=var4, onvalue=1, offvalue=0)
+	c4.place(x=400,y=245)
+	#c4.pack()
+	c5 = tk.Checkbutton(main_window, text='View E (y)',variable=var5, onvalue=1, offvalue=0)
+	c5.place(x=400,y=265)
+	#c5.pack()
+	c6 = tk.Checkbutton(main_window, text='View Z (x)',variable=var6, onvalue=1, offvalue=0)
+	c6.place(x=400,y=285)
+	#c6.pack()
+	c7 = tk.Checkbutton(main_window, text='Vector Magnitude',variable=var7, onvalue=1, offvalue=0)
+	c7.place(x=400,y=305)
+	#c7.pack()
+	c8 = tk.Checkbutton(main_window, text='Clock Time Bins',variable=var8, onvalue=1, offvalue=0)
+	c8.place(x=400,y=200)
+	c9 = tk.Checkbutton(main_window, text='Day/Night Shading',variable=var9, onvalue=1, offvalue=0)
+	c9.place(x=550,y=200)
+
+	# Filters on the log file list, from the log directory index
+	var10 = tk.IntVar()
+	ttk.Label(main_window, text = "Days From:").place(x=10, y=245)
+	entry_from = ttk.Entry(main_window, width = 11)
+	entry_from.place(x=85, y=245)
+	ttk.Label(main_window, text = "To:").place(x=185, y=245)
+	entry_to = ttk.Entry(main_window, width = 11)
+	entry_to.place(x=215, y=245)
+	entry_from.bind("<Return>", apply_filter)
+	entry_to.bind("<Return>", apply_filter)
+	c10 = tk.Checkbutton(main_window, text='Disturbed Days',variable=var10, onvalue=1, offvalue=0, command=apply_filter)
+	c10.place(x=550,y=225)
+
+	# Progress of the plot being made in the background
+	status = tk.StringVar()
+	ttk.Label(main_window, textvariable=status, wraplength=680).place(x=10, y=400)
+	worker = PlotWorker(main_window, plot_progress, plot_done, plot_error, trace_settings(parser))
+	for combo in (combo_1, combo_2, combo_3):
+		combo.bind("<<ComboboxSelected>>", settings_changed)
+	for check in (c1, c2, c3, c4, c5, c6, c7, c8, c9):
+		check.configure(command=settings_changed)
+
+	main_window.protocol("WM_DELETE_WINDOW", close_window)
+	threading.Thread(target=update_index, daemon=True).start()
+	main_window.after(500, check_index)
+
+
+	main_window.mainloop()
+	main_window.mainloop()
@@ -0,0 +1,153 @@
+# Background plotting for mag_view.py so the window stays responsive
+# A plot is read, aggregated and rendered to a PNG file in a separate process. The process
+# reports each stage through a queue that the Tk main loop polls with after(). A click while a
+# plot with the same settings is running is ignored, a click with new settings, or a change of
+# settings, stops the running plot first.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+
+
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+
+from mag_trace import trace_run
+
+# Spawn starts each worker as a fresh interpreter. Forking the Tk process while its index
+# thread may hold a lock could leave the worker stuck on that lock. The worker imports
+# mag_view.py again, which only opens its window when run as the main program.
+CONTEXT = multiprocessing.get_context("spawn")
+POLL_MS = 100
+
+
+def run_plot(job, messages):
+	"""Worker process entry, render one plot to job["kwargs"]["outfile"]."""
+	import matplotlib.pyplot as plt
+	plt.switch_backend("Agg")	# No window is opened from the worker
+	from graph_mag_log import graph_magnetic_day
+
+	def progress(stage, **info):
+		messages.put(("progress", stage, info))
+
+	try:
+		outfile, trace = trace_run(graph_magnetic_day, job["args"], dict(job["kwargs"], show=False), job.get("trace"), progress)
+	except Exception as error:
+		messages.put(("error", "%s: %s" % (type(error).__name__, error), None))
+		return
+	messages.put(("done", outfile, {"seconds": trace.seconds, "summary": trace.summary()}))
+
+
+def remove(filename):
+	"""Delete a plot file, if there is one."""
+	if filename:
+		try:
+			os.remove(filename)
+		except OSError:
+			pass
+
+
+def job_key(args, kwargs):
+	return repr((tuple(args), sorted((kwargs or {}).items())))
+
+
+class PlotWorker:
+	"""Run one plot at a time in a worker process and report back on the Tk main loop.
+
+	on_progress(stage, info) is called for each finished stage, on_done(outfile,
+	info) when the PNG file is written and on_error(message) if the plot failed.
+	info of on_done holds the seconds taken and a one line summary of the
+	stages. trace, settings from mag_trace.trace_settings(), times the plots
+	into a trace file.
+	"""
+
+	def __init__(self, root, on_progress, on_done, on_error, trace=None):
+		self.root = root
+		self.trace = trace
+		self.on_progress = on_progress
+		self.on_done = on_done
+		self.on_error = on_error
+		self.process = None
+		self.messages = None
+		self.key = None		# Settings of the running plot
+		self.outdir = tempfile.mkdtemp(prefix="magplot-")
+		self.count = 0		# Plots started, also tells the polling of each apart
+		self.outfile = None	# PNG file of the running plot
+		self.shown = None	# PNG file of the last finished plot
+
+	def busy(self):
+		return self.process is not None
+
+	def running(self, args, kwargs=None):
+		"""True when a plot with these settings is in progress."""
+		return self.busy() and job_key(args, kwargs) == self.key
+
+	def submit(self, args, kwargs=None):
+		"""Start a plot unless the same one is already running. Returns False when it was coalesced."""
+		if self.running(args, kwargs):
+			return False
+		self.cancel()
+		self.key = job_key(args, kwargs)
+		self.count += 1
+		self.outfile = os.path.join(self.outdir, "mag-%d.png" % self.count)
+		kwargs = dict(kwargs or {}, outfile=self.outfile)
+		self.messages = CONTEXT.Queue()
+		self.process = CONTEXT.Process(target=run_plot, args=({"args": args, "kwargs": kwargs, "trace": self.trace}, self.messages), daemon=True)
+		self.process.start()
+		self.root.after(POLL_MS, self.poll, self.count)
+		return True
+
+	def cancel(self):
+		"""Stop the running plot. Returns False when there was none."""
+		if not self.busy():
+			return False
+		self.process.terminate()
+		self.process.join()
+		remove(self.outfile)
+		self.finish()
+		return True
+
+	def close(self):
+		"""Stop any running plot and remove the folder of PNG files, for when the window closes."""
+		self.cancel()
+		shutil.rmtree(self.outdir, ignore_errors=True)
+
+	def finish(self):
+		self.process = None
+		self.messages = None
+		self.key = None
+		self.outfile = None
+
+	def poll(self, job):
+		if not self.busy() or job != self.count:	# Finished, or a newer plot has its own polling
+			return
+		process = self.process
+		alive = process.is_alive()
+		while True:
+			try:
+				# Once the process has ended its last message may still be on the way
+				kind, value, info = self.messages.get(timeout=0.5) if not alive else self.messages.get_nowait()
+			except queue.Empty:
+				break
+			if kind == "progress":
+				self.on_progress(value, info)
+				continue
+			process.join()
+			outfile = self.outfile
+			self.finish()
+			if kind == "done":
+				self.on_done(value, info)
+				remove(self.shown)	# The window showing it holds its own copy of the image
+				self.shown = value
+			else:
+				remove(outfile)
+				self.on_error(value)
+			return
+		if not alive:		# Died without a word, killed or out of memory
+			remove(self.outfile)
+			self.finish()
+			self.on_error("Plot process stopped, exit code %s" % process.exitcode)
+			return
+		self.root.after(POLL_MS, self.poll, job)
@@ -1,6 +1,8 @@
 from math import cos,sin,acos,asin,tan
 from math import degrees,radians
 from datetime import date,datetime,time,timedelta
+from functools import lru_cache
+import numpy as np
 
 def sunrise_sunset(latitude,longitude,d,t=0.5,timezone=0):
     dateOrdinal = d.toordinal()-734124+40529
@@ -100,54 +102,72 @@ def sunrise_sunset(latitude,longitude,d,t=0.5,timezone=0):
     #return output dictionary
     return {"sunrise":{"datetime":sunrise, "sunrise_time":sunriseHMS, "solarazimuth":solarAzimuthAngleSunrise}, "solarNoon":{"datetime":sunset, "solarNoon_time":solarNoonHMS, "solarazimuth":solarAzimuthAngleSolarNoon}, "sunset":{"datetime":sunset, "sunset_time":sunsetHMS, "solarazimuth":solarAzimuthAngleSunset}}
 
+def next_event_day(latitude,longitude,datetimeutc,event):
+    # sunrise_sunset result for the UTC day whose event ("sunrise" or "sunset") is the first one
+    # at or after datetimeutc.
+    # The first evaluation tells how many days away that event is, so the search jumps straight
+    # to that day and then only steps a day at a time if the event time drifted across the
+    # boundary. Stepping forward past earlier events and then back while the day before is still
+    # not earlier always ends, even where the event comes more than 24 hours after the day
+    # before's (near the polar circles), which kept the old search switching between two days.
+    # Day results come from the sunrise_sunset_day cache.
+    day = datetimeutc.date()
+    found = sunrise_sunset_day(latitude, longitude, day)
+    difference = found[event]["datetime"] - datetimeutc
+    if difference.days != 0:
+        day -= timedelta(days = difference.days)
+        found = sunrise_sunset_day(latitude, longitude, day)
+    while found[event]["datetime"] < datetimeutc:
+        day += timedelta(days = 1)
+        found = sunrise_sunset_day(latitude, longitude, day)
+    before = sunrise_sunset_day(latitude, longitude, day - timedelta(days = 1))
+    while before[event]["datetime"] >= datetimeutc:
+        day -= timedelta(days = 1)
+        found = before
+        before = sunrise_sunset_day(latitude, longitude, day - timedelta(days = 1))
+    return found
+
 def time_until_next_sunrise_sunset(latitude,longitude,datetimeutc):
-    sunrise = sunset = sunrise_sunset(latitude, longitude, datetimeutc.date())
-    sunriseDifference = sunrise["sunrise"]["datetime"] - datetimeutc
-    sunsetDifference = sunset["sunset"]["datetime"] - datetimeutc
-    
-    utcSunriseDate = utcSunsetDate = datetimeutc.date()
-    while sunriseDifference.days != 0:
-        if sunrise["sunrise"]["datetime"] < datetimeutc:
-            utcSunriseDate += timedelta(days = 1)
-        elif sunrise["sunrise"]["datetime"] > datetimeutc:
-            utcSunriseDate -= timedelta(days = 1)
-        sunrise = sunrise_sunset(latitude, longitude, utcSunriseDate)
-        sunriseDifference = sunrise["sunrise"]["datetime"] - datetimeutc
-
-    while sunsetDifference.days != 0:
-        if sunset["sunset"]["datetime"] < datetimeutc:
-            utcSunsetDate += timedelta(days = 1)
-        elif sunset["sunset"]["datetime"] > datetimeutc:
-            utcSunsetDate -= timedelta(days = 1)
-        sunset = sunrise_sunset(latitude, longitude, utcSunsetDate)
-        sunsetDifference = sunset["sunset"]["datetime"] - datetimeutc
-  
-    return {"nextSunrise":sunriseDifference, "nextSunset":sunsetDifference}
+    sunrise = next_event_day(latitude, longitude, datetimeutc, "sunrise")
+    sunset = next_event_day(latitude, longitude, datetimeutc, "sunset")
+    return {"nextSunrise":sunrise["sunrise"]["datetime"] - datetimeutc, "nextSunset":sunset["sunset"]["datetime"] - datetimeutc}
 
 def time_of_next_sunrise_sunset(latitude,longitude,datetimeutc):
-    sunrise = sunset = sunrise_sunset(latitude, longitude, datetimeutc.date())
-    sunriseDifference = sunrise["sunrise"]["datetime"] - datetimeutc
-    sunsetDifference = sunset["sunset"]["datetime"] - datetimeutc
-    
-    utcSunriseDate = utcSunsetDate = datetimeutc.date()
-    while sunriseDifference.days != 0:
-        if sunrise["sunrise"]["datetime"] < datetimeutc:
-            utcSunriseDate += timedelta(days = 1)
-        elif sunrise["sunrise"]["datetime"] > datetimeutc:
-            utcSunriseDate -= timedelta(days = 1)
-        sunrise = sunrise_sunset(latitude, longitude, utcSunriseDate)
-        sunriseDifference = sunrise["sunrise"]["datetime"] - datetimeutc
-
-    while sunsetDifference.days != 0:
-        if sunset["sunset"]["datetime"] < datetimeutc:
-            utcSunsetDate += timedelta(days = 1)
-        elif sunset["sunset"]["datetime"] > datetimeutc:
-            utcSunsetDate -= timedelta(days = 1)
-        sunset = sunrise_sunset(latitude, longitude, utcSunsetDate)
-        sunsetDifference = sunset["sunset"]["datetime"] - datetimeutc
-  
+    sunrise = next_event_day(latitude, longitude, datetimeutc, "sunrise")
+    sunset = next_event_day(latitude, longitude, datetimeutc, "sunset")
     return {"nextSunrise":sunrise["sunrise"], "nextSunset":sunset["sunset"]}
 
+def next_sunrise_sunset_array(latitude,longitude,datetimesutc):
+    # Batch version of time_of_next_sunrise_sunset. datetimesutc is a sequence of datetimes (or
+    # datetime64 values), latitude and longitude may be single values or matching arrays.
+    # Returns {"nextSunrise": datetime64[s] array, "nextSunset": datetime64[s] array}, NaT where
+    # there is no such event (polar day or night).
+    moments = np.asarray(datetimesutc, dtype='datetime64[s]')
+    latitude = np.broadcast_to(np.asarray(latitude, dtype=float), moments.shape)
+    longitude = np.broadcast_to(np.asarray(longitude, dtype=float), moments.shape)
+    result = {}
+    for event, key in (("sunrise", "nextSunrise"), ("sunset", "nextSunset")):
+        days = moments.astype('datetime64[D]')
+        when = sunrise_sunset_array(latitude, longitude, days)[event]["datetime"]
+        # Jump every moment straight to the day its next event should fall on
+        ahead = (when - moments).astype(np.int64) // 86400
+        days = days - np.where(np.isnat(when), 0, ahead)
+        when = sunrise_sunset_array(latitude, longitude, days)[event]["datetime"]
+        late = when < moments
+        while late.any():
+            days[late] = days[late] + 1
+            when[late] = sunrise_sunset_array(latitude[late], longitude[late], days[late])[event]["datetime"]
+            late = when < moments
+        before = sunrise_sunset_array(latitude, longitude, days - 1)[event]["datetime"]
+        early = before >= moments
+        while early.any():
+            days[early] = days[early] - 1
+            when[early] = before[early]
+            before[early] = sunrise_sunset_array(latitude[early], longitude[early], days[early] - 1)[event]["datetime"]
+            early = before >= moments
+        result[key] = when
+    return result
+
 def rounded_hours_until_next_sunrise_sunset(latitude, longitude, datetimeutc):
     timeUntil = time_until_next_sunrise_sunset(latitude, longitude, datetimeutc)
     sunriseHours = round(timeUntil["nextSunrise"].seconds / 3600)    
@@ -155,4 +175,114 @@ def rounded_hours_until_next_sunrise_sunset(latitude, longitude, datetimeutc):
     
     return {"roundedHoursNextSunrise":str(sunriseHours).zfill(2), "roundedHoursNextSunset":str(sunsetHours).zfill(2)}
 
+def sunrise_sunset_array(latitude,longitude,dates,t=0.5,timezone=0):
+    # NumPy version of sunrise_sunset. dates is a sequence of dates (or numpy datetime64 days),
+    # latitude and longitude may be single values or arrays the same length as dates.
+    # Returns the same layout as sunrise_sunset but each entry is an array: "datetime" holds
+    # datetime64[s] values and "seconds" the seconds after midnight of the event's UTC day.
+    # Latitudes with no sunrise or sunset on a date give NaT and -1 for those events.
+    days = np.asarray(dates, dtype='datetime64[D]')
+    latitude = np.asarray(latitude, dtype=float)
+    longitude = np.asarray(longitude, dtype=float)
+    dateOrdinal = days.astype(np.int64)+719163-734124+40529
+
+    # Julian Day and Century calculations
+    julianDay         = dateOrdinal+2415018.5+t-timezone/24
+    julianCentury     = (julianDay-2451545)/36525
+
+    # Same steps as sunrise_sunset, see there for the source of the formulas
+    geomMeanLongSun   = 280.46646+julianCentury*(36000.76983+julianCentury*0.0003032)%360
+    geomMeanAnomSun   = 357.52911+julianCentury*(35999.05029-0.0001537*julianCentury)
+    eccentEarthOrbit  = 0.016708634-julianCentury*(0.000042037+0.0000001267*julianCentury)
+    sunEqOfCtr        = np.sin(np.radians(geomMeanAnomSun))*(1.914602-julianCentury*(0.004817+0.000014*julianCentury))+np.sin(np.radians(2*geomMeanAnomSun))*(0.019993-0.000101*julianCentury)+np.sin(np.radians(3*geomMeanAnomSun))*0.000289
+    sunTrueLong       = geomMeanLongSun+sunEqOfCtr
+    sunAppLong        = sunTrueLong-0.00569-0.00478*np.sin(np.radians(125.04-1934.136*julianCentury))
+    meanObliqEcliptic = 23+(26+((21.448-julianCentury*(46.815+julianCentury*(0.00059-julianCentury*0.001813))))/60)/60
+    obliqCorr         = meanObliqEcliptic+0.00256*np.cos(np.radians(125.04-1934.136*julianCentury))
+    sunDeclination    = np.degrees(np.arcsin(np.sin(np.radians(obliqCorr))*np.sin(np.radians(sunAppLong))))
+    varY              = np.tan(np.radians(obliqCorr/2))*np.tan(np.radians(obliqCorr/2))
+    eqOfTime          = 4*np.degrees(varY*np.sin(2*np.radians(geomMeanLongSun))-2*eccentEarthOrbit*np.sin(np.radians(geomMeanAnomSun))+4*eccentEarthOrbit*varY*np.sin(np.radians(geomMeanAnomSun))*np.cos(2*np.radians(geomMeanLongSun))-0.5*varY*varY*np.sin(4*np.radians(geomMeanLongSun))-1.25*eccentEarthOrbit*eccentEarthOrbit*np.sin(2*np.radians(geomMeanAnomSun)))
+    with np.errstate(invalid='ignore'):
+        hourAngleSunrise  = np.degrees(np.arccos(np.cos(np.radians(90.833))/(np.cos(np.radians(latitude))*np.cos(np.radians(sunDeclination)))-np.tan(np.radians(latitude))*np.tan(np.radians(sunDeclination))))
+
+    solarNoon         = (720-4*longitude-eqOfTime+timezone*60)/1440
+    sunriseTime       = (solarNoon-hourAngleSunrise*4/1440)
+    sunsetTime        = (solarNoon+hourAngleSunrise*4/1440)
+
+    with np.errstate(invalid='ignore'):
+        solarZenithAngleSunrise  = np.degrees(np.arccos(np.sin(np.radians(latitude))*np.sin(np.radians(sunDeclination))+np.cos(np.radians(latitude))*np.cos(np.radians(sunDeclination))*np.cos(np.radians(hourAngleSunrise))))
+        azimuth = np.degrees(np.arccos(((np.sin(np.radians(latitude))*np.cos(np.radians(solarZenithAngleSunrise)))-np.sin(np.radians(sunDeclination)))/(np.cos(np.radians(latitude))*np.sin(np.radians(solarZenithAngleSunrise)))))
+    solarAzimuthAngleSunrise = (540 - azimuth) % 360
+    solarAzimuthAngleSunset  = (azimuth+180) % 360
+    solarAzimuthAngleSolarNoon = ((solarAzimuthAngleSunset - solarAzimuthAngleSunrise)/2) + solarAzimuthAngleSunrise
+
+    def event(fraction):
+        # Day offset and whole seconds truncated the same way as the hour, minute, second steps in sunrise_sunset
+        offset = np.where(fraction < 0, -1, np.where(fraction > 1, 1, 0))
+        fraction = fraction % 1
+        hour = np.floor(24.0*fraction)
+        minute = np.floor((24.0*fraction-hour)*60)
+        second = np.floor(((24.0*fraction-hour)*60-minute)*60)
+        missing = np.isnan(fraction)
+        seconds = np.where(missing, -1, hour*3600+minute*60+second).astype(np.int64)
+        when = (days+offset).astype('datetime64[s]')+np.maximum(seconds, 0).astype('timedelta64[s]')
+        return np.where(missing, np.datetime64('NaT'), when), seconds
+
+    sunrise, sunriseSeconds = event(sunriseTime)
+    sunset, sunsetSeconds = event(sunsetTime)
+    noon, noonSeconds = event(solarNoon)
+    return {"sunrise":{"datetime":sunrise, "seconds":sunriseSeconds, "solarazimuth":solarAzimuthAngleSunrise}, "solarNoon":{"datetime":noon, "seconds":noonSeconds, "solarazimuth":solarAzimuthAngleSolarNoon}, "sunset":{"datetime":sunset, "seconds":sunsetSeconds, "solarazimuth":solarAzimuthAngleSunset}}
+
+@lru_cache(maxsize=4096)
+def sunrise_sunset_day(latitude,longitude,d,t=0.5,timezone=0):
+    # sunrise_sunset remembered for each (latitude, longitude, date). d must be a date, not a datetime.
+    # The returned dictionary is shared between callers so it must not be changed.
+    return sunrise_sunset(latitude, longitude, d, t, timezone)
+
+@lru_cache(maxsize=256)
+def sun_event_days(latitude,longitude,first,count,t=0.5,timezone=0):
+    # Solar noon, sunrise and sunset epoch seconds of count days from day number first (days since
+    # 1970-01-01), worked out with one sunrise_sunset_array call. Shared between callers, read only.
+    days = np.arange(first, first+count).astype('datetime64[D]')
+    found = sunrise_sunset_array(latitude, longitude, days, t, timezone)
+    events = np.column_stack((found["solarNoon"]["datetime"], found["sunrise"]["datetime"], found["sunset"]["datetime"])).astype(np.int64)
+    events.flags.writeable = False
+    return events
+
+def sun_events(latitude,longitude,dates,t=0.5,timezone=0):
+    # Solar noon, sunrise and sunset as int64 UTC epoch seconds for each of dates at one location.
+    # The span of days from the first to the last date is worked out together and remembered by
+    # sun_event_days, so marking the same month again costs no solar maths.
+    days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+    if len(days) == 0:
+        events = np.empty([0, 3], dtype=np.int64)
+    else:
+        first = int(days.min())
+        events = sun_event_days(latitude, longitude, first, int(days.max())-first+1, t, timezone)[days-first]
+    return {"solarNoon":events[:, 0], "sunrise":events[:, 1], "sunset":events[:, 2]}
+
+def solar_zenith_angle(latitude,longitude,epochs):
+    # Solar zenith angle in degrees at each of epochs (UTC epoch seconds, any shape) with the
+    # formulas of sunrise_sunset evaluated at the exact time of day instead of a fixed t.
+    # 0 is the sun overhead, 90 the horizon, above about 108 it is fully dark.
+    epochs = np.asarray(epochs, dtype=float)
+    julianDay         = epochs/86400+2440587.5
+    julianCentury     = (julianDay-2451545)/36525
+    dayFraction       = (epochs % 86400)/86400
+
+    geomMeanLongSun   = 280.46646+julianCentury*(36000.76983+julianCentury*0.0003032)%360
+    geomMeanAnomSun   = 357.52911+julianCentury*(35999.05029-0.0001537*julianCentury)
+    eccentEarthOrbit  = 0.016708634-julianCentury*(0.000042037+0.0000001267*julianCentury)
+    sunEqOfCtr        = np.sin(np.radians(geomMeanAnomSun))*(1.914602-julianCentury*(0.004817+0.000014*julianCentury))+np.sin(np.radians(2*geomMeanAnomSun))*(0.019993-0.000101*julianCentury)+np.sin(np.radians(3*geomMeanAnomSun))*0.000289
+    sunTrueLong       = geomMeanLongSun+sunEqOfCtr
+    sunAppLong        = sunTrueLong-0.00569-0.00478*np.sin(np.radians(125.04-1934.136*julianCentury))
+    meanObliqEcliptic = 23+(26+((21.448-julianCentury*(46.815+julianCentury*(0.00059-julianCentury*0.001813))))/60)/60
+    obliqCorr         = meanObliqEcliptic+0.00256*np.cos(np.radians(125.04-1934.136*julianCentury))
+    sunDeclination    = np.degrees(np.arcsin(np.sin(np.radians(obliqCorr))*np.sin(np.radians(sunAppLong))))
+    varY              = np.tan(np.radians(obliqCorr/2))*np.tan(np.radians(obliqCorr/2))
+    eqOfTime          = 4*np.degrees(varY*np.sin(2*np.radians(geomMeanLongSun))-2*eccentEarthOrbit*np.sin(np.radians(geomMeanAnomSun))+4*eccentEarthOrbit*varY*np.sin(np.radians(geomMeanAnomSun))*np.cos(2*np.radians(geomMeanLongSun))-0.5*varY*varY*np.sin(4*np.radians(geomMeanLongSun))-1.25*eccentEarthOrbit*eccentEarthOrbit*np.sin(2*np.radians(geomMeanAnomSun)))
 
+    trueSolarTime     = ((dayFraction*1440)+eqOfTime+(4*longitude)) % 1440
+    hourAngle         = trueSolarTime/4-180
+    cosZenith         = np.sin(np.radians(latitude))*np.sin(np.radians(sunDeclination))+np.cos(np.radians(latitude))*np.cos(np.radians(sunDeclination))*np.cos(np.radians(hourAngle))
+    return np.degrees(np.arccos(np.clip(cosZenith, -1, 1)))
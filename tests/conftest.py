@@ -0,0 +1,39 @@
+# Shared set up of the tests: the modules sit in the folder above, and a small writer of log
+# files in the format of the TAPR logger.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+#
+# Usage:  python3 -m pytest -q
+
+
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TS_FORMAT = '%d %b %Y %H:%M:%S'
+
+
+def log_line(when, x, y, z, rt=22.5, lt=24.4):
+	return '{ "ts":"%s", "rt":%.2f, "lt":%.2f, "x":%.4f, "y":%.4f, "z":%.4f, "rx":%d, "ry":%d, "rz":%d, "Tm": 46.9849 }\n' \
+		% (when.strftime(TS_FORMAT), rt, lt, x, y, z, int(x * 1.5), int(y * 1.5), int(z * 1.5))
+
+
+def write_log(path, start, seconds, mode="w"):
+	"""Write one reading at each of the seconds after start (a datetime). Returns the epochs written."""
+	epochs = []
+	with open(path, mode) as f:
+		for second in seconds:
+			when = start + datetime.timedelta(seconds=int(second))
+			f.write(log_line(when, -40.0 + 0.001 * (second % 97), -4.9 - 0.002 * (second % 13), -24.1 + 0.003 * (second % 7)))
+			epochs.append(int(when.replace(tzinfo=datetime.timezone.utc).timestamp()))
+	return epochs
+
+
+@pytest.fixture
+def day_start():
+	return datetime.datetime(2024, 6, 3)
@@ -0,0 +1,73 @@
+# Block aggregation and clock time bins against a direct numpy reference
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+
+
+import numpy as np
+import pytest
+
+from mag_aggregate import aggregate_blocks, bin_partials, finish_bins, merge_partials, PLOT_TYPES
+
+REFERENCE = {
+	"last_value": lambda v: v[-1],
+	"average": lambda v: v.mean(axis=0),
+	"mean": lambda v: v.mean(axis=0),
+	"rms": lambda v: np.sqrt(np.mean(v * v, axis=0)),
+	"std": lambda v: v.std(axis=0),
+	"maximum": lambda v: v.max(axis=0),
+	"minimum": lambda v: v.min(axis=0),
+}
+
+
+@pytest.fixture
+def readings():
+	"""Epochs with gaps, a repeat and a step back of the clock, and (rows, 3) values."""
+	rng = np.random.default_rng(1)
+	epoch = np.concatenate((np.arange(1000, 1500), np.arange(1700, 2100), [2099, 2050], np.arange(2100, 2400)))
+	return epoch, rng.normal(0, 1, (len(epoch), 3))
+
+
+def reference_bins(epoch, values, t0, bin_seconds, n_bins, plot_type):
+	out = np.full((n_bins, values.shape[1]), np.nan)
+	order = np.argsort(epoch, kind="stable")
+	epoch = epoch[order]
+	values = values[order]
+	for n in range(n_bins):
+		inside = (epoch >= t0 + n * bin_seconds) & (epoch < t0 + (n + 1) * bin_seconds)
+		if inside.any():
+			out[n] = REFERENCE[plot_type](values[inside])
+	return out
+
+
+@pytest.mark.parametrize("plot_type", PLOT_TYPES)
+def test_aggregate_blocks(plot_type):
+	values = np.random.default_rng(2).normal(0, 1, (1003, 3))
+	expected = np.array([REFERENCE[plot_type](values[start:start + 60]) for start in range(0, 1003, 60)])
+	np.testing.assert_allclose(aggregate_blocks(values, 60, plot_type), expected)
+
+
+@pytest.mark.parametrize("plot_type", PLOT_TYPES)
+def test_bins_match_reference(readings, plot_type):
+	epoch, values = readings
+	t0 = 900		# The first bins are empty, the last readings fall off the grid
+	got = finish_bins(bin_partials(epoch, values, t0, 60, 20), plot_type)
+	np.testing.assert_allclose(got, reference_bins(epoch, values, t0, 60, 20, plot_type), atol=1e-12)
+
+
+@pytest.mark.parametrize("plot_type", PLOT_TYPES)
+def test_merged_files_match_one_pass(readings, plot_type):
+	epoch, values = readings
+	total = None
+	for part in np.array_split(np.arange(len(epoch)), [450, 460, 950]):		# Files meeting inside a bin
+		total = merge_partials(total, bin_partials(epoch[part], values[part], 1000, 60, 24))
+	np.testing.assert_allclose(finish_bins(total, plot_type), reference_bins(epoch, values, 1000, 60, 24, plot_type), atol=1e-12)
+
+
+def test_merge_into_a_slice_of_the_totals(readings):
+	epoch, values = readings
+	total = bin_partials(epoch[:800], values[:800], 1000, 60, 24)
+	low = (int(epoch[800:].min()) - 1000) // 60
+	touched = {name: array[low:] for name, array in total.items()}
+	merge_partials(touched, bin_partials(epoch[800:], values[800:], 1000 + low * 60, 60, 24 - low))
+	np.testing.assert_allclose(finish_bins(total, "average"), reference_bins(epoch, values, 1000, 60, 24, "average"))
@@ -0,0 +1,42 @@
+# The column cache is used while the log is unchanged and rebuilt when its size or mtime changes
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+
+
+import datetime
+import os
+
+import numpy as np
+
+import mag_cache
+from mag_cache import cache_folder, load_columns, read_cache, file_stamp
+from conftest import write_log
+
+
+def test_cache_is_invalidated(tmp_path, day_start, monkeypatch):
+	logfiles = str(tmp_path)
+	name = "n5brg-20240603-runmag.log"
+	path = os.path.join(logfiles, name)
+	epochs = write_log(path, day_start, range(100))
+	parsed = []
+	read_mag_log = mag_cache.read_mag_log
+	monkeypatch.setattr(mag_cache, "read_mag_log", lambda filename: parsed.append(filename) or read_mag_log(filename))
+
+	columns = load_columns(logfiles, name)
+	assert np.array_equal(columns["epoch"], epochs) and len(parsed) == 1
+	assert isinstance(load_columns(logfiles, name)["x"], np.memmap) and len(parsed) == 1
+
+	# More readings change the size
+	epochs += write_log(path, day_start + datetime.timedelta(seconds=100), range(10), mode="a")
+	assert read_cache(cache_folder(logfiles, name), file_stamp(path)) is None
+	assert np.array_equal(load_columns(logfiles, name)["epoch"], epochs) and len(parsed) == 2
+
+	# The same size written again changes only the mtime
+	info = os.stat(path)
+	os.utime(path, ns=(info.st_atime_ns, info.st_mtime_ns + 10**9))
+	assert read_cache(cache_folder(logfiles, name), file_stamp(path)) is None
+	load_columns(logfiles, name)
+	assert len(parsed) == 3
+	load_columns(logfiles, name)
+	assert len(parsed) == 3
@@ -0,0 +1,51 @@
+# decode_timestamps against strptime, on the fast path and on the byte decoding path
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+
+
+import calendar
+import datetime
+
+import numpy as np
+import pytest
+
+from mag_ingest import decode_timestamps, read_mag_log, TS_FORMAT
+from conftest import write_log
+
+
+def strptime_epochs(ts, ts_format=TS_FORMAT):
+	return np.array([calendar.timegm(datetime.datetime.strptime(stamp, ts_format).timetuple()) for stamp in ts])
+
+
+def stamps(start, seconds, ts_format=TS_FORMAT):
+	return np.array([(start + datetime.timedelta(seconds=int(second))).strftime(ts_format) for second in seconds])
+
+
+@pytest.mark.parametrize("seconds", [range(7200), [0, 1, 2, 5, 6, 3000, 3001], [10, 9, 11, 11, 12]],
+	ids=["one second", "gaps", "repeats"])
+def test_matches_strptime(seconds):
+	ts = stamps(datetime.datetime(2024, 6, 2, 23, 0, 0), seconds)	# Crosses midnight
+	assert np.array_equal(decode_timestamps(ts), strptime_epochs(ts))
+
+
+@pytest.mark.parametrize("row, wrong, right", [(3000, "03 Jun", "05 Jun"), (100, "02 Jun", "01 Jun")])
+def test_wrong_date_with_the_right_time(row, wrong, right):
+	ts = stamps(datetime.datetime(2024, 6, 2, 23, 0, 0), range(7200))
+	ts[row] = ts[row].replace(wrong, right)
+	assert np.array_equal(decode_timestamps(ts), strptime_epochs(ts))
+
+
+@pytest.mark.parametrize("ts_format", ['%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%d/%m/%Y %H:%M:%S'])
+def test_other_formats(ts_format):
+	ts = stamps(datetime.datetime(2024, 2, 28, 23, 59, 0), [0, 1, 2, 90, 91, 86400], ts_format)
+	assert np.array_equal(decode_timestamps(ts), strptime_epochs(ts, ts_format))
+
+
+def test_read_mag_log(tmp_path, day_start):
+	path = str(tmp_path / "n5brg-20240603-runmag.log")
+	epochs = write_log(path, day_start, [0, 1, 2, 60, 61, 86399])
+	columns = read_mag_log(path)
+	assert np.array_equal(columns["epoch"], epochs)
+	assert columns["start_ts"] == day_start.strftime(TS_FORMAT)
+	assert columns["x"][3] == pytest.approx(-40.0 + 0.001 * 60)
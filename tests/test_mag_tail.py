@@ -0,0 +1,57 @@
+# LogTail reads only what was appended since its last poll
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+
+
+import datetime
+
+import numpy as np
+
+from mag_tail import LogTail
+from conftest import log_line, write_log
+
+
+def test_reads_appended_lines(tmp_path, day_start):
+	path = str(tmp_path / "n5brg-20240603-runmag.log")
+	epochs = write_log(path, day_start, range(5))
+	tail = LogTail(path, capacity=4)
+	assert tail.poll() == 5
+	assert tail.poll() == 0
+
+	# A line the logger has only half written waits for the rest of it
+	line = log_line(day_start + datetime.timedelta(seconds=5), -40.0, -4.9, -24.1)
+	with open(path, "a") as f:
+		f.write(line[:30])
+	assert tail.poll() == 0
+	with open(path, "a") as f:
+		f.write(line[30:])
+	assert tail.poll() == 1
+	epochs.append(epochs[-1] + 1)
+
+	epochs += write_log(path, day_start + datetime.timedelta(seconds=6), range(20), mode="a")
+	assert tail.poll() == 20
+	columns = tail.columns()
+	assert np.array_equal(columns["epoch"], epochs)
+	assert columns["start_ts"] == "03 Jun 2024 00:00:00"
+
+
+def test_starts_again_when_the_log_is_replaced(tmp_path, day_start):
+	path = str(tmp_path / "n5brg-20240603-runmag.log")
+	write_log(path, day_start, range(50))
+	tail = LogTail(path)
+	assert tail.poll() == 50
+	epochs = write_log(path, day_start + datetime.timedelta(days=1), range(3))
+	assert tail.poll() == 3
+	assert np.array_equal(tail.columns()["epoch"], epochs)
+
+
+def test_skips_a_damaged_line(tmp_path, day_start):
+	path = str(tmp_path / "n5brg-20240603-runmag.log")
+	epochs = write_log(path, day_start, range(3))
+	with open(path, "a") as f:
+		f.write('{ "ts":"03 Jun 2024 00:00:03", "rt":2\n')
+	epochs += write_log(path, day_start + datetime.timedelta(seconds=4), range(2), mode="a")
+	tail = LogTail(path)
+	assert tail.poll() == 5
+	assert np.array_equal(tail.columns()["epoch"], epochs)
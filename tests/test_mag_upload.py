@@ -0,0 +1,123 @@
+# Uploads to the stand in server: which logs are sent, resuming after an interrupted transfer,
+# the manifest and the throttle.
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+
+
+import datetime
+import gzip
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+import mag_upload
+from mag_upload import TokenBucket, Uploader, load_manifest, pack_pending, pending_logs, stand_in_server
+from conftest import write_log
+
+
+@pytest.fixture
+def server(tmp_path):
+	"""Stand in server on a free local port, yields (url, folder of received batches)."""
+	folder = str(tmp_path / "received")
+	httpd = stand_in_server(folder, port=0)
+	httpd.RequestHandlerClass.log_message = lambda self, format, *args: None
+	thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+	thread.start()
+	yield "http://127.0.0.1:%d" % httpd.server_address[1], folder
+	httpd.shutdown()
+	httpd.server_close()
+
+
+@pytest.fixture
+def logfiles(tmp_path, day_start):
+	"""Two finished plain logs, a compressed archive and today's log still being written."""
+	folder = tmp_path / "logs"
+	folder.mkdir()
+	old = time.time() - 2 * mag_upload.WRITING_SECONDS
+	for n in range(2):
+		path = folder / ("n5brg-2024060%d-runmag.log" % (n + 3))
+		write_log(str(path), day_start + datetime.timedelta(days=n), range(0, 86400, 20))
+		os.utime(path, (old, old))
+	write_log(str(folder / "n5brg-20240605-runmag.log"), day_start + datetime.timedelta(days=2), range(0, 86400, 20))
+	with open(folder / "n5brg-20240605-runmag.log", "rb") as source, gzip.open(folder / "n5brg-20240605-runmag.log.gz", "wb") as out:
+		shutil.copyfileobj(source, out)
+	os.remove(folder / "n5brg-20240605-runmag.log")
+	write_log(str(folder / "n5brg-20240606-runmag.log"), day_start + datetime.timedelta(days=3), range(0, 600))
+	return str(folder)
+
+
+def test_pending_skips_only_the_log_being_written(logfiles):
+	pending = pending_logs(logfiles, {"logs": {}, "batches": {}})
+	assert pending == ["n5brg-20240603-runmag.log", "n5brg-20240604-runmag.log", "n5brg-20240605-runmag.log.gz"]
+	later = time.time() + mag_upload.WRITING_SECONDS		# The logger stopped writing
+	assert "n5brg-20240606-runmag.log" in pending_logs(logfiles, {"logs": {}, "batches": {}}, now=later)
+	os.remove(os.path.join(logfiles, "n5brg-20240606-runmag.log"))	# The newest file is an archive
+	assert pending_logs(logfiles, {"logs": {}, "batches": {}})[-1] == "n5brg-20240605-runmag.log.gz"
+
+
+def test_resumes_an_interrupted_upload(logfiles, server, tmp_path, monkeypatch):
+	url, received = server
+	temp_path = str(tmp_path / "upload")
+	monkeypatch.setattr(mag_upload, "CHUNK_BYTES", 4096)
+	manifest = load_manifest(temp_path)
+	(batch,) = pack_pending(logfiles, temp_path, manifest, cache_dir=str(tmp_path / "cache"))
+	size = manifest["batches"][batch]["size"]
+	assert size > 5 * 4096
+
+	# The connection drops after three chunks
+	uploader = Uploader(url, "incoming", temp_path, manifest)
+	request = uploader.pool.request
+	puts = []
+	def failing(method, path, body=None, headers=None):
+		if method == "PUT":
+			if len(puts) == 3:
+				raise OSError("connection dropped")
+			puts.append(len(body))
+		return request(method, path, body, headers)
+	monkeypatch.setattr(uploader.pool, "request", failing)
+	assert uploader.send_pending() == ([], [batch])
+	saved = load_manifest(temp_path)["batches"][batch]
+	assert saved["sent"] == 3 * 4096 and not saved["done"]
+	assert os.path.getsize(os.path.join(received, batch + ".part")) == 3 * 4096
+
+	# A new run reads the manifest and sends only the rest, no faster than the throttle
+	rate = 40000
+	resumed = Uploader(url, "incoming", temp_path, load_manifest(temp_path), rate=rate)
+	request = resumed.pool.request
+	sent = []
+	def counting(method, path, body=None, headers=None):
+		if method == "PUT":
+			sent.append(len(body))
+		return request(method, path, body, headers)
+	monkeypatch.setattr(resumed.pool, "request", counting)
+	began = time.monotonic()
+	assert resumed.send_pending() == ([batch], [])
+	elapsed = time.monotonic() - began
+	assert sum(sent) == size - 3 * 4096
+	assert sum(sent) > 2 * rate
+	assert elapsed >= (sum(sent) - rate) / rate * 0.95		# The first second's worth is the burst
+
+	with open(os.path.join(received, batch), "rb") as f:
+		assert hashlib.sha256(f.read()).hexdigest() == manifest["batches"][batch]["sha256"]
+	assert not os.path.exists(os.path.join(temp_path, batch))
+
+	saved = load_manifest(temp_path)
+	assert saved["batches"][batch]["done"] and saved["batches"][batch]["sent"] == size
+	assert sorted(saved["batches"][batch]["logs"]) == sorted(saved["logs"])
+	assert all(entry["batch"] == batch for entry in saved["logs"].values())
+	assert pending_logs(logfiles, saved) == []
+
+
+def test_token_bucket_holds_the_rate():
+	bucket = TokenBucket(100000, burst=10000)
+	began = time.monotonic()
+	for n in range(6):
+		bucket.take(10000)
+	elapsed = time.monotonic() - began
+	assert 0.45 <= elapsed < 1.0		# 60000 bytes, the first 10000 from the full bucket
+	assert TokenBucket(None).take(1 << 30) == 0.0
@@ -0,0 +1,43 @@
+# The numpy sunrise and sunset functions against the scalar sunrise_sunset
+# Author:      Bob Stricklin, N5BRG
+# Date:        October 18, 2026
+# License:     GPL 3.0
+
+
+import datetime
+
+import numpy as np
+import pytest
+
+from sunrisesunsetcalculator import sunrise_sunset, sunrise_sunset_array, sun_events
+
+
+def seconds(when):
+	return when.hour * 3600 + when.minute * 60 + when.second
+
+
+DATES = [datetime.date(2024, 1, 1) + datetime.timedelta(days=n) for n in range(0, 366, 7)]
+
+
+@pytest.mark.parametrize("latitude, longitude, timezone", [(33.4679, -97.081, 0), (-33.9, 151.2, 10), (64.8, -147.7, -9)])
+def test_array_matches_scalar(latitude, longitude, timezone):
+	found = sunrise_sunset_array(latitude, longitude, DATES, 0.5, timezone)
+	for n, day in enumerate(DATES):
+		expected = sunrise_sunset(latitude, longitude, day, 0.5, timezone)
+		for event in ("sunrise", "sunset"):
+			assert found[event]["datetime"][n].astype(datetime.datetime) == expected[event]["datetime"]
+			assert found[event]["solarazimuth"][n] == pytest.approx(expected[event]["solarazimuth"])
+		assert found["solarNoon"]["seconds"][n] == seconds(expected["solarNoon"]["solarNoon_time"])
+
+
+def test_no_sunrise_in_polar_night():
+	found = sunrise_sunset_array(78.2, 15.6, [datetime.date(2024, 12, 21)])
+	assert np.isnat(found["sunrise"]["datetime"][0]) and found["sunrise"]["seconds"][0] == -1
+
+
+def test_sun_events_of_any_dates():
+	dates = [datetime.date(2024, 6, 10), datetime.date(2024, 6, 1), datetime.date(2024, 6, 10)]
+	events = sun_events(33.4679, -97.081, dates)
+	found = sunrise_sunset_array(33.4679, -97.081, dates)
+	for event in ("sunrise", "solarNoon", "sunset"):
+		assert np.array_equal(events[event], found[event]["datetime"].astype(np.int64))